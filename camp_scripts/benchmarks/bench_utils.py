@@ -0,0 +1,112 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import json
+import platform
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from camps.instrumentation import RunProfiler
+
+repo_path = Path(__file__).absolute().parents[2]
+
+
+@contextmanager
+def measure(results: dict, name: str, trace_memory: bool = False):
+    """
+    Records wall time, CPU time, RSS change and peak RSS of the enclosed block
+    in results[name], as a stage of a camps.instrumentation.RunProfiler. With
+    trace_memory, the memory allocated by Python during the block, and its
+    peak, are recorded too, at the cost of a slower run.
+    """
+    profiler = RunProfiler(name=name, verbose=False)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with profiler.stage(name):
+            yield
+    finally:
+        stage = profiler.stages[-1]
+        stats = {
+            key: stage[key]
+            for key in ["wall_time", "cpu_time", "rss_delta_mb", "peak_rss_mb"]
+        }
+        if trace_memory:
+            traced_current, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats["traced_allocated_mb"] = traced_current / 1024 ** 2
+            stats["traced_peak_mb"] = traced_peak / 1024 ** 2
+        results[name] = stats
+
+
+def get_scaling_exponents(sizes, times_per_stage: dict) -> dict:
+    """
+    Fits time ~ size ** exponent for every stage, from the runs at different sizes.
+    """
+    exponents = {}
+    sizes = np.array(sizes, dtype=float)
+    for stage, times in times_per_stage.items():
+        times = np.array(times, dtype=float)
+        mask = (sizes > 0) & (times > 0)
+        if mask.sum() < 2:
+            continue
+        exponents[stage] = float(
+            np.polyfit(np.log(sizes[mask]), np.log(times[mask]), 1)[0]
+        )
+    return exponents
+
+
+def get_commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=repo_path,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(benchmark: str, results: dict, output_path: Path):
+    """
+    Writes benchmark results to a JSON file, along with the commit and machine
+    they were obtained on, so runs can be compared across commits.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output = {
+        "benchmark": benchmark,
+        "commit": get_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "n_cpus": os.cpu_count(),
+        **results,
+    }
+    with open(output_path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results saved to {output_path}")
+    return output
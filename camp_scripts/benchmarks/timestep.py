@@ -0,0 +1,334 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import time
+import datetime
+import argparse
+import multiprocessing
+from collections import defaultdict
+from pathlib import Path
+
+from june.epidemiology.epidemiology import Epidemiology
+from june.epidemiology.infection import Immunity, InfectionSelector, InfectionSelectors
+from june.epidemiology.infection_seed import InfectionSeed
+from june.interaction import Interaction
+from june.policy import Policies
+from june.simulator import Simulator
+
+from camps.activity import CampActivityManager
+from camps.groups.leisure import generate_leisure_for_config
+from camps.paths import camp_configs_path
+from camps.pipeline import set_random_seed
+from camps.policy import Isolation
+from camps import synthetic
+
+from bench_utils import (
+    get_commit,
+    measure,
+    save_results,
+)
+from world_construction import stages, stage_builders
+
+config_file_path = camp_configs_path / "learning_center_config.yaml"
+interactions_file_path = camp_configs_path / "defaults/interaction/interaction_Survey.yaml"
+policies_file_path = camp_configs_path / "defaults/policy/simple_policy.yaml"
+isolation_policies_file_path = camp_configs_path / "defaults/policy/isolation.yaml"
+
+
+class TimestepProfiler:
+    """
+    Accumulates the time spent in the methods of the simulation objects, by
+    replacing them with timed wrappers on the instances. Sections are inclusive,
+    so move_people contains the leisure distributors and the medical care
+    policies, which are also reported on their own.
+    """
+
+    def __init__(self):
+        self.sections = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.timesteps = []
+
+    def wrap(self, instance, method_name: str, section):
+        """
+        Times every call to instance.method_name. Section is either the name
+        to accumulate the time on, or a function of the call arguments
+        returning it.
+        """
+        method = getattr(instance, method_name)
+        get_section = section if callable(section) else lambda *a, **kw: section
+
+        def timed_method(*args, **kwargs):
+            tick = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                name = get_section(*args, **kwargs)
+                self.sections[name] += time.perf_counter() - tick
+                self.calls[name] += 1
+
+        setattr(instance, method_name, timed_method)
+
+    def wrap_timestep(self, simulator: Simulator):
+        """
+        Records wall time, CPU time and the time in every section for each
+        time step, along with the activities that were active in it.
+        """
+        do_timestep = simulator.do_timestep
+
+        def timed_timestep():
+            activities = tuple(simulator.timer.activities)
+            date = simulator.timer.date
+            sections_start = dict(self.sections)
+            tick, tick_cpu = time.perf_counter(), time.process_time()
+            do_timestep()
+            self.timesteps.append(
+                {
+                    "date": date.isoformat(),
+                    "activities": activities,
+                    "wall_time": time.perf_counter() - tick,
+                    "cpu_time": time.process_time() - tick_cpu,
+                    "n_infected": len(simulator.world.people.infected),
+                    "sections": {
+                        name: elapsed - sections_start.get(name, 0.0)
+                        for name, elapsed in self.sections.items()
+                        if elapsed > sections_start.get(name, 0.0)
+                    },
+                }
+            )
+
+        simulator.do_timestep = timed_timestep
+
+    def instrument(self, simulator: Simulator):
+        activity_manager = simulator.activity_manager
+        self.wrap_timestep(simulator)
+        self.wrap(activity_manager, "do_timestep", "activity_manager")
+        self.wrap(activity_manager, "move_people_to_active_subgroups", "move_people")
+        self.wrap(activity_manager, "activate_next_shift", "activate_next_shift")
+        if activity_manager.leisure is not None:
+            leisure = activity_manager.leisure
+            self.wrap(
+                leisure,
+                "generate_leisure_probabilities_for_timestep",
+                "leisure_probabilities",
+            )
+            for activity, distributor in leisure.leisure_distributors.items():
+                self.wrap(distributor, "get_leisure_subgroup", f"leisure:{activity}")
+        if activity_manager.policies is not None:
+            for policy in activity_manager.policies.medical_care_policies.policies:
+                if isinstance(policy, Isolation):
+                    self.wrap(policy, "apply", "isolation_policy")
+        self.wrap(
+            simulator.interaction,
+            "time_step_for_group",
+            lambda *args, **kwargs: f"interaction:{kwargs['group'].spec}",
+        )
+        self.wrap(simulator.epidemiology, "do_timestep", "epidemiology")
+        self.wrap(simulator, "clear_world", "clear_world")
+
+    def summarise(self):
+        """
+        Aggregates the time steps by set of activities and the interaction
+        time by supergroup.
+        """
+        wall_time = sum(timestep["wall_time"] for timestep in self.timesteps)
+        by_activities = defaultdict(lambda: {"n_timesteps": 0, "wall_time": 0.0})
+        for timestep in self.timesteps:
+            stats = by_activities["+".join(sorted(timestep["activities"]))]
+            stats["n_timesteps"] += 1
+            stats["wall_time"] += timestep["wall_time"]
+        for stats in by_activities.values():
+            stats["wall_time_per_timestep"] = stats["wall_time"] / stats["n_timesteps"]
+        by_supergroup = {
+            name.split(":", 1)[1]: {"wall_time": elapsed, "n_groups": self.calls[name]}
+            for name, elapsed in self.sections.items()
+            if name.startswith("interaction:")
+        }
+        by_section = {
+            name: {"wall_time": elapsed, "n_calls": self.calls[name]}
+            for name, elapsed in self.sections.items()
+            if not name.startswith("interaction:")
+        }
+        return {
+            "n_timesteps": len(self.timesteps),
+            "wall_time": wall_time,
+            "wall_time_per_timestep": wall_time / max(len(self.timesteps), 1),
+            "by_activities": dict(by_activities),
+            "by_supergroup": by_supergroup,
+            "by_section": by_section,
+        }
+
+
+def make_simulator(world, days: int, n_cases: int, isolation: bool = False):
+    for person in world.people:
+        person.immunity = Immunity()
+        person.infection = None
+        person.subgroups.medical_facility = None
+        person.dead = False
+    for supergroup in [
+        world.hospitals,
+        world.isolation_units,
+        world.learning_centers,
+        world.pump_latrines,
+        world.play_groups,
+        world.distribution_centers,
+        world.communals,
+        world.female_communals,
+        world.religiouss,
+        world.e_vouchers,
+        world.n_f_distribution_centers,
+        world.shelters,
+    ]:
+        supergroup.get_interaction(interactions_file_path)
+    selector = InfectionSelector.from_file()
+    infection_seed = InfectionSeed(world=world, infection_selector=selector)
+    infection_seed.unleash_virus(n_cases=n_cases, population=world.people, time=0)
+
+    leisure = generate_leisure_for_config(world=world, config_filename=config_file_path)
+    leisure.distribute_social_venues_to_areas(world.areas, world.super_areas)
+    policies = Policies.from_file(
+        isolation_policies_file_path if isolation else policies_file_path,
+        base_policy_modules=("june.policy", "camps.policy"),
+    )
+    Simulator.ActivityManager = CampActivityManager
+    simulator = Simulator.from_file(
+        world=world,
+        interaction=Interaction.from_file(config_filename=interactions_file_path),
+        leisure=leisure,
+        policies=policies,
+        config_filename=config_file_path,
+        epidemiology=Epidemiology(infection_selectors=InfectionSelectors([selector])),
+    )
+    simulator.timer.total_days = days
+    simulator.timer.final_date = simulator.timer.initial_date + datetime.timedelta(
+        days=days
+    )
+    return simulator
+
+
+def benchmark_timesteps(
+    n_regions: int,
+    days: int,
+    n_cases: int = 50,
+    seed: int = 999,
+    isolation: bool = False,
+    trace_memory: bool = False,
+):
+    """
+    Builds a grid camp with the given number of regions and simulates it for
+    the given number of days, timing every time step.
+    """
+    set_random_seed(seed)
+    camp = {
+        "n_regions": n_regions,
+        "seed": seed,
+        "distributions": synthetic.load_basecamp_distributions(),
+    }
+    for stage in stages:
+        stage_builders[stage](camp)
+    world = camp["world"]
+    simulator = make_simulator(world, days=days, n_cases=n_cases, isolation=isolation)
+    profiler = TimestepProfiler()
+    profiler.instrument(simulator)
+
+    stats = {}
+    with measure(stats, "run", trace_memory=trace_memory):
+        simulator.run()
+    memory = stats["run"]
+    wall_time = memory.pop("wall_time")
+    cpu_time = memory.pop("cpu_time")
+
+    n_people = len(world.people)
+    return {
+        "n_regions": n_regions,
+        "n_areas": len(world.areas),
+        "n_people": n_people,
+        "days": days,
+        "isolation": isolation,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "person_days_per_second": n_people * days / wall_time,
+        "n_infected": len(world.people.infected),
+        "memory": memory,
+        **profiler.summarise(),
+        "timesteps": profiler.timesteps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the time steps of simulations on synthetic grid camps"
+    )
+    parser.add_argument(
+        "-r",
+        "--regions",
+        help="Numbers of regions to benchmark, each must be a square number",
+        nargs="+",
+        type=int,
+        default=[1, 4],
+    )
+    parser.add_argument("-d", "--days", help="Days to simulate", type=int, default=7)
+    parser.add_argument(
+        "-c", "--cases", help="Number of initial infections", type=int, default=50
+    )
+    parser.add_argument("-s", "--seed", help="Random seed", type=int, default=999)
+    parser.add_argument(
+        "-i",
+        "--isolation",
+        help="Run with the isolation policies, which send people to isolation units",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-m",
+        "--trace_memory",
+        help="Record the memory allocated by Python during the run (slower)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-o", "--output", help="JSON file to write the results to", default=None
+    )
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = f"timestep_{get_commit() or 'local'}.json"
+    output_path = Path(args.output).absolute()
+
+    # every size runs in a fresh process, so memory figures do not add up
+    context = multiprocessing.get_context("fork")
+    runs = []
+    for n_regions in args.regions:
+        with context.Pool(1) as pool:
+            run = pool.apply(
+                benchmark_timesteps,
+                (
+                    n_regions,
+                    args.days,
+                    args.cases,
+                    args.seed,
+                    args.isolation,
+                    args.trace_memory,
+                ),
+            )
+        print(
+            f"{n_regions} regions, {run['n_people']} people: "
+            f"{run['wall_time_per_timestep']:.3f}s per time step, "
+            f"{run['person_days_per_second']:.0f} person-days/s, "
+            f"peak RSS {run['memory']['peak_rss_mb']:.0f} MB"
+        )
+        runs.append(run)
+    save_results("timestep", {"runs": runs}, output_path)
+
+
+if __name__ == "__main__":
+    main()
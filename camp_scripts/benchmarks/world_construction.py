@@ -0,0 +1,266 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+
+from june.groups import Hospital, Hospitals, Cemeteries
+from june.distributors import HospitalDistributor
+
+from camps.groups import PumpLatrines, PlayGroups, InformalWorks
+from camps.groups import DistributionCenters, Communals, FemaleCommunals, Religiouss
+from camps.groups import EVouchers, NFDistributionCenters
+from camps.groups import Shelters, ShelterDistributor
+from camps.groups import IsolationUnit, IsolationUnits
+from camps.groups import LearningCenters
+from camps.distributors import LearningCenterDistributor
+from camps.pipeline import set_random_seed
+from camps import synthetic
+
+from bench_utils import (
+    measure,
+    get_scaling_exponents,
+    get_commit,
+    save_results,
+)
+
+stages = [
+    "geography",
+    "population",
+    "households",
+    "shelters",
+    "venues",
+    "learning_centers",
+]
+
+
+def build_geography(camp):
+    camp["world"], camp["area_super_area_region"] = synthetic.generate_empty_virtual_world(
+        n_regions=camp["n_regions"], area_spacing=150
+    )
+
+
+def build_population(camp):
+    synthetic.populate_virtual_world(
+        camp["world"],
+        camp["distributions"]["population_dist_df"],
+        camp["distributions"]["n_residents_params"],
+        seed=camp["seed"],
+    )
+
+
+def build_households(camp):
+    synthetic.distribute_virtual_people_to_households(
+        camp["world"],
+        camp["distributions"]["famsize_dict"],
+        camp["distributions"]["famsize_avg"],
+        max_hh_size=12,
+    )
+
+
+def build_shelters(camp):
+    world = camp["world"]
+    world.shelters = Shelters.for_areas(world.areas)
+    shelter_distributor = ShelterDistributor(sharing_shelter_ratio=0.75)
+    for area in world.areas:
+        shelter_distributor.distribute_people_in_shelters(area.shelters, area.households)
+
+
+def _sample_venue_coordinates(world):
+    lat_range, lon_range = synthetic.get_gridcamp_boundary(
+        n_areas=len(world.areas), area_spacing=150, init_lat=0.0, init_lon=0.0
+    )
+    total_population = len(world.people)
+    kids_population = len([p for p in world.people if 3 <= p.age <= 17])
+    venues_coords = {}
+    for venue_type in synthetic.coords_venues_types:
+        if venue_type in ["play_groups", "learning_centers"]:
+            population = kids_population
+        else:
+            population = total_population
+        n_venues = int(np.ceil(synthetic.venues_per_capita[venue_type] * population))
+        venues_coords[venue_type] = synthetic.uniformly_sample_locations(
+            (lat_range, lon_range), n_venues=n_venues
+        )
+    return venues_coords
+
+
+def build_venues(camp):
+    world = camp["world"]
+    camp["venues_coords"] = venues_coords = _sample_venue_coordinates(world)
+    hospitals = Hospitals(
+        hospitals=[
+            Hospital(coordinates=coordinates, n_beds=50, n_icu_beds=4, trust_code=None)
+            for coordinates in venues_coords["hospitals"]
+        ],
+        neighbour_hospitals=5,
+    )
+    for hospital in hospitals:
+        hospital.area = world.areas.get_closest_area(hospital.coordinates)
+    world.hospitals = hospitals
+    hospital_distributor = HospitalDistributor(
+        hospitals, medic_min_age=20, patients_per_medic=10
+    )
+    hospital_distributor.assign_closest_hospitals_to_super_areas(world.super_areas)
+    world.isolation_units = IsolationUnits(
+        [IsolationUnit(area=hospital.area) for hospital in world.hospitals]
+    )
+    hospital_distributor.distribute_medics_from_world(world.people)
+    world.pump_latrines = PumpLatrines.for_areas(world.areas)
+    world.play_groups = PlayGroups.for_areas(world.areas)
+    world.informal_works = InformalWorks.for_areas(world.areas)
+    for venue_type, supergroup in [
+        ("distribution_centers", DistributionCenters),
+        ("communals", Communals),
+        ("female_communals", FemaleCommunals),
+        ("religiouss", Religiouss),
+        ("e_vouchers", EVouchers),
+        ("n_f_distribution_centers", NFDistributionCenters),
+    ]:
+        setattr(
+            world,
+            venue_type,
+            supergroup.from_coordinates(
+                coordinates=venues_coords[venue_type], super_areas=world.super_areas
+            ),
+        )
+    world.cemeteries = Cemeteries()
+
+
+def build_learning_centers(camp):
+    world = camp["world"]
+    world.learning_centers = LearningCenters.from_coordinates(
+        coordinates=camp["venues_coords"]["learning_centers"],
+        areas=world.areas,
+        max_distance_to_area=5,
+        n_shifts=4,
+    )
+    regions_names = [region.name for region in world.regions]
+    enrollment_rates = camp["distributions"]["flat_enrollment_rates"]
+    learning_center_distributor = LearningCenterDistributor(
+        learning_centers=world.learning_centers,
+        female_enrollment_rates=dict.fromkeys(
+            regions_names, enrollment_rates["female_dict"]
+        ),
+        male_enrollment_rates=dict.fromkeys(
+            regions_names, enrollment_rates["male_dict"]
+        ),
+        area_region_df=camp["area_super_area_region"],
+        teacher_min_age=21,
+        neighbour_centers=50,
+    )
+    learning_center_distributor.distribute_teachers_to_learning_centers(world.areas)
+    learning_center_distributor.distribute_kids_to_learning_centers(world.areas)
+
+
+stage_builders = {
+    "geography": build_geography,
+    "population": build_population,
+    "households": build_households,
+    "shelters": build_shelters,
+    "venues": build_venues,
+    "learning_centers": build_learning_centers,
+}
+
+
+def benchmark_world_construction(n_regions: int, seed: int = 999, trace_memory=False):
+    """
+    Builds a grid camp with the given number of regions, timing every stage.
+    """
+    set_random_seed(seed)
+    camp = {
+        "n_regions": n_regions,
+        "seed": seed,
+        "distributions": synthetic.load_basecamp_distributions(),
+    }
+    stage_results = {}
+    for stage in stages:
+        with measure(stage_results, stage, trace_memory=trace_memory):
+            stage_builders[stage](camp)
+    world = camp["world"]
+    return {
+        "n_regions": n_regions,
+        "n_areas": len(world.areas),
+        "n_people": len(world.people),
+        "n_households": len(world.households),
+        "n_shelters": len(world.shelters),
+        "stages": stage_results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the construction of synthetic grid camps"
+    )
+    parser.add_argument(
+        "-r",
+        "--regions",
+        help="Numbers of regions to benchmark, each must be a square number",
+        nargs="+",
+        type=int,
+        default=[1, 4, 16, 64],
+    )
+    parser.add_argument("-s", "--seed", help="Random seed", type=int, default=999)
+    parser.add_argument(
+        "-m",
+        "--trace_memory",
+        help="Record the peak memory allocated by Python in every stage (slower)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-o", "--output", help="JSON file to write the results to", default=None
+    )
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = f"world_construction_{get_commit() or 'local'}.json"
+    output_path = Path(args.output).absolute()
+
+    # every size is built in a fresh process, so memory figures do not add up
+    context = multiprocessing.get_context("fork")
+    runs = []
+    for n_regions in args.regions:
+        with context.Pool(1) as pool:
+            run = pool.apply(
+                benchmark_world_construction,
+                (n_regions, args.seed, args.trace_memory),
+            )
+        print(
+            f"{n_regions} regions, {run['n_people']} people: "
+            + ", ".join(
+                f"{stage} {stats['wall_time']:.2f}s"
+                for stage, stats in run["stages"].items()
+            )
+        )
+        runs.append(run)
+    scaling_exponents = get_scaling_exponents(
+        [run["n_people"] for run in runs],
+        {
+            stage: [run["stages"][stage]["wall_time"] for run in runs]
+            for stage in stages
+        },
+    )
+    save_results(
+        "world_construction",
+        {"runs": runs, "scaling_exponents": scaling_exponents},
+        output_path,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,88 +14,11 @@ the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 See the GNU General Public License for more details.
 """
 
-import numpy as np
-import random
-import numba as nb
-import pandas as pd
-import time
-import matplotlib.pyplot as plt
-from datetime import datetime
 import sys
 import argparse
-from pathlib import Path
 
-from collections import defaultdict
-
-from june.geography import Geography
-from june.demography.demography import (
-    load_age_and_sex_generators_for_bins,
-    Demography,
-    Population,
-    load_comorbidity_data,
-    generate_comorbidity,
-)
-from june.paths import data_path, configs_path
-from june.epidemiology.epidemiology import Epidemiology
-from june.epidemiology.infection import (
-    Infection,
-    HealthIndexGenerator,
-    InfectionSelector,
-    InfectionSelectors,
-    SusceptibilitySetter,
-)
-from june.epidemiology.infection_seed import InfectionSeed, InfectionSeeds
-from june.interaction import Interaction
-from june.groups import Hospital, Hospitals, Cemeteries
-from june.distributors import HospitalDistributor
-from june.hdf5_savers import generate_world_from_hdf5
-from june.policy import Policy, Policies
-from june.records import Record
-from june.simulator import Simulator
-from june.records import Record, RecordReader
-
-from camps.activity import CampActivityManager
-from camps.paths import camp_data_path, camp_configs_path
-from camps.world import World
-from camps.groups.leisure import generate_leisure_for_world, generate_leisure_for_config
-from camps.camp_creation import (
-    generate_empty_world,
-    populate_world,
-    distribute_people_to_households,
-)  # this is loaded from the ../camp_scripts folder
-
-from camps.groups import PumpLatrines, PumpLatrineDistributor
-from camps.groups import DistributionCenters, DistributionCenterDistributor
-from camps.groups import Communals, CommunalDistributor
-from camps.groups import FemaleCommunals, FemaleCommunalDistributor
-from camps.groups import Religiouss, ReligiousDistributor
-from camps.groups import Shelter, Shelters, ShelterDistributor
-from camps.groups import IsolationUnit, IsolationUnits
-from camps.groups import LearningCenter, LearningCenters
-from camps.distributors import LearningCenterDistributor
-from camps.groups import PlayGroups, PlayGroupDistributor
-from camps.groups import EVouchers, EVoucherDistributor
-from camps.groups import NFDistributionCenters, NFDistributionCenterDistributor
-from camps.groups import SheltersVisitsDistributor
-
-
-def set_random_seed(seed=999):
-    """
-    Sets global seeds for testing in numpy, random, and numbaized numpy.
-    """
-
-    @nb.njit(cache=True)
-    def set_seed_numba(seed):
-        random.seed(seed)
-        return np.random.seed(seed)
-
-    np.random.seed(seed)
-    set_seed_numba(seed)
-    random.seed(seed)
-    return
-
-
-set_random_seed(0)
+from camps.instrumentation import RunProfiler
+from camps.pipeline import RunPipeline, get_resume_checkpoint, parameters_from_args
 
 # =============== Argparse =========================#
 
@@ -159,7 +82,7 @@ parser.add_argument(
 parser.add_argument(
     "-cs",
     "--child_susceptibility",
-    help="Reduce child susceptibility for under 12s",
+    help="Halve the susceptibility of under 13s",
     required=False,
     default=False,
 )
@@ -183,6 +106,13 @@ parser.add_argument(
     required=False,
     default=0.6,
 )
+parser.add_argument(
+    "-ib",
+    "--isolation_beds",
+    help="Number of beds per isolation unit, unlimited if not given",
+    required=False,
+    default=None,
+)
 parser.add_argument(
     "-m",
     "--mask_wearing",
@@ -246,444 +176,70 @@ parser.add_argument(
     required=False,
     default="results",
 )
-args = parser.parse_args()
-
-if args.comorbidities == "True":
-    args.comorbidities = True
-else:
-    args.comorbidities = False
-
-if args.child_susceptibility == "True":
-    args.child_susceptibility = True
-else:
-    args.child_susceptibility = False
-if args.no_vaccines == "True":
-    args.no_vaccines = True
-else:
-    args.no_vaccines = False
-if args.vaccines == "True":
-    args.vaccines = True
-else:
-    args.vaccines = False
-
-if args.no_visits == "True":
-    args.no_visits = True
-else:
-    args.no_visits = False
-
-if args.isolation_units == "True":
-    args.isolation_units = True
-else:
-    args.isolation_units = False
-
-if args.mask_wearing == "True":
-    args.mask_wearing = True
-else:
-    args.mask_wearing = False
-
-if args.learning_centers == "True":
-    args.learning_centers = True
-else:
-    args.learning_centers = False
-
-if args.extra_learning_centers == "False":
-    args.extra_learning_centers = False
-
-if args.learning_center_shifts == "False":
-    args.learning_center_shifts = 4
-
-if args.learning_center_beta_ratio == "False":
-    args.learning_center_beta_ratio = False
-
-if args.infectiousness_path == "nature":
-    transmission_config_path = camp_configs_path / "defaults/transmission/nature.yaml"
-elif args.infectiousness_path == "correction_nature":
-    transmission_config_path = (
-        camp_configs_path / "defaults/transmission/correction_nature.yaml"
-    )
-elif args.infectiousness_path == "nature_larger":
-    transmission_config_path = (
-        camp_configs_path
-        / "defaults/transmission/nature_larger_presymptomatic_transmission.yaml"
-    )
-elif args.infectiousness_path == "nature_lower":
-    transmission_config_path = (
-        camp_configs_path
-        / "defaults/transmission/nature_lower_presymptomatic_transmission.yaml"
-    )
-elif args.infectiousness_path == "xnexp":
-    transmission_config_path = camp_configs_path / "defaults/transmission/XNExp.yaml"
-else:
-    raise NotImplementedError
-
-print("Comorbidities set to: {}".format(args.comorbidities))
-print("Parameters path set to: {}".format(args.parameters))
-print("Indoor beta ratio is set to: {}".format(args.indoor_beta_ratio))
-print("Outdoor beta ratio set to: {}".format(args.outdoor_beta_ratio))
-print("Infectiousness path set to: {}".format(args.infectiousness_path))
-print("Child susceptibility change set to: {}".format(args.child_susceptibility))
-
-print("Isolation units set to: {}".format(args.isolation_units))
-print("Household beta set to: {}".format(args.household_beta))
-if args.isolation_units:
-    print("Testing time set to: {}".format(args.isolation_testing))
-    print("Isolation time set to: {}".format(args.isolation_time))
-    print("Isolation compliance set to: {}".format(args.isolation_compliance))
-
-print("Mask wearing set to: {}".format(args.mask_wearing))
-if args.mask_wearing:
-    print("Mask compliance set to: {}".format(args.mask_compliance))
-    print("Mask beta factor set up: {}".format(args.mask_beta_factor))
-
-print("Learning centers set to: {}".format(args.learning_centers))
-if args.learning_centers:
-    print(
-        "Learning center beta ratio set to: {}".format(args.learning_center_beta_ratio)
-    )
-    print("Learning center shifts set to: {}".format(args.learning_center_shifts))
-    print("Extra learning centers is set to: {}".format(args.extra_learning_centers))
-
-print("Plag group beta ratio set to: {}".format(args.play_group_beta_ratio))
-print("Save path set to: {}".format(args.save_path))
-
-print("\n", args.__dict__, "\n")
-time.sleep(10)
-
-# =============== world creation =========================#
-CONFIG_PATH = camp_configs_path / "config_example.yaml"
-
-# create empty world's geography
-# world = generate_empty_world({"super_area": ["CXB-219-C"]})
-world = generate_empty_world({"region": ["CXB-219", "CXB-217", "CXB-209"]})
-# world = generate_empty_world({"region": ["CXB-219"]})
-# world = generate_empty_world()
-
-# populate empty world
-populate_world(world)
-
-# distribute people to households
-distribute_people_to_households(world)
-
-# medical facilities
-hospitals = Hospitals.from_file(
-    filename=camp_data_path / "input/hospitals/hospitals.csv"
-)
-for hospital in hospitals:
-    hospital.area = world.areas.get_closest_area(hospital.coordinates)
-world.hospitals = hospitals
-hospital_distributor = HospitalDistributor(
-    hospitals, medic_min_age=20, patients_per_medic=10
-)
-hospital_distributor.assign_closest_hospitals_to_super_areas(world.super_areas)
-world.isolation_units = IsolationUnits([IsolationUnit(area=world.areas[0])])
-
-hospital_distributor.distribute_medics_from_world(world.people)
-
-if args.learning_centers:
-    world.learning_centers = LearningCenters.for_areas(
-        world.areas, n_shifts=int(args.learning_center_shifts)
-    )
-    learning_center_distributor = LearningCenterDistributor.from_file(
-        learning_centers=world.learning_centers
-    )
-    learning_center_distributor.distribute_kids_to_learning_centers(world.areas)
-    learning_center_distributor.distribute_teachers_to_learning_centers(world.areas)
-
-    if args.extra_learning_centers:
-        # add extra learning centers based on enrollment
-        enrolled = []
-        learning_centers = []
-        # find current enrollment rates
-        for learning_center in world.learning_centers:
-            total = 0
-            for i in range(4):
-                total += len(learning_center.ids_per_shift[i])
-            enrolled.append(total)
-            learning_centers.append(learning_center)
-        learning_centers = np.array(learning_centers)
-        learning_centers_sorted = learning_centers[np.argsort(enrolled)]
-
-        # find top k most filled learning centers
-        top_k = learning_centers_sorted[-int(args.extra_learning_centers) :]
-        for learning_center in top_k:
-            extra_lc = LearningCenter(
-                coordinates=learning_center.super_area.coordinates
-            )
-            extra_lc.area = learning_center.area
-            world.learning_centers.members.append(extra_lc)
-        world.learning_centers = LearningCenters(
-            world.learning_centers.members, n_shifts=4
-        )
-
-        # clear and redistirbute kids to learning centers
-        for learning_center in world.learning_centers:
-            learning_center.ids_per_shift = defaultdict(list)
-        learning_center_distributor = LearningCenterDistributor.from_file(
-            learning_centers=world.learning_centers
-        )
-        learning_center_distributor.distribute_kids_to_learning_centers(world.areas)
-        learning_center_distributor.distribute_teachers_to_learning_centers(world.areas)
-
-    CONFIG_PATH = camp_configs_path / "learning_center_config.yaml"
-
-if args.no_visits:
-    CONFIG_PATH = camp_configs_path / "no_visits_config.yaml"
-
-world.pump_latrines = PumpLatrines.for_areas(world.areas)
-world.play_groups = PlayGroups.for_areas(world.areas)
-world.distribution_centers = DistributionCenters.for_areas(world.areas)
-world.communals = Communals.for_areas(world.areas)
-world.female_communals = FemaleCommunals.for_areas(world.areas)
-world.religiouss = Religiouss.for_areas(world.areas)
-world.e_vouchers = EVouchers.for_areas(world.areas)
-world.n_f_distribution_centers = NFDistributionCenters.for_areas(world.areas)
-
-print("Total people = ", len(world.people))
-print("Mean age = ", np.mean([person.age for person in world.people]))
-# world.box_mode = False
-world.cemeteries = Cemeteries()
-
-world.shelters = Shelters.for_areas(world.areas)
-shelter_distributor = ShelterDistributor(
-    sharing_shelter_ratio=0.75
-)  # proportion of families that share a shelter
-for area in world.areas:
-    shelter_distributor.distribute_people_in_shelters(area.shelters, area.households)
-
-# ============================================================================#
-
-# =================================== comorbidities ===============================#
-
-if args.comorbidities:
-
-    comorbidity_data = load_comorbidity_data(
-        camp_data_path / "input/demography/myanmar_male_comorbidities.csv",
-        camp_data_path / "input/demography/myanmar_female_comorbidities.csv",
-    )
-    for person in world.people:
-        person.comorbidity = generate_comorbidity(person, comorbidity_data)
-
-    health_index_generator = HealthIndexGenerator.from_file_with_comorbidities(
-        camp_configs_path / "defaults/comorbidities.yaml",
-        camp_data_path / "input/demography/uk_male_comorbidities.csv",
-        camp_data_path / "input/demography/uk_female_comorbidities.csv",
-    )
-
-
-else:
-    health_index_generator = HealthIndexGenerator.from_file()
-
-# ============================================================================#
-
-# =================================== policies ===============================#
-
-if args.isolation_units:
-    policies = Policies.from_file(
-        camp_configs_path / "defaults/policy/isolation.yaml",
-        base_policy_modules=("june.policy", "camps.policy"),
-    )
-
-    policies.policies[3].n_quarantine_days = int(args.isolation_time)
-    policies.policies[3].testing_mean_time = int(args.isolation_testing)
-    policies.policies[3].compliance = float(args.isolation_compliance)
-
-elif args.mask_wearing:
-    policies = Policies.from_file(
-        camp_configs_path / "defaults/policy/mask_wearing.yaml",
-        base_policy_modules=("june.policy", "camps.policy"),
-    )
-
-    policies.policies[7].compliance = float(args.mask_compliance)
-    policies.policies[7].beta_factor = float(args.mask_beta_factor)
-
-elif args.no_vaccines:
-    policies = Policies.from_file(
-        camp_configs_path / "vaccine_tests/no_vaccine.yaml",
-        base_policy_modules=("june.policy", "camps.policy"),
-    )
-
-elif args.vaccines:
-    policies = Policies.from_file(
-        camp_configs_path / "vaccine_tests/vaccine.yaml",
-        base_policy_modules=("june.policy", "camps.policy"),
-    )
-
-else:
-    policies = Policies.from_file(
-        camp_configs_path / "defaults/policy/home_care_policy.yaml",
-        base_policy_modules=("june.policy", "camps.policy"),
-    )
-
-# ============================================================================#
-
-# =================================== infection ===============================#
-
-
-selector = InfectionSelector(
-    health_index_generator=health_index_generator,
-    transmission_config_path=transmission_config_path,
-)
-
-interaction = Interaction.from_file(
-    config_filename=camp_configs_path
-    / "defaults/interaction/ContactInteraction_med_low_low_low_child.yaml"
-)
-if args.child_susceptibility:
-    susceptibility_setter = SusceptibilitySetter()  # by default kids have 0.5
-else:
-    susceptibility_setter = SusceptibilitySetter(None)
-
-
-if args.household_beta:
-    interaction.betas["household"] = float(args.household_beta)
-    interaction.betas["hospital"] = float(args.household_beta) * 0.1
-    interaction.betas["shelter"] = float(args.household_beta)
-
-if args.outdoor_beta_ratio:
-    interaction.betas["play_group"] = interaction.betas["household"] * float(
-        args.outdoor_beta_ratio
-    )
-    interaction.betas["pump_latrine"] = interaction.betas["household"] * float(
-        args.outdoor_beta_ratio
-    )
-
-if args.indoor_beta_ratio:
-    interaction.betas["communal"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-    interaction.betas["female_communal"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-    interaction.betas["religious"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-    interaction.betas["distribution_center"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-    interaction.betas["n_f_distribution_center"] = interaction.betas[
-        "household"
-    ] * float(args.indoor_beta_ratio)
-    interaction.betas["e_voucher"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-    interaction.betas["learning_center"] = interaction.betas["household"] * float(
-        args.indoor_beta_ratio
-    )
-
-if args.learning_centers and args.learning_center_beta_ratio:
-    interaction.betas["learning_center"] = interaction.betas["household"] * float(
-        args.learning_center_beta_ratio
-    )
-
-if args.play_group_beta_ratio:
-    interaction.betas["play_group"] = interaction.betas["household"] * float(
-        args.play_group_beta_ratio
-    )
-
-cases_detected = {
-    "CXB-202": 3,
-    "CXB-204": 6,
-    "CXB-208": 8,
-    "CXB-203": 1,
-    "CXB-207": 2,
-    "CXB-213": 2,
-}  # By the 24th May
-
-print("Detected cases = ", sum(cases_detected.values()))
-
-super_region_filename = camp_data_path / "input/geography/area_super_area_region.csv"
-super_region_df = pd.read_csv(super_region_filename)[["super_area", "region"]]
-infection_seed = InfectionSeed(world=world, infection_selector=selector)
-for region in world.regions:
-    if region.name in cases_detected.keys():
-        infection_seed.unleash_virus(
-            n_cases=2 * cases_detected[region.name],
-            population=Population(region.people),
-            time=0,
-        )
-# Add some extra random cases
-infection_seed.unleash_virus(n_cases=44, population=world.people, time=0)
-
-print("Infected people in seed = ", len(world.people.infected))
-
-infection_selectors = InfectionSelectors([selector])
-epidemiology = Epidemiology(
-    infection_selectors=infection_selectors, susceptibility_setter=susceptibility_setter
-)
-
-# ==================================================================================#
-
-# =================================== leisure config ===============================#
-leisure = generate_leisure_for_config(world=world, config_filename=CONFIG_PATH)
-leisure.leisure_distributors = {}
-leisure.leisure_distributors["pump_latrine"] = PumpLatrineDistributor.from_config(
-    world.pump_latrines
-)
-leisure.leisure_distributors["play_group"] = PlayGroupDistributor.from_config(
-    world.play_groups
-)
-leisure.leisure_distributors[
-    "distribution_center"
-] = DistributionCenterDistributor.from_config(world.distribution_centers)
-leisure.leisure_distributors["communal"] = CommunalDistributor.from_config(
-    world.communals
+parser.add_argument(
+    "-es",
+    "--early_stop",
+    help="End the run once the epidemic is extinct, or also on a plateau of "
+    "infections",
+    required=False,
+    choices=["none", "extinction", "plateau"],
+    default="none",
 )
-leisure.leisure_distributors["female_communal"] = FemaleCommunalDistributor.from_config(
-    world.female_communals
+parser.add_argument(
+    "-pd",
+    "--plateau_days",
+    help="Days over which infections must stop growing for a plateau",
+    required=False,
+    default=14,
 )
-leisure.leisure_distributors["religious"] = ReligiousDistributor.from_config(
-    world.religiouss
+parser.add_argument(
+    "-pt",
+    "--plateau_tolerance",
+    help="Relative growth of infections under which they are on a plateau",
+    required=False,
+    default=0.01,
 )
-leisure.leisure_distributors["e_voucher"] = EVoucherDistributor.from_config(
-    world.e_vouchers
+parser.add_argument(
+    "-ce",
+    "--checkpoint_every",
+    help="Days between checkpoints of the simulation, none if 0",
+    required=False,
+    default=0,
 )
-leisure.leisure_distributors[
-    "n_f_distribution_center"
-] = NFDistributionCenterDistributor.from_config(world.n_f_distribution_centers)
-if not args.no_visits:
-    leisure.leisure_distributors[
-        "shelters_visits"
-    ] = SheltersVisitsDistributor.from_config()
-    leisure.leisure_distributors["shelters_visits"].link_shelters_to_shelters(
-        world.super_areas
-    )
-# associate social activities to shelters
-leisure.distribute_social_venues_to_areas(world.areas, world.super_areas)
-
-# ==================================================================================#
-
-# =================================== simulator ===============================#
-
-# records
-record = Record(record_path=args.save_path, record_static_data=True)
-record.static_data(world=world)
-
-
-Simulator.ActivityManager = CampActivityManager
-simulator = Simulator.from_file(
-    world=world,
-    interaction=interaction,
-    leisure=leisure,
-    policies=policies,
-    config_filename=CONFIG_PATH,
-    epidemiology=epidemiology,
-    record=record,
+parser.add_argument(
+    "-r",
+    "--resume",
+    help="Continue from the latest checkpoint in the save path, if there is one",
+    required=False,
+    default=False,
 )
+# parameters the script sets whatever its arguments
+script_overrides = {
+    "regions": ["CXB-219", "CXB-217", "CXB-209"],
+    "nearest_venues_to_visit": None,
+}
 
-leisure.leisure_distributors
-
-simulator.timer.reset()
-
-simulator.run()
-
-# ==================================================================================#
 
-# =================================== read logger ===============================#
-
-read = RecordReader(args.save_path)
-
-infections_df = read.get_table_with_extras("infections", "infected_ids")
-
-locations_df = infections_df.groupby(["location_specs", "timestamp"]).size()
-
-locations_df.to_csv(args.save_path + "/locations.csv")
+def get_script_parameters(argv=()) -> dict:
+    """
+    Run parameters of the script for the given command line arguments, its
+    defaults if none are given. Runs made in process start from these, so a
+    grid point gets the same settings whichever backend runs it.
+    """
+    return parameters_from_args(parser.parse_args(list(argv)), **script_overrides)
+
+
+if __name__ == "__main__":
+    parameters = get_script_parameters(sys.argv[1:])
+    print("\n", parameters, "\n")
+
+    checkpoint = get_resume_checkpoint(parameters)
+    if checkpoint is None:
+        RunPipeline().run(parameters, profiler=RunProfiler(name="full_run_parse"))
+    else:
+        RunPipeline().run(
+            parameters,
+            profiler=RunProfiler(name="full_run_parse"),
+            context={"checkpoint": checkpoint},
+            after="configure_leisure",
+        )
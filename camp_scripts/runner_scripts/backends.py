@@ -0,0 +1,489 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import json
+import hashlib
+import time
+import shlex
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from camps.results import SweepResultStore
+
+
+def _print_path(path):
+    try:
+        return path.relative_to(Path.cwd())
+    except ValueError:
+        return path
+
+
+class ExecutionBackend:
+    """
+    Runs, or prepares to run, the jobs of a ClusterRunner. Backends that block
+    until the jobs are done have their results available when run returns.
+    """
+
+    blocking = True
+
+    def run(self, runner, indices=None):
+        raise NotImplementedError
+
+    @staticmethod
+    def get_indices(runner, indices=None):
+        if indices is None:
+            return list(range(len(runner.parameter_grid)))
+        return list(indices)
+
+
+class SlurmBackend(ExecutionBackend):
+    """
+    Writes SLURM submission scripts that run jobs_per_node jobs each through
+    gnu-parallel, and a submit_all.sh script submitting them.
+    """
+
+    blocking = False
+
+    def __init__(
+        self,
+        jobs_per_node=16,
+        partition="cosma",
+        account="durham",
+        time_limit="12:00:00",
+        setup_lines=(
+            "module purge",
+            "#load the modules used to build your program.",
+            "module load python/3.6.5",
+            "module load gnu_comp/7.3.0",
+            "module load hdf5",
+            "module load openmpi/3.0.1",
+            "module load gnu-parallel/20181122",
+            "#venv",
+            "source /cosma5/data/durham/dc-sedg2/cpmodelling/cpenv/bin/activate",
+        ),
+    ):
+        self.jobs_per_node = jobs_per_node
+        self.partition = partition
+        self.account = account
+        self.time_limit = time_limit
+        self.setup_lines = setup_lines
+
+    def run(self, runner, indices=None):
+        print("\n-------create scripts-------\n\n")
+        jobs_per_node = self.jobs_per_node
+        indices = self.get_indices(runner, indices)
+        number_of_parameters = len(indices)
+        number_of_scripts = int(np.ceil(number_of_parameters / jobs_per_node))
+        print(f"num. parameters: {number_of_parameters}")
+        print(f"num. scripts: {number_of_scripts}")
+
+        submit_all_script_lines = ["#!/bin/bash\n"]
+
+        stdout_dir = runner.output_dir / "stdout"
+        stdout_dir.mkdir(parents=True, exist_ok=True)
+
+        for ii in range(number_of_scripts):
+            low = ii * jobs_per_node
+            high = min((ii + 1) * jobs_per_node - 1, number_of_parameters - 1)
+
+            command_arr = "\n".join(
+                f'"{runner.get_command(i)}"' for i in indices[low : high + 1]
+            )
+
+            script = (
+                "#!/bin/bash -l\n"
+                + f"#SBATCH --ntasks {jobs_per_node}\n"
+                + f"#SBATCH -J {runner.job_name[:4]}_{ii:03d}\n"
+                + f"#SBATCH -o {stdout_dir}/camps{ii:03d}.out\n"
+                + f"#SBATCH -e {stdout_dir}/camps{ii:03d}.err\n"
+                + f"#SBATCH -p {self.partition}\n"
+                + f"#SBATCH -A {self.account} #durham #e.g. dp004\n"
+                + "#SBATCH --exclusive\n"
+                + f"#SBATCH -t {self.time_limit}\n"
+                + "".join(f"{line}\n" for line in self.setup_lines)
+                + f"COMMAND_ARR=({command_arr}) \n"
+                + 'parallel --lb ::: "${COMMAND_ARR[@]}"'
+            )
+
+            scripts_dir = runner.output_dir / "scripts"
+            scripts_dir.mkdir(parents=True, exist_ok=True)
+            script_path = scripts_dir / f"submit_{ii:02d}.sh"
+
+            with open(script_path, "w") as f:
+                f.write(script)
+
+            submit_all_script_lines.append(f"sbatch {script_path}\n")
+
+            if ii == 0:
+                print(f"script at eg.\n    {_print_path(script_path)}")
+
+        submit_all_path = runner.output_dir / "submit_all.sh"
+        with open(submit_all_path, "w") as submit_all:
+            submit_all.writelines(submit_all_script_lines)
+        print(
+            f"submit all with\n    \033[35mbash {_print_path(submit_all_path)}\033[0m"
+        )
+
+
+class JobLedger:
+    """
+    Append-only record of the state of every job of a grid, kept as JSON lines
+    in the output directory, so an interrupted sweep can be resumed. The last
+    line written for a job is its state.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.jobs = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line of a ledger whose writer was killed
+                        continue
+                    self.jobs[entry["index"]] = entry
+
+    def record(self, index, status, **info):
+        entry = {
+            "index": index,
+            "status": status,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            **info,
+        }
+        self.jobs[index] = entry
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_done(self, index, command):
+        entry = self.jobs.get(index)
+        return (
+            entry is not None
+            and entry["status"] == "done"
+            and entry.get("command") == command
+        )
+
+    def peak_rss_mb(self):
+        """
+        Largest peak RSS measured among the finished jobs, or None.
+        """
+        peaks = [
+            entry["peak_rss_mb"]
+            for entry in self.jobs.values()
+            if entry["status"] == "done" and entry.get("peak_rss_mb")
+        ]
+        return max(peaks) if peaks else None
+
+
+def get_available_memory_mb():
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def get_process_peak_rss_mb(pid):
+    """
+    Peak RSS reached so far by a running process, from /proc/<pid>/status.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def ingest_results(results, runner, index, save_path=None):
+    """
+    Adds a finished run to the results database of the sweep. A run whose
+    summary can not be read is reported and left out.
+    """
+    parameters = runner.get_long_parameter_grid()[index]
+    if save_path is None:
+        save_path = parameters.get("save_path", runner.output_dir / f"run_{index:03d}")
+    try:
+        results.ingest(index, parameters, save_path)
+    except Exception as error:
+        print(f"run_{index:03d} not added to {_print_path(results.path)}: {error}")
+
+
+def get_in_process_key(parameters: dict) -> str:
+    """
+    Ledger key of a run made in process, from its resolved parameters. The
+    other backends key their jobs by command line, which an in-process run
+    never executes, so they do not take its entry for theirs.
+    """
+    digest = hashlib.sha1(
+        json.dumps(parameters, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"in-process {digest}"
+
+
+class InProcessBackend(ExecutionBackend):
+    """
+    Runs the grid with camps.sweep.SweepExecutor, which builds every distinct
+    world once in this process and forks the runs from it. The grid overrides
+    base_parameters, which should be those full_run_parse.py runs with, as
+    given by create_scripts.get_script_parameters, for the runs to match the
+    other backends.
+    """
+
+    def __init__(self, n_workers=None, base_parameters=None):
+        self.n_workers = n_workers
+        self.base_parameters = base_parameters
+
+    def run(self, runner, indices=None):
+        from camps.sweep import SweepExecutor
+
+        ledger = JobLedger(runner.output_dir / "ledger.jsonl")
+        results = SweepResultStore(runner.output_dir / "results.sqlite")
+        executor = SweepExecutor(
+            runner.get_long_parameter_grid(),
+            runner.output_dir,
+            base_parameters=self.base_parameters,
+            n_workers=self.n_workers,
+        )
+        keys = {
+            index: get_in_process_key(executor.get_parameters(index))
+            for index in self.get_indices(runner, indices)
+        }
+        pending = [
+            index for index, key in keys.items() if not ledger.is_done(index, key)
+        ]
+        n_failed = 0
+        for ii, result in enumerate(executor.run(indices=pending)):
+            n_failed += result["status"] == "failed"
+            ledger.record(
+                result["index"],
+                result["status"],
+                command=keys[result["index"]],
+                wall_time=result["wall_time"],
+                peak_rss_mb=result["peak_rss_mb"],
+            )
+            if result["status"] == "done":
+                ingest_results(
+                    results, runner, result["index"], save_path=result["save_path"]
+                )
+            print(
+                f"[{ii + 1}/{len(pending)}] run_{result['index']:03d} "
+                f"{result['status']} in {result['wall_time']:.0f}s"
+            )
+        results.close()
+        print(f"{n_failed} runs failed, results in {runner.output_dir}")
+
+
+class LocalBackend(ExecutionBackend):
+    """
+    Runs the jobs on this machine as a pool of processes. Every job is pinned
+    to its own cores_per_run cores, and the number of concurrent jobs is capped
+    so that their measured peak RSS fits in the available memory.
+
+    Until a peak RSS is known, from the ledger of a previous attempt or from
+    memory_per_run_mb, a single probe job runs alone for probe_time seconds and
+    its peak RSS so far, times memory_headroom, is used as the estimate. The
+    estimate grows as jobs finish with a larger peak RSS.
+
+    Parameters
+    ----------
+    cores
+        cores to use, all the cores this process may run on if not given
+    cores_per_run
+        cores given to every job, numba and BLAS threads are set to match
+    memory_limit_mb
+        memory the jobs may use together, memory_safety times the available
+        memory if not given
+    memory_per_run_mb
+        initial estimate of the peak RSS of a job
+    memory_headroom
+        factor applied to the peak RSS measured on running jobs
+    memory_safety
+        fraction of the available memory to use
+    probe_time
+        seconds to measure the probe job for
+    poll_interval
+        seconds between checks of the running jobs
+    """
+
+    def __init__(
+        self,
+        cores=None,
+        cores_per_run=1,
+        memory_limit_mb=None,
+        memory_per_run_mb=None,
+        memory_headroom=1.5,
+        memory_safety=0.8,
+        probe_time=120,
+        poll_interval=2,
+    ):
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0))
+        elif isinstance(cores, int):
+            cores = sorted(os.sched_getaffinity(0))[:cores]
+        self.cores = list(cores)
+        self.cores_per_run = cores_per_run
+        if self.cores_per_run > len(self.cores):
+            raise ValueError(
+                f"{cores_per_run} cores per run, but only {len(self.cores)} cores"
+            )
+        if memory_limit_mb is None:
+            memory_limit_mb = memory_safety * get_available_memory_mb()
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_per_run_mb = memory_per_run_mb
+        self.memory_headroom = memory_headroom
+        self.probe_time = probe_time
+        self.poll_interval = poll_interval
+
+    def get_max_concurrent(self, memory_per_run_mb):
+        core_slots = len(self.cores) // self.cores_per_run
+        if memory_per_run_mb is None:
+            return 1
+        memory_slots = int(self.memory_limit_mb // max(memory_per_run_mb, 1))
+        return max(1, min(core_slots, memory_slots))
+
+    def get_environment(self):
+        env = dict(os.environ)
+        for variable in [
+            "OMP_NUM_THREADS",
+            "NUMBA_NUM_THREADS",
+            "OPENBLAS_NUM_THREADS",
+            "MKL_NUM_THREADS",
+        ]:
+            env[variable] = str(self.cores_per_run)
+        return env
+
+    def launch(self, runner, index, cores):
+        stdout_dir = runner.output_dir / "stdout"
+        stdout_dir.mkdir(parents=True, exist_ok=True)
+        stdout = open(stdout_dir / f"camps{index:03d}.out", "w")
+        stderr = open(stdout_dir / f"camps{index:03d}.err", "w")
+        process = subprocess.Popen(
+            shlex.split(runner.get_command(index)),
+            stdout=stdout,
+            stderr=stderr,
+            stdin=subprocess.DEVNULL,
+            env=self.get_environment(),
+            preexec_fn=lambda: os.sched_setaffinity(0, cores),
+        )
+        return {
+            "process": process,
+            "cores": cores,
+            "start": time.perf_counter(),
+            "files": (stdout, stderr),
+        }
+
+    def run(self, runner, indices=None):
+        ledger = JobLedger(runner.output_dir / "ledger.jsonl")
+        results = SweepResultStore(runner.output_dir / "results.sqlite")
+        indices = self.get_indices(runner, indices)
+        pending = [
+            index
+            for index in indices
+            if not ledger.is_done(index, runner.get_command(index))
+        ]
+        n_skipped = len(indices) - len(pending)
+        if n_skipped:
+            print(f"skipping {n_skipped} jobs already done")
+        free_cores = list(self.cores)
+        running = {}
+        memory_per_run_mb = self.memory_per_run_mb or ledger.peak_rss_mb()
+        n_failed = 0
+
+        while pending or running:
+            # measure the running jobs, the probe fixes the first estimate
+            for index, job in running.items():
+                peak_rss = get_process_peak_rss_mb(job["process"].pid)
+                if peak_rss is None:
+                    continue
+                job["peak_rss_mb"] = max(job.get("peak_rss_mb", 0), peak_rss)
+                elapsed = time.perf_counter() - job["start"]
+                if memory_per_run_mb is None and elapsed > self.probe_time:
+                    memory_per_run_mb = self.memory_headroom * job["peak_rss_mb"]
+                elif memory_per_run_mb is not None:
+                    memory_per_run_mb = max(memory_per_run_mb, job["peak_rss_mb"])
+
+            for index in list(running):
+                job = running[index]
+                pid, status, rusage = os.wait4(job["process"].pid, os.WNOHANG)
+                if pid == 0:
+                    continue
+                job["process"].returncode = (
+                    -os.WTERMSIG(status)
+                    if os.WIFSIGNALED(status)
+                    else os.WEXITSTATUS(status)
+                )
+                for f in job["files"]:
+                    f.close()
+                # ru_maxrss is in kB on Linux
+                peak_rss_mb = max(job.get("peak_rss_mb", 0), rusage.ru_maxrss / 1024)
+                memory_per_run_mb = max(memory_per_run_mb or 0, peak_rss_mb)
+                returncode = job["process"].returncode
+                n_failed += returncode != 0
+                ledger.record(
+                    index,
+                    "done" if returncode == 0 else "failed",
+                    command=runner.get_command(index),
+                    returncode=returncode,
+                    wall_time=time.perf_counter() - job["start"],
+                    peak_rss_mb=peak_rss_mb,
+                )
+                if returncode == 0:
+                    ingest_results(results, runner, index)
+                print(
+                    f"job {index:03d} {'done' if returncode == 0 else 'failed'} "
+                    f"in {time.perf_counter() - job['start']:.0f}s, "
+                    f"peak RSS {peak_rss_mb:.0f} MB"
+                )
+                free_cores.extend(job["cores"])
+                del running[index]
+
+            max_concurrent = self.get_max_concurrent(memory_per_run_mb)
+            while (
+                pending
+                and len(running) < max_concurrent
+                and len(free_cores) >= self.cores_per_run
+            ):
+                index = pending.pop(0)
+                cores = free_cores[: self.cores_per_run]
+                free_cores = free_cores[self.cores_per_run :]
+                running[index] = self.launch(runner, index, cores)
+                ledger.record(
+                    index,
+                    "running",
+                    command=runner.get_command(index),
+                    cores=cores,
+                    pid=running[index]["process"].pid,
+                )
+            time.sleep(self.poll_interval)
+
+        results.close()
+        print(
+            f"{len(indices) - n_skipped} jobs run, {n_failed} failed, "
+            f"ledger at {_print_path(ledger.path)}"
+        )
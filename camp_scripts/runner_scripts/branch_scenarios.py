@@ -0,0 +1,95 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import json
+import argparse
+from pathlib import Path
+
+from camps.branching import ScenarioBrancher, scenarios_from_policy_files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate up to a branch date once, then every policy "
+        "scenario from there in forked processes"
+    )
+    parser.add_argument(
+        "parameters",
+        help="JSON file with the run parameters of the shared start",
+        nargs="?",
+        default=None,
+    )
+    parser.add_argument(
+        "-b",
+        "--branch_date",
+        help="Date the scenarios branch off at, YYYY-MM-DD or days from the start",
+        required=True,
+    )
+    parser.add_argument(
+        "--policies",
+        help="Policy files of configs_camps/defaults/policy to branch to, "
+        "eg. isolation mask_wearing",
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--scenarios",
+        help="JSON file of scenario name to the policy parameters it changes",
+        default=None,
+    )
+    parser.add_argument("-o", "--output", help="Output directory", required=True)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of scenarios simulated at the same time",
+        type=int,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    if (args.policies is None) == (args.scenarios is None):
+        parser.error("give one of --policies and --scenarios")
+    parameters = {}
+    if args.parameters is not None:
+        with open(args.parameters) as f:
+            parameters = json.load(f)
+    if args.policies is not None:
+        scenarios = scenarios_from_policy_files(args.policies)
+    else:
+        with open(args.scenarios) as f:
+            scenarios = json.load(f)
+    branch_date = args.branch_date
+    if branch_date.isdigit():
+        branch_date = int(branch_date)
+
+    output_dir = Path(args.output).absolute()
+    brancher = ScenarioBrancher(
+        parameters,
+        branch_date=branch_date,
+        scenarios=scenarios,
+        output_dir=output_dir,
+        n_workers=args.workers,
+    )
+    results = []
+    for result in brancher.run():
+        print(f"{result['name']}: {result['status']} in {result['wall_time']:.0f}s")
+        results.append(result)
+    with open(output_dir / "branches.json", "w") as f:
+        json.dump(results, f, indent=4, default=str)
+
+
+if __name__ == "__main__":
+    main()
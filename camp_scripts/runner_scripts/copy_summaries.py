@@ -14,46 +14,206 @@ the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 See the GNU General Public License for more details.
 """
 
-import os
-import sys
+import re
+import time
+import pickle
+import shutil
+import argparse
+import multiprocessing
 from glob import glob
 from pathlib import Path
-import shutil
-
-name = sys.argv[1].replace("/", "_")
-
-base_dir = Path(sys.argv[1]).absolute()
-
-dir_list = sorted(glob(str(base_dir / "run*/")))
-
-
-new_dir = Path.cwd() / f"{name}_summaries"
-new_dir.mkdir(parents=True, exist_ok=True)
 
-for ii, old_dir in enumerate(dir_list):
-    old_dir = Path(old_dir)
-
-    assert f"{ii:03d}" == old_dir.stem.split("_")[1]
-
-    new_summ_path = new_dir / f"summary_{ii:03d}.csv"
-    old_summ_path = old_dir / "summary.csv"
-    if not new_summ_path.exists():
-        if old_summ_path.exists():
-            shutil.copy2(old_summ_path, new_summ_path)
-        else:
-            print(f"{old_summ_path} missing")
-
-    new_loc_path = new_dir / f"locations_{ii:03d}.csv"
-    old_loc_path = old_dir / "locations.csv"
-    if not new_loc_path.exists():
-        if old_loc_path.exists():
-            shutil.copy2(old_loc_path, new_loc_path)
+import pandas as pd
+
+from camps.post_processing import InfectionLocationCounter
+
+# per-run outputs collated, and the names of their tables in the store
+run_outputs = {
+    "summary": "summary.csv",
+    "camp_summary": "camp_summary.csv",
+    "locations": "locations.csv",
+    "infection_locations": "infection_locations.npz",
+}
+run_dir_pattern = re.compile(r"run_(\d+)$")
+string_column_size = 64
+parameter_column_size = 256
+
+
+def get_run_dirs(base_dir: Path) -> dict:
+    """
+    Run directories of a sweep by run index, read from their names.
+    """
+    run_dirs = {}
+    for run_dir in sorted(glob(str(base_dir / "run_*"))):
+        match = run_dir_pattern.search(run_dir)
+        if match is not None and Path(run_dir).is_dir():
+            run_dirs[int(match.group(1))] = Path(run_dir)
+    return run_dirs
+
+
+def read_parameters(base_dir: Path) -> pd.DataFrame:
+    """
+    The parameter grid of the sweep as a table indexed by run. Values that
+    are not numbers or booleans, and columns that mix types, are stored as
+    strings so they fit in the columns of the store.
+    """
+    with open(base_dir / "parameter_grid.pkl", "rb") as f:
+        parameter_grid = list(pickle.load(f))
+    parameters = pd.DataFrame(parameter_grid)
+    parameters.index.name = "run"
+    for column in parameters.columns:
+        if parameters[column].dtype == object:
+            parameters[column] = parameters[column].astype(str)
+    return parameters
+
+
+def read_run(job):
+    """
+    Reads the outputs of one run into data frames with a run column. Runs in
+    the worker processes.
+    """
+    index, run_dir = job
+    tables = {}
+    missing = []
+    for table, filename in run_outputs.items():
+        path = run_dir / filename
+        if not path.exists():
+            missing.append(filename)
+            continue
+        if filename.endswith(".npz"):
+            df = InfectionLocationCounter.load(path).reset_index()
         else:
-            print(f"{old_loc_path} missing")
-
-old_param_path = base_dir / "parameter_grid.pkl"
-new_param_path = new_dir / "parameter_grid.pkl"
-shutil.copy2(old_param_path, new_param_path)
-
-
-shutil.make_archive(base_name=new_dir.stem, format="zip", base_dir=new_dir)
+            df = pd.read_csv(path)
+        if table == "locations":
+            df = df.rename(columns={"0": "infections"})
+        df.insert(0, "run", index)
+        tables[table] = df
+    return index, tables, missing
+
+
+def collate(
+    base_dir: Path,
+    store_path: Path,
+    n_workers: int = None,
+    complevel: int = 5,
+    complib: str = "blosc:zstd",
+):
+    """
+    Reads the outputs of every run of a sweep in parallel and appends them to
+    one compressed HDF5 store, written as the runs are read. Every table has
+    the run index and the parameters of the run as columns, and the
+    parameter grid is stored on its own as the parameters table. Select a
+    subset with, for instance,
+    pd.read_hdf(store_path, "summary", where="run in [3, 4]"). Runs without
+    an entry in the parameter grid are left out.
+
+    Returns
+    -------
+    Indices of the runs missing some outputs, or left out, with what they miss
+    """
+    base_dir = Path(base_dir)
+    parameters = read_parameters(base_dir)
+    run_dirs = get_run_dirs(base_dir)
+    missing_runs = {
+        index: ["run directory"]
+        for index in parameters.index
+        if index not in run_dirs
+    }
+    for index in run_dirs:
+        if index not in parameters.index:
+            missing_runs[index] = ["parameter grid entry"]
+    jobs = [
+        (index, run_dir)
+        for index, run_dir in sorted(run_dirs.items())
+        if index in parameters.index
+    ]
+    if store_path.exists():
+        store_path.unlink()
+    tick = time.perf_counter()
+    context = multiprocessing.get_context("fork")
+    with pd.HDFStore(
+        store_path, mode="w", complevel=complevel, complib=complib
+    ) as store, context.Pool(n_workers) as pool:
+        store.put("parameters", parameters, format="table")
+        for index, tables, missing in pool.imap(read_run, jobs, chunksize=4):
+            if missing:
+                missing_runs[index] = missing
+            for table, df in tables.items():
+                df = df.join(parameters, on="run", rsuffix="_parameter")
+                string_columns = df.columns[df.dtypes == object]
+                store.append(
+                    table,
+                    df,
+                    format="table",
+                    index=False,
+                    data_columns=["run"],
+                    min_itemsize={
+                        column: parameter_column_size
+                        if column in parameters.columns
+                        else string_column_size
+                        for column in string_columns
+                    },
+                )
+        for table in run_outputs:
+            if table in store:
+                store.create_table_index(
+                    table, columns=["run"], optlevel=9, kind="full"
+                )
+    print(
+        f"Collated {len(jobs)} runs into {store_path} "
+        f"({store_path.stat().st_size / 1024 ** 2:.1f} MB) "
+        f"in {time.perf_counter() - tick:.1f}s"
+    )
+    for index, missing in sorted(missing_runs.items()):
+        print(f"run_{index:03d} missing {', '.join(missing)}")
+    return missing_runs
+
+
+def copy_csvs(base_dir: Path, new_dir: Path):
+    """
+    Copies the summary and locations of every run, and the parameter grid,
+    to new_dir and zips it.
+    """
+    new_dir.mkdir(parents=True, exist_ok=True)
+    for index, old_dir in get_run_dirs(base_dir).items():
+        for filename in ["summary.csv", "locations.csv"]:
+            stem = Path(filename).stem
+            new_path = new_dir / f"{stem}_{index:03d}.csv"
+            old_path = old_dir / filename
+            if not new_path.exists():
+                if old_path.exists():
+                    shutil.copy2(old_path, new_path)
+                else:
+                    print(f"{old_path} missing")
+    shutil.copy2(base_dir / "parameter_grid.pkl", new_dir / "parameter_grid.pkl")
+    shutil.make_archive(base_name=new_dir.stem, format="zip", base_dir=new_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collate the outputs of the runs of a sweep"
+    )
+    parser.add_argument("sweep_dir", help="output directory of the sweep")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="HDF5 store to write, {sweep}_summaries.h5 by default",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="processes reading the runs"
+    )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="copy the csv files of the runs to a zipped folder instead",
+    )
+    args = parser.parse_args()
+
+    base_dir = Path(args.sweep_dir).absolute()
+    name = args.sweep_dir.rstrip("/").replace("/", "_")
+    if args.csv:
+        copy_csvs(base_dir, Path.cwd() / f"{name}_summaries")
+    else:
+        store_path = Path(args.output or f"{name}_summaries.h5").absolute()
+        collate(base_dir, store_path, n_workers=args.workers)
@@ -25,8 +25,11 @@ import argparse
 from pathlib import Path
 
 from named_grids import *
+from backends import SlurmBackend, LocalBackend, InProcessBackend
 
 import camps
+from camps.adaptive import AdaptiveSweepPlanner
+from camps.results import SweepResultStore
 
 
 usage_output = """
@@ -41,11 +44,14 @@ usage_output = """
     [-lce EXTRA_LEARNING_CENTERS]
     [-lch LEARNING_CENTER_BETA_RATIO]
     [-pgh PLAY_GROUP_BETA_RATIO] [-s SAVE_PATH]
+    [-es EARLY_STOP] [-pd PLATEAU_DAYS] [-pt PLATEAU_TOLERANCE]
+    [-ce CHECKPOINT_EVERY] [-r RESUME]
     """  # Taken directly from output when a "bad" arg is given to the full_run_parse
 accepted = re.findall("\[(.*?)\]", usage_output)
 
 accepted_short = []
 accepted_long = []
+short_to_long = {}
 
 for flag in accepted:
     spl = flag.split()
@@ -54,20 +60,37 @@ for flag in accepted:
     elif len(spl) == 2:
         accepted_short.append(spl[0].replace("-", ""))
         accepted_long.append(spl[1].casefold())
+        short_to_long[spl[0].replace("-", "")] = spl[1].casefold()
     else:
         print("usage_output has an unusual argument...")
 
 home_dir = Path(camps.__path__[0]).parent
 
 
+def get_script_parameters():
+    """
+    Parameters full_run_parse.py runs with when given no arguments. The runs
+    made in process start from these, so that a grid point gets the same
+    settings as the command of get_command.
+    """
+    camp_scripts_dir = str(Path(__file__).absolute().parent.parent)
+    if camp_scripts_dir not in sys.path:
+        sys.path.insert(0, camp_scripts_dir)
+    from full_run_parse import get_script_parameters
+
+    return get_script_parameters()
+
+
 class ClusterRunner:
-    def __init__(self, parameter_grid, output_dir):
+    def __init__(self, parameter_grid, output_dir, resume=False):
         self.parameter_grid = parameter_grid
-        self.output_dir = Path(output_dir)
+        output_dir = Path(output_dir).absolute()
+        self.output_dir = output_dir
         self.job_name = output_dir.stem
 
+        # a resumed sweep keeps its directory, and so its job ledger
         ii = 1
-        while self.output_dir.is_dir():
+        while self.output_dir.is_dir() and not resume:
             self.output_dir = output_dir.parent / f"{output_dir.stem}_{ii}"
             ii = ii + 1
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -104,7 +127,7 @@ class ClusterRunner:
         self.script_flags = script_flags
 
     @classmethod
-    def from_named_grid(cls, named_grid, output_path):
+    def from_named_grid(cls, named_grid, output_path, resume=False):
         if output_path is None:
             output_dir = Path.cwd() / named_grid
         else:
@@ -125,19 +148,20 @@ class ClusterRunner:
                 '    choose from these, or modify "named_grids.py" and from_named_grid()'
                 "    Exiting."
             )
-        return cls(parameter_grid, output_dir)
+        return cls(parameter_grid, output_dir, resume=resume)
 
     @classmethod
-    def from_json(cls, json_path, output_path):
+    def from_json(cls, json_path, output_path, resume=False):
         if output_path is None:
             output_dir = Path.cwd() / Path(json_path).stem
         else:
             output_dir = Path(output_path)
         with open(json_path, "r") as f:
-            parameter_grid = json.loads(f)
+            parameter_grid = json.load(f)
+        return cls(parameter_grid, output_dir, resume=resume)
 
     @classmethod
-    def from_pkl(cls, pkl_path, output_path):
+    def from_pkl(cls, pkl_path, output_path, resume=False):
         if output_path is None:
             output_dir = Path.cwd() / Path(pkl_path).stem
         else:
@@ -145,80 +169,89 @@ class ClusterRunner:
 
         with open(pkl_path, "rb") as pkl:
             parameter_grid = pickle.load(pkl)
-        return cls(parameter_grid, output_dir)
-
-    def create_submission_scripts(self, jobs_per_node=16):
-        print("\n-------create scripts-------\n\n")
-        number_of_parameters = len(self.parameter_grid)
-        number_of_scripts = int(np.ceil(number_of_parameters / jobs_per_node))
-        print(f"num. parameters: {number_of_parameters}")
-        print(f"num. scripts: {number_of_scripts}")
-
-        submit_all_script_lines = ["#!/bin/bash\n"]
-
-        stdout_dir = self.output_dir / "stdout"
-        stdout_dir.mkdir(parents=True, exist_ok=True)
-
-        python_core = f"python3 -u {home_dir}/camp_scripts/full_run_parse.py"
-
-        for ii in range(number_of_scripts):
-            low = ii * jobs_per_node
-            high = min((ii + 1) * jobs_per_node - 1, number_of_parameters - 1)
-
-            command_arr = "\n".join(
-                f'"{python_core} {self.script_flags[i]}"' for i in range(low, high + 1)
-            )
-
-            script = (
-                f"#!/bin/bash -l\n"
-                + f"#SBATCH --ntasks {jobs_per_node}\n"
-                + f"#SBATCH -J {self.job_name[:4]}_{ii:03d}\n"
-                + f"#SBATCH -o {stdout_dir}/camps{ii:03d}.out\n"
-                + f"#SBATCH -e {stdout_dir}/camps{ii:03d}.err\n"
-                + f"#SBATCH -p cosma\n"
-                + f"#SBATCH -A durham #durham #e.g. dp004\n"
-                + f"#SBATCH --exclusive\n"
-                + f"#SBATCH -t 12:00:00\n"
-                + f"module purge\n"
-                + f"#load the modules used to build your program.\n"
-                + f"module load python/3.6.5\n"
-                + f"module load gnu_comp/7.3.0\n"
-                + f"module load hdf5\n"
-                + f"module load openmpi/3.0.1\n"
-                + f"module load gnu-parallel/20181122\n"
-                + f"#venv\n"
-                + f"source /cosma5/data/durham/dc-sedg2/cpmodelling/cpenv/bin/activate\n"
-                + f"COMMAND_ARR=({command_arr}) \n"
-                + 'parallel --lb ::: "${COMMAND_ARR[@]}"'
-            )
+        return cls(parameter_grid, output_dir, resume=resume)
 
-            scripts_dir = self.output_dir / "scripts"
-            scripts_dir.mkdir(parents=True, exist_ok=True)
-            script_path = scripts_dir / f"submit_{ii:02d}.sh"
-
-            with open(script_path, "w") as f:
-                f.write(script)
+    def run_in_process(self, n_workers=None, base_parameters=None):
+        if base_parameters is None:
+            base_parameters = get_script_parameters()
+        return self.run(
+            InProcessBackend(n_workers=n_workers, base_parameters=base_parameters)
+        )
 
-            submit_all_script_lines.append(f"sbatch {script_path}\n")
+    def get_long_parameter_grid(self):
+        return [
+            {short_to_long.get(param, param): value for param, value in p.items()}
+            for p in self.parameter_grid
+        ]
 
-            if ii == 0:
-                try:
-                    print_script_path = script_path.relative_to(Path.cwd())
-                except FileNotFoundError:
-                    print("Wrong file or file path, using default")
-                    print_script_path = script_path
-                print(f"script at eg.\n    {print_script_path}")
+    def get_command(self, index):
+        return (
+            f"python3 -u {home_dir}/camp_scripts/full_run_parse.py "
+            f"{self.script_flags[index]}"
+        )
 
-        submit_all_path = self.output_dir / "submit_all.sh"
-        with open(submit_all_path, "w") as submit_all:
-            submit_all.writelines(submit_all_script_lines)
-        try:
-            print_submit_all_path = submit_all_path.relative_to(Path.cwd())
-        except FileNotFoundError:
-            print("Wrong file or file path, using default")
-            print_submit_all_path = submit_all_path
+    def run(self, backend, indices=None):
+        return backend.run(self, indices=indices)
+
+    def run_adaptive(self, backend, planner, n_batches=None, plan_ahead=False):
+        """
+        Runs the batches of the grid proposed by an AdaptiveSweepPlanner from
+        the results in results.sqlite, until the planner has nothing to
+        propose or n_batches have been run. The batches are kept in
+        adaptive_plan.json, so calling this again continues the sweep. A
+        backend that does not block, like SLURM, gets a single batch per call:
+        submit it, and call again once its jobs are done. No new batch is
+        planned while runs of earlier batches have no results, since it would
+        be chosen without them, unless plan_ahead is set.
+        """
+        plan_path = self.output_dir / "adaptive_plan.json"
+        batches = []
+        if plan_path.exists():
+            with open(plan_path, "r") as f:
+                batches = json.load(f)["batches"]
+        results = SweepResultStore(self.output_dir / "results.sqlite")
+        # runs that finished outside of a blocking backend
+        results.ingest_sweep(self.output_dir, self.get_long_parameter_grid())
+        scheduled = [index for batch in batches for index in batch]
+        observations = planner.get_observations(results)
+        unfinished = [index for index in scheduled if index not in observations]
+        if unfinished and backend.blocking:
+            print(f"rerunning {len(unfinished)} unfinished runs of earlier batches")
+            self.run(backend, unfinished)
+            results.ingest_sweep(self.output_dir, self.get_long_parameter_grid())
+            observations = planner.get_observations(results)
+
+        n_run = 0
+        while n_batches is None or n_run < n_batches:
+            unfinished = [index for index in scheduled if index not in observations]
+            if unfinished and not plan_ahead:
+                print(
+                    f"{len(unfinished)} runs of earlier batches have no results, "
+                    f"not planning a new batch until they do"
+                )
+                break
+            batch = planner.propose(observations, scheduled)
+            if not batch:
+                print(
+                    f"no runs left to plan, {len(observations)} of "
+                    f"{len(self.parameter_grid)} parameter sets run"
+                )
+                break
+            batches.append(batch)
+            scheduled += batch
+            with open(plan_path, "w") as f:
+                json.dump({"metric": planner.metric, "batches": batches}, f)
+            print(f"batch {len(batches)}: {len(batch)} runs {batch}")
+            self.run(backend, batch)
+            n_run += 1
+            if not backend.blocking:
+                break
+            observations = planner.get_observations(results)
+        results.close()
+        return batches
 
-        print(f"submit all with\n    \033[35mbash {print_submit_all_path}\033[0m")
+    def create_submission_scripts(self, jobs_per_node=16):
+        return self.run(SlurmBackend(jobs_per_node=jobs_per_node))
 
 
 if __name__ == "__main__":
@@ -230,6 +263,77 @@ if __name__ == "__main__":
     parser.add_argument("--json", action="store", default=None)
     parser.add_argument("--pkl", action="store", default=None)
     parser.add_argument("-o", "--output", action="store", default=None)
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=["slurm", "local", "in-process"],
+        default="slurm",
+        help="write SLURM scripts, run the jobs on this machine, or run them "
+        "forked from a shared world in this process",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reuse the output directory and skip the jobs its ledger marks done",
+    )
+    parser.add_argument("--jobs-per-node", action="store", type=int, default=16)
+    parser.add_argument(
+        "--cores", action="store", type=int, default=None, help="local backend"
+    )
+    parser.add_argument(
+        "--cores-per-run", action="store", type=int, default=1, help="local backend"
+    )
+    parser.add_argument(
+        "--max-memory",
+        action="store",
+        type=float,
+        default=None,
+        help="MB the local jobs may use together",
+    )
+    parser.add_argument(
+        "--memory-per-run",
+        action="store",
+        type=float,
+        default=None,
+        help="MB a local job is expected to peak at, measured if not given",
+    )
+    parser.add_argument("-w", "--workers", action="store", type=int, default=None)
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="run batches of the grid chosen by camps.adaptive, not the whole grid",
+    )
+    parser.add_argument(
+        "--metric",
+        action="store",
+        default="peak_infections",
+        help="adaptive: metric of results.sqlite the batches are chosen for",
+    )
+    parser.add_argument(
+        "--initial",
+        action="store",
+        type=int,
+        default=None,
+        help="adaptive: runs of the first, space-filling, batch",
+    )
+    parser.add_argument(
+        "--batch-size", action="store", type=int, default=8, help="adaptive"
+    )
+    parser.add_argument(
+        "--batches",
+        action="store",
+        type=int,
+        default=None,
+        help="adaptive: most batches to run, until converged if not given",
+    )
+    parser.add_argument(
+        "--sampler", choices=["lhs", "sobol"], default="lhs", help="adaptive"
+    )
+    parser.add_argument(
+        "--plan-ahead",
+        action="store_true",
+        help="adaptive: plan a new batch while runs of earlier ones have no results",
+    )
     args = parser.parse_args()
 
     check = sum([getattr(args, x) is not None for x in ["named_grid", "json", "pkl"]])
@@ -240,10 +344,38 @@ if __name__ == "__main__":
         sys.exit()
 
     if args.named_grid is not None:
-        runner = ClusterRunner.from_named_grid(args.named_grid, args.output)
+        runner = ClusterRunner.from_named_grid(
+            args.named_grid, args.output, resume=args.resume
+        )
     if args.json is not None:
-        runner = ClusterRunner.from_json(args.json, args.output)
+        runner = ClusterRunner.from_json(args.json, args.output, resume=args.resume)
     if args.pkl is not None:
-        runner = ClusterRunner.from_pkl(args.pkl, args.output)
-
-    runner.create_submission_scripts()
+        runner = ClusterRunner.from_pkl(args.pkl, args.output, resume=args.resume)
+
+    if args.backend == "local":
+        backend = LocalBackend(
+            cores=args.cores,
+            cores_per_run=args.cores_per_run,
+            memory_limit_mb=args.max_memory,
+            memory_per_run_mb=args.memory_per_run,
+        )
+    elif args.backend == "in-process":
+        backend = InProcessBackend(
+            n_workers=args.workers, base_parameters=get_script_parameters()
+        )
+    else:
+        backend = SlurmBackend(jobs_per_node=args.jobs_per_node)
+
+    if args.adaptive:
+        planner = AdaptiveSweepPlanner(
+            runner.get_long_parameter_grid(),
+            metric=args.metric,
+            n_initial=args.initial,
+            batch_size=args.batch_size,
+            sampler=args.sampler,
+        )
+        runner.run_adaptive(
+            backend, planner, n_batches=args.batches, plan_ahead=args.plan_ahead
+        )
+    else:
+        runner.run(backend)
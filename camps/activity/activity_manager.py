@@ -63,7 +63,20 @@ class CampActivityManager(ActivityManager):
         except AttributeError:
             return subgroup
 
+    def start_medical_care_timestep(self):
+        """
+        Lets the medical care policies that keep state across time steps, like
+        Isolation, update it once before people move.
+        """
+        if self.policies is None:
+            return
+        for policy in self.policies.medical_care_policies:
+            start_timestep = getattr(policy, "start_timestep", None)
+            if start_timestep is not None:
+                start_timestep(world=self.world, days_from_start=self.timer.now)
+
     def do_timestep(self, *args, **kwargs):
+        self.start_medical_care_timestep()
         ret = super().do_timestep(*args, **kwargs)
         self.activate_next_shift()
         return ret
@@ -0,0 +1,343 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import logging
+import warnings
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+logger = logging.getLogger("adaptive")
+
+# parameters that do not describe the scenario of a run
+non_scenario_parameters = ("save_path", "s", "random_seed")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(
+        value, (bool, np.bool_)
+    )
+
+
+class GridEncoder:
+    """
+    Maps the parameter sets of a grid to points of the unit hypercube.
+    Numerical parameters are scaled to [0, 1] over the values they take in the
+    grid, booleans become 0 or 1 and anything else, or a parameter missing
+    from some of the sets, is one-hot encoded. Parameters with a single value
+    are left out.
+    """
+
+    def __init__(self, parameter_grid: List[dict]):
+        names = []
+        for parameters in parameter_grid:
+            names += [name for name in parameters if name not in names]
+        self.numerical = {}
+        self.categorical = {}
+        for name in names:
+            if name in non_scenario_parameters:
+                continue
+            values = [parameters.get(name) for parameters in parameter_grid]
+            if all(isinstance(value, (bool, np.bool_)) for value in values):
+                values = [float(value) for value in values]
+            if all(_is_number(value) for value in values):
+                low, high = min(values), max(values)
+                if high > low:
+                    self.numerical[name] = (low, high)
+            else:
+                categories = sorted({repr(value) for value in values})
+                if len(categories) > 1:
+                    self.categorical[name] = categories
+        self.columns = list(self.numerical) + [
+            f"{name}={category}"
+            for name, categories in self.categorical.items()
+            for category in categories
+        ]
+
+    @property
+    def n_dimensions(self) -> int:
+        return len(self.columns)
+
+    @property
+    def n_numerical(self) -> int:
+        """
+        Number of leading columns that hold numerical parameters.
+        """
+        return len(self.numerical)
+
+    def encode(self, parameter_grid: List[dict]) -> np.ndarray:
+        points = np.zeros((len(parameter_grid), self.n_dimensions))
+        for ii, parameters in enumerate(parameter_grid):
+            for jj, (name, (low, high)) in enumerate(self.numerical.items()):
+                points[ii, jj] = (float(parameters[name]) - low) / (high - low)
+            column = self.n_numerical
+            for name, categories in self.categorical.items():
+                category = categories.index(repr(parameters.get(name)))
+                points[ii, column + category] = 1.0
+                column += len(categories)
+        return points
+
+
+class AdaptiveSweepPlanner:
+    """
+    Chooses which parameter sets of a grid to run, batch by batch, instead of
+    running the whole grid.
+
+    The first batch is a space-filling design: a Latin hypercube or Sobol
+    sample of the encoded parameter space, each point snapped to the nearest
+    parameter set not chosen yet. Later batches fit a Gaussian process to the
+    metric of the finished runs and choose the parameter sets where
+    std * (1 + gradient_weight * g) is largest, g being the norm of the
+    gradient of the surrogate mean relative to its largest value on the grid,
+    so runs go where the surrogate is uncertain, first where the metric
+    changes quickly. Within a batch, every chosen set is added to the
+    surrogate with its predicted value before choosing the next one, which
+    lowers the uncertainty around it and spreads the batch out. Planning
+    stops when no remaining set scores above tolerance, in units of the
+    standard deviation of the metric over the runs. Batches proposed before
+    the earlier ones have results fill the space, so callers should wait
+    for them, as ClusterRunner.run_adaptive does.
+
+    Parameters
+    ----------
+    parameter_grid
+        list of dictionaries of run parameters, as produced by named_grids.
+        Planned runs are indices into it.
+    metric
+        column of the runs table of camps.results.SweepResultStore to model
+    n_initial
+        size of the space-filling batch, twice the number of encoded
+        dimensions plus two if not given
+    batch_size
+        number of runs of every later batch
+    sampler
+        "lhs" or "sobol"
+    gradient_weight
+        weight of the gradient of the surrogate mean in the score
+    tolerance
+        score below which a parameter set is not worth running
+    seed
+        seed of the initial design and of the surrogate fit
+    """
+
+    def __init__(
+        self,
+        parameter_grid: List[dict],
+        metric: str = "peak_infections",
+        n_initial: Optional[int] = None,
+        batch_size: int = 8,
+        sampler: str = "lhs",
+        gradient_weight: float = 1.0,
+        tolerance: float = 0.05,
+        seed: int = 999,
+    ):
+        if sampler not in ("lhs", "sobol"):
+            raise ValueError(f"sampler is lhs or sobol, not {sampler}")
+        self.parameter_grid = list(parameter_grid)
+        self.encoder = GridEncoder(self.parameter_grid)
+        self.points = self.encoder.encode(self.parameter_grid)
+        self.metric = metric
+        if n_initial is None:
+            n_initial = 2 * self.encoder.n_dimensions + 2
+        self.n_initial = min(n_initial, len(self.parameter_grid))
+        self.batch_size = batch_size
+        self.sampler = sampler
+        self.gradient_weight = gradient_weight
+        self.tolerance = tolerance
+        self.seed = seed
+
+    def get_observations(self, results) -> Dict[int, float]:
+        """
+        Metric of every finished run of the grid in a SweepResultStore.
+        """
+        runs = results.get_runs()
+        if self.metric not in runs:
+            return {}
+        values = runs[self.metric].dropna()
+        return {
+            int(run): float(value)
+            for run, value in values.items()
+            if 0 <= run < len(self.parameter_grid)
+        }
+
+    def initial_design(self, exclude: Iterable[int] = ()) -> List[int]:
+        """
+        Indices of a space-filling sample of the grid.
+        """
+        available = np.ones(len(self.parameter_grid), dtype=bool)
+        available[list(exclude)] = False
+        n_runs = min(self.n_initial, int(available.sum()))
+        if n_runs == 0:
+            return []
+        if self.encoder.n_dimensions == 0:
+            return list(np.flatnonzero(available)[:n_runs])
+        if self.sampler == "lhs":
+            engine = qmc.LatinHypercube(d=self.encoder.n_dimensions, seed=self.seed)
+        else:
+            engine = qmc.Sobol(d=self.encoder.n_dimensions, seed=self.seed)
+        with warnings.catch_warnings():
+            # Sobol points balance best in powers of two
+            warnings.simplefilter("ignore", UserWarning)
+            samples = engine.random(n_runs)
+        chosen = []
+        for sample in samples:
+            distances = np.linalg.norm(self.points - sample, axis=1)
+            distances[~available] = np.inf
+            index = int(np.argmin(distances))
+            available[index] = False
+            chosen.append(index)
+        return chosen
+
+    def fill_space(self, scheduled: Iterable[int], n_runs: int) -> List[int]:
+        """
+        Indices of the parameter sets furthest from the scheduled ones, used
+        while there are too few results to fit the surrogate.
+        """
+        scheduled = list(scheduled)
+        available = np.ones(len(self.parameter_grid), dtype=bool)
+        available[scheduled] = False
+        if scheduled:
+            distances = np.min(
+                np.linalg.norm(
+                    self.points[:, None, :] - self.points[None, scheduled, :], axis=2
+                ),
+                axis=1,
+            )
+        else:
+            distances = np.full(len(self.parameter_grid), np.inf)
+        chosen = []
+        for _ in range(min(n_runs, int(available.sum()))):
+            index = int(np.argmax(np.where(available, distances, -np.inf)))
+            available[index] = False
+            chosen.append(index)
+            distances = np.minimum(
+                distances, np.linalg.norm(self.points - self.points[index], axis=1)
+            )
+        return chosen
+
+    def fit(self, observations: Dict[int, float]) -> GaussianProcessRegressor:
+        """
+        Gaussian process of the standardised metric over the encoded grid,
+        with the noise between runs fitted by a white kernel and kept out of
+        the predicted standard deviation.
+        """
+        indices = list(observations)
+        values = np.array([observations[index] for index in indices])
+        self._mean, self._scale = values.mean(), values.std() or 1.0
+        kernel = ConstantKernel(1.0, (1e-2, 1e2)) * Matern(
+            length_scale=np.full(self.encoder.n_dimensions, 0.5),
+            length_scale_bounds=(1e-2, 1e2),
+            nu=2.5,
+        ) + WhiteKernel(1e-2, (1e-6, 1.0))
+        values = (values - self._mean) / self._scale
+        surrogate = GaussianProcessRegressor(
+            kernel=kernel, n_restarts_optimizer=2, random_state=self.seed
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            surrogate.fit(self.points[indices], values)
+        # refit without the white noise term so predicted deviations are those
+        # of the mean metric, not of a single run
+        return GaussianProcessRegressor(
+            kernel=surrogate.kernel_.k1,
+            alpha=surrogate.kernel_.k2.noise_level + 1e-10,
+            optimizer=None,
+        ).fit(self.points[indices], values)
+
+    def get_gradient_norm(self, surrogate, points: np.ndarray, step=1e-3):
+        """
+        Norm of the gradient of the surrogate mean along the numerical
+        parameters, by central differences.
+        """
+        squares = np.zeros(len(points))
+        for jj in range(self.encoder.n_numerical):
+            shift = np.zeros(self.encoder.n_dimensions)
+            shift[jj] = step
+            difference = surrogate.predict(points + shift) - surrogate.predict(
+                points - shift
+            )
+            squares += (difference / (2 * step)) ** 2
+        return np.sqrt(squares)
+
+    def get_scores(self, surrogate, points: np.ndarray) -> np.ndarray:
+        _, std = surrogate.predict(points, return_std=True)
+        gradient = self.get_gradient_norm(surrogate, points)
+        if gradient.max() > 0:
+            gradient = gradient / gradient.max()
+        return std * (1 + self.gradient_weight * gradient)
+
+    def propose(
+        self, observations: Dict[int, float], scheduled: Iterable[int] = ()
+    ) -> List[int]:
+        """
+        Indices of the next batch of runs. Scheduled runs, finished or not,
+        are never proposed again. An empty batch means the grid is exhausted
+        or no parameter set scores above tolerance.
+
+        Parameters
+        ----------
+        observations
+            metric of the finished runs by grid index
+        scheduled
+            indices of the runs already planned
+        """
+        scheduled = set(scheduled) | set(observations)
+        if not observations and not scheduled:
+            return self.initial_design()
+        if len(observations) < 3 or len(set(observations.values())) < 2:
+            return self.fill_space(scheduled, self.batch_size)
+        available = np.array(
+            [index not in scheduled for index in range(len(self.parameter_grid))]
+        )
+        if not available.any():
+            return []
+        surrogate = self.fit(observations)
+        indices = list(observations)
+        values = list(surrogate.predict(self.points[indices]))
+        chosen = []
+        for _ in range(min(self.batch_size, int(available.sum()))):
+            scores = self.get_scores(surrogate, self.points)
+            scores[~available] = -np.inf
+            index = int(np.argmax(scores))
+            if scores[index] < self.tolerance:
+                break
+            chosen.append(index)
+            available[index] = False
+            # believe the prediction, keeping the fitted kernel
+            indices.append(index)
+            values.append(float(surrogate.predict(self.points[[index]])[0]))
+            surrogate = GaussianProcessRegressor(
+                kernel=surrogate.kernel_, alpha=surrogate.alpha, optimizer=None
+            ).fit(self.points[indices], values)
+        logger.info(f"proposed {len(chosen)} runs from {len(observations)} results")
+        return chosen
+
+    def predict(self, observations: Dict[int, float]) -> pd.DataFrame:
+        """
+        Surrogate mean and standard deviation of the metric for every
+        parameter set of the grid, with the observed value where there is one.
+        """
+        surrogate = self.fit(observations)
+        mean, std = surrogate.predict(self.points, return_std=True)
+        prediction = pd.DataFrame(self.parameter_grid)
+        prediction[f"mean_{self.metric}"] = self._mean + self._scale * mean
+        prediction[f"std_{self.metric}"] = self._scale * std
+        prediction[self.metric] = pd.Series(observations, dtype=float)
+        return prediction
@@ -0,0 +1,356 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import gc
+import os
+import time
+import logging
+import datetime
+import traceback
+import multiprocessing
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from june.policy import Policies
+
+from camps.checkpoint import get_random_states, set_random_states
+from camps.instrumentation import RunProfiler, get_peak_rss_mb
+from camps.pipeline import (
+    RunPipeline,
+    finish_simulation,
+    get_checkpointer,
+    get_policies,
+    get_simulator,
+    parse_parameters,
+)
+from camps.policy import Isolation
+
+logger = logging.getLogger("branching")
+
+# parameters a branch can change, all of them only choose or tune its policies
+policy_parameters = (
+    "policy",
+    "isolation_units",
+    "isolation_time",
+    "isolation_testing",
+    "isolation_compliance",
+    "mask_wearing",
+    "mask_compliance",
+    "mask_beta_factor",
+    "no_vaccines",
+    "vaccines",
+)
+
+# state shared with the forked branches, set by the parent before forking
+_shared = {}
+
+
+def scenarios_from_policy_files(names) -> dict:
+    """
+    One scenario per policy file of configs_camps/defaults/policy, given by
+    its name without extension, eg. "isolation" or "mask_wearing". The
+    isolation and mask wearing files are chosen through their flags, so the
+    isolation and mask parameters of the run apply to them.
+    """
+    scenarios = {}
+    for name in names:
+        scenarios[name] = {
+            "policy": f"defaults/policy/{name}.yaml",
+            "isolation_units": name == "isolation",
+            "mask_wearing": name == "mask_wearing",
+            "no_vaccines": False,
+            "vaccines": False,
+        }
+    return scenarios
+
+
+def _same_policy(policy, other) -> bool:
+    if type(policy) is not type(other):
+        return False
+    try:
+        return bool(vars(policy) == vars(other))
+    except ValueError:
+        return False
+
+
+def apply_policy_set(
+    simulator, policies: Policies, branch_date: datetime.datetime, prefix_policies
+):
+    """
+    Switches the policies of a simulator that has run until branch_date to
+    the given set. A policy of the set that was also in prefix_policies, the
+    set the simulator was loaded with, keeps its running instance and so its
+    state, like the people it holds in isolation. The other policies of the
+    set start at branch_date at the earliest, and those of prefix_policies
+    left out of the set stop.
+
+    Parameters
+    ----------
+    simulator
+        simulator run until branch_date
+    policies
+        policy set of the branch, as loaded from its file
+    branch_date
+        date the branch starts at
+    prefix_policies
+        policy set the simulator was loaded with, as loaded from its file,
+        in the order of the simulator's policies
+    """
+    world = simulator.world
+    running = list(simulator.activity_manager.policies or [])
+    unmatched = list(zip(prefix_policies, running))
+    merged = []
+    for policy in policies:
+        match = next(
+            (pair for pair in unmatched if _same_policy(policy, pair[0])), None
+        )
+        if match is not None:
+            unmatched.remove(match)
+            merged.append(match[1])
+            continue
+        if isinstance(policy, Isolation) and world.isolation_units is None:
+            raise ValueError(
+                f"Branch policy {policy.spec} needs isolation units, "
+                f"but the world has none"
+            )
+        policy.start_time = max(policy.start_time, branch_date)
+        policy.initialize(world=world, date=branch_date, record=simulator.record)
+        merged.append(policy)
+    for _, policy in unmatched:
+        logger.info(f"Policy {policy.spec} stops at {branch_date.date()}")
+    simulator.activity_manager.policies = Policies(merged)
+    if getattr(simulator, "epidemiology", None) is not None:
+        # the epidemiology keeps the medical care policies it was set up with
+        simulator.epidemiology.set_medical_care(
+            world=world, activity_manager=simulator.activity_manager
+        )
+
+
+def _run_branch(job) -> dict:
+    """
+    Runs one branch from the simulation state at the branch date, in a
+    process forked from the one that simulated it.
+    """
+    name, parameters = job
+    tick = time.perf_counter()
+    simulator = _shared["simulator"]
+    profiler = RunProfiler(name=name, verbose=False)
+    try:
+        with profiler.stage("simulate"):
+            record = simulator.record
+            record.move_to(parameters["save_path"])
+            if simulator.world.isolation_units is not None:
+                simulator.world.isolation_units.set_occupancy_record(record)
+            if simulator.checkpointer is not None:
+                simulator.checkpointer = get_checkpointer(parameters)
+            simulator.early_stopping = _shared["early_stopping"]
+            apply_policy_set(
+                simulator,
+                get_policies(parameters),
+                _shared["branch_date"],
+                _shared["prefix_policies"],
+            )
+            record.parameters_policies(activity_manager=simulator.activity_manager)
+            # random reseeds itself in forked processes
+            set_random_states(_shared["random_states"])
+            results = finish_simulation(simulator)
+        _shared["pipeline"].run(
+            parameters,
+            context={**_shared["context"], **results},
+            after="simulate",
+            profiler=profiler,
+            use_cache=False,
+        )
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return {
+        "name": name,
+        "save_path": str(parameters["save_path"]),
+        "status": "failed" if error else "done",
+        "error": error,
+        "stopped_early": simulator.stopped_early,
+        "wall_time": time.perf_counter() - tick,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "pid": os.getpid(),
+    }
+
+
+class ScenarioBrancher:
+    """
+    Runs policy scenarios that share their start. The simulation is run once
+    with the policies of the base parameters until the branch date, then
+    every scenario continues it in a process forked from there, with its own
+    policy set. Forked branches see the simulation state copy-on-write, and
+    all start from the same random state, so the differences between them
+    come from their policies rather than from noise.
+
+    The branch outputs hold the days before the branch date too, copied from
+    the prefix folder, so they read like full runs. Early stopping is only
+    checked after the branch date.
+
+    Parameters
+    ----------
+    parameters
+        run parameters of the shared start
+    branch_date
+        date the scenarios branch off at, or number of days from the start
+    scenarios
+        dictionary of scenario name to the policy parameters it overrides,
+        see policy_parameters and scenarios_from_policy_files
+    output_dir
+        directory where the prefix and every scenario are written, in folders
+        named after them
+    n_workers
+        number of branches simulated at the same time, the number of cores
+        if not given
+    pipeline
+        pipeline to run, the default stages are used if not given
+    """
+
+    def __init__(
+        self,
+        parameters: dict,
+        branch_date: Union[str, int, datetime.date],
+        scenarios: dict,
+        output_dir: str,
+        n_workers: Optional[int] = None,
+        pipeline: Optional[RunPipeline] = None,
+    ):
+        for name, scenario in scenarios.items():
+            invalid = sorted(set(scenario) - set(policy_parameters))
+            if invalid:
+                raise ValueError(
+                    f"Scenario {name} changes {', '.join(invalid)}, "
+                    f"branches can only change {', '.join(policy_parameters)}"
+                )
+        self.parameters = parse_parameters(parameters)
+        self.branch_date = branch_date
+        self.scenarios = scenarios
+        self.output_dir = Path(output_dir)
+        self.n_workers = n_workers or os.cpu_count()
+        self.pipeline = pipeline or RunPipeline()
+
+    def get_parameters(self, name: str) -> dict:
+        return parse_parameters(
+            {**self.parameters, **self.scenarios[name]},
+            save_path=self.output_dir / name,
+        )
+
+    def get_prefix_parameters(self) -> dict:
+        """
+        Parameters of the shared start. The world gets an isolation unit if
+        any branch isolates people, it stays empty until then.
+        """
+        parameters = {**self.parameters, "save_path": self.output_dir / "prefix"}
+        needs_isolation_units = any(
+            self.get_parameters(name)["isolation_units"] for name in self.scenarios
+        )
+        if needs_isolation_units and not parameters["isolation_units_at_hospitals"]:
+            parameters["isolation_units"] = True
+        return parameters
+
+    def get_branch_date(self, simulator) -> datetime.datetime:
+        """
+        Branch date as the start of a day within the simulated period.
+        """
+        initial_date = simulator.timer.initial_date
+        if isinstance(self.branch_date, int):
+            branch_date = initial_date + datetime.timedelta(days=self.branch_date)
+        else:
+            if isinstance(self.branch_date, str):
+                date = datetime.date.fromisoformat(self.branch_date)
+            else:
+                date = self.branch_date
+            branch_date = datetime.datetime.combine(date, datetime.time())
+        if not initial_date <= branch_date < simulator.timer.final_date:
+            raise ValueError(
+                f"Branch date {branch_date.date()} is not between "
+                f"{initial_date.date()} and {simulator.timer.final_date.date()}"
+            )
+        return branch_date
+
+    def simulate_prefix(self, profiler: RunProfiler):
+        """
+        Simulates the shared start, returning the pipeline context and the
+        simulator at the branch date.
+        """
+        parameters = self.get_prefix_parameters()
+        context = self.pipeline.run(
+            parameters,
+            until="configure_leisure",
+            profiler=profiler,
+            save_profile=False,
+            use_cache=False,
+        )
+        # the prefix runs the base policies, whatever its world was built for
+        context["policies"] = get_policies(self.parameters)
+        with profiler.stage("simulate_prefix"):
+            simulator = get_simulator(context, parameters)
+            branch_date = self.get_branch_date(simulator)
+            early_stopping, simulator.early_stopping = simulator.early_stopping, None
+            simulator.run(until=branch_date)
+        return context, simulator, branch_date, early_stopping
+
+    def run(self, names=None) -> Iterator[dict]:
+        """
+        Simulates the shared start, then the scenarios, yielding the result
+        of each as soon as it finishes.
+
+        Parameters
+        ----------
+        names
+            names of the scenarios to run, all of them if not given
+        """
+        names = list(self.scenarios if names is None else names)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        profiler = RunProfiler(name="prefix")
+        context, simulator, branch_date, early_stopping = self.simulate_prefix(
+            profiler
+        )
+        profiler.save(self.output_dir, filename="profile_prefix.json")
+        logger.info(
+            f"Branching {len(names)} scenarios at {branch_date.date()}, "
+            f"{(branch_date - simulator.timer.initial_date).days} days shared"
+        )
+        _shared.update(
+            pipeline=self.pipeline,
+            context=context,
+            simulator=simulator,
+            branch_date=branch_date,
+            early_stopping=early_stopping,
+            prefix_policies=list(get_policies(self.parameters)),
+            random_states=get_random_states(),
+        )
+        jobs = [(name, self.get_parameters(name)) for name in names]
+        mp_context = multiprocessing.get_context("fork")
+        # keep the garbage collector from touching, and so copying, the
+        # pages of the shared simulation in the branches
+        gc.collect()
+        gc.freeze()
+        try:
+            with mp_context.Pool(
+                min(self.n_workers, len(jobs)), maxtasksperchild=1
+            ) as pool:
+                for result in pool.imap_unordered(_run_branch, jobs):
+                    if result["error"] is not None:
+                        logger.error(
+                            f"Scenario {result['name']} failed:\n{result['error']}"
+                        )
+                    yield result
+        finally:
+            gc.unfreeze()
+            _shared.clear()
@@ -0,0 +1,308 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import sys
+import gzip
+import pickle
+import random
+import logging
+import itertools
+import threading
+from enum import EnumMeta, IntEnum
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import tables
+
+try:
+    # private module of numba, holding the generators of compiled code
+    from numba import _helperlib
+except ImportError:
+    _helperlib = None
+
+from june.demography import Person
+
+from camps.groups import isolation_unit
+
+logger = logging.getLogger("checkpoint")
+
+checkpoint_version = 1
+# pickling follows references depth first, through long chains of people and
+# groups, so it runs in a thread with a large stack
+pickle_stack_size = 512 * 1024 ** 2
+pickle_recursion_limit = 1_000_000
+
+
+def _make_int_enum(name, members):
+    return IntEnum(name, members)
+
+
+def _make_none():
+    return None
+
+
+class CheckpointPickler(pickle.Pickler):
+    """
+    Pickler for the state of a simulation. june groups create their
+    SubgroupType enumeration for every instance, which pickle can not find by
+    name, so these are rebuilt from their members. The event records of june
+    keep the hdf5 table they created, in a file closed since, and reopen the
+    file to write, so these tables are stored as None.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, tables.Node):
+            return _make_none, ()
+        if isinstance(obj, EnumMeta) and issubclass(obj, IntEnum):
+            module = sys.modules.get(obj.__module__)
+            if getattr(module, obj.__qualname__, None) is not obj:
+                members = {member.name: member.value for member in obj}
+                return _make_int_enum, (obj.__name__, members)
+        return NotImplemented
+
+
+def _in_large_stack(function, *args):
+    result = {}
+
+    def target():
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, pickle_recursion_limit))
+        try:
+            result["value"] = function(*args)
+        except BaseException as error:
+            result["error"] = error
+        finally:
+            sys.setrecursionlimit(limit)
+
+    stack_size = threading.stack_size(pickle_stack_size)
+    try:
+        thread = threading.Thread(target=target)
+        thread.start()
+    finally:
+        threading.stack_size(stack_size)
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def get_random_states() -> dict:
+    """
+    States of the generators of random, numpy, and of numba compiled code,
+    which keeps its own numpy and random generators. The numba states are
+    left out, with a warning, if this numba does not expose them.
+    """
+    states = {"random": random.getstate(), "numpy": np.random.get_state()}
+    try:
+        states["numba_numpy"] = _helperlib.rnd_get_state(
+            _helperlib.rnd_get_np_state_ptr()
+        )
+        states["numba_random"] = _helperlib.rnd_get_state(
+            _helperlib.rnd_get_py_state_ptr()
+        )
+    except AttributeError:
+        logger.warning(
+            "Can not read the random states of numba, runs from this state "
+            "may draw different numbers in compiled code"
+        )
+    return states
+
+
+def set_random_states(states: dict):
+    random.setstate(states["random"])
+    np.random.set_state(states["numpy"])
+    if "numba_numpy" not in states:
+        return
+    try:
+        _helperlib.rnd_set_state(
+            _helperlib.rnd_get_np_state_ptr(), states["numba_numpy"]
+        )
+        _helperlib.rnd_set_state(
+            _helperlib.rnd_get_py_state_ptr(), states["numba_random"]
+        )
+    except (AttributeError, TypeError, ValueError):
+        logger.warning(
+            "Can not set the random states of numba, compiled code goes on "
+            "from its current state"
+        )
+
+
+def get_counters() -> dict:
+    """
+    Next values of the module level counters handing out person ids and the
+    order of isolation unit releases. Reading a counter moves it on, so it is
+    replaced by one starting at the value read.
+    """
+    counters = {
+        "person_ids": next(Person._id),
+        "isolation_heap_order": next(isolation_unit._heap_order),
+    }
+    set_counters(counters)
+    return counters
+
+
+def set_counters(counters: dict):
+    Person._id = itertools.count(counters["person_ids"])
+    isolation_unit._heap_order = itertools.count(counters["isolation_heap_order"])
+
+
+def get_output_state(record_path) -> dict:
+    """
+    Sizes of the csv files, and numbers of rows of the tables of the hdf5
+    files, in a record folder.
+    """
+    record_path = Path(record_path)
+    state = {"files": {}, "tables": {}}
+    for path in sorted(record_path.glob("*.csv")):
+        state["files"][path.name] = path.stat().st_size
+    for path in sorted(record_path.glob("*.h5")):
+        with tables.open_file(str(path), mode="r") as f:
+            state["tables"][path.name] = {
+                table._v_pathname: table.nrows for table in f.walk_nodes("/", "Table")
+            }
+    return state
+
+
+def restore_output_state(record_path, state: dict):
+    """
+    Truncates the outputs in a record folder to the state they had when
+    get_output_state was called, dropping the rows written since.
+    """
+    record_path = Path(record_path)
+    for name, size in state["files"].items():
+        path = record_path / name
+        if path.exists() and path.stat().st_size > size:
+            os.truncate(path, size)
+    for name, nrows in state["tables"].items():
+        path = record_path / name
+        if not path.exists():
+            continue
+        with tables.open_file(str(path), mode="a") as f:
+            for table in list(f.walk_nodes("/", "Table")):
+                if table._v_pathname not in nrows:
+                    table._f_remove()
+                elif table.nrows > nrows[table._v_pathname]:
+                    table.truncate(nrows[table._v_pathname])
+
+
+class SimulationCheckpointer:
+    """
+    Writes the state of a CampSimulator every few simulated days, so a run
+    that is stopped can go on from its last checkpoint with the same results.
+
+    A checkpoint holds the simulator, and through it the world, the infections,
+    the policies, the timer and the record, pickled as one object graph and
+    gzipped, along with the states of the random generators and counters. The
+    outputs written so far are not copied: their sizes are kept, and resuming
+    truncates them to these. Checkpoints are written to a temporary file and
+    renamed, so a run killed while writing keeps the previous one, and only
+    the latest keep checkpoints are kept.
+
+    Parameters
+    ----------
+    path
+        folder of the checkpoints
+    every
+        days between checkpoints
+    keep
+        number of checkpoints kept
+    compression
+        gzip compression level
+    """
+
+    prefix = "checkpoint_"
+    suffix = ".pkl.gz"
+
+    def __init__(self, path, every: int = 10, keep: int = 2, compression: int = 1):
+        self.path = Path(path)
+        self.every = every
+        self.keep = keep
+        self.compression = compression
+
+    def is_due(self, simulator) -> bool:
+        """
+        Whether the day that just ended is a checkpoint day.
+        """
+        days = int(round(simulator.timer.now))
+        return days > 0 and days % self.every == 0
+
+    def get_path(self, date) -> Path:
+        return self.path / f"{self.prefix}{date.strftime('%Y-%m-%d')}{self.suffix}"
+
+    def save(self, simulator) -> Path:
+        """
+        Writes a checkpoint of the simulator, to continue from the time step
+        its timer is at.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        state = {
+            "version": checkpoint_version,
+            "date": simulator.timer.date,
+            "simulator": simulator,
+            "random_states": get_random_states(),
+            "counters": get_counters(),
+            "outputs": (
+                get_output_state(simulator.record.record_path)
+                if simulator.record is not None
+                else None
+            ),
+        }
+        path = self.get_path(simulator.timer.date)
+        temporary_path = path.with_name(path.name + ".tmp")
+
+        def dump():
+            with gzip.open(temporary_path, "wb", compresslevel=self.compression) as f:
+                CheckpointPickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(state)
+
+        _in_large_stack(dump)
+        os.replace(temporary_path, path)
+        logger.info(f"Saved checkpoint {path}")
+        for old_path in self.get_checkpoints()[: -self.keep]:
+            old_path.unlink()
+        return path
+
+    def get_checkpoints(self) -> list:
+        """
+        Checkpoints in the folder, oldest first.
+        """
+        return sorted(self.path.glob(f"{self.prefix}*{self.suffix}"))
+
+    def get_latest(self) -> Optional[Path]:
+        checkpoints = self.get_checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    @staticmethod
+    def load(path):
+        """
+        Reads the simulator of a checkpoint, and sets the random generators,
+        counters and outputs back to their state at the checkpoint.
+        """
+        with gzip.open(path, "rb") as f:
+            state = pickle.load(f)
+        if state["version"] != checkpoint_version:
+            raise ValueError(
+                f"{path} has version {state['version']}, "
+                f"checkpoints of version {checkpoint_version} can be read"
+            )
+        simulator = state["simulator"]
+        set_random_states(state["random_states"])
+        set_counters(state["counters"])
+        if state["outputs"] is not None:
+            restore_output_state(simulator.record.record_path, state["outputs"])
+        logger.info(f"Resuming from checkpoint {path} at {state['date']}")
+        return simulator
@@ -446,7 +446,7 @@ class CampHouseholdDistributor:
         n_men = len([person for age in men_by_age for person in men_by_age[age]])
         n_women = len([person for age in women_by_age for person in women_by_age[age]])
         assert n_men + n_women + n_kids == len(area.people)
-        print(f"Distributing {len(area.people)} people to {area.name}")
+        logger.debug(f"Distributing {len(area.people)} people to {area.name}")
 
         # put adults households with kids start
         Intersection = intersection(Houses_W_Children, households_with_space)
@@ -15,11 +15,10 @@ See the GNU General Public License for more details.
 """
 
 import logging
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 
 import numpy as np
 import pandas as pd
-import random
 import yaml
 from scipy import stats
 
@@ -34,6 +33,8 @@ default_area_region_path = (
     paths.camp_data_path / "input/geography/area_super_area_region.csv"
 )
 
+logger = logging.getLogger("learning_center_distributor")
+
 
 class LearningCenterDistributor:
     """
@@ -122,13 +123,17 @@ class LearningCenterDistributor:
             for k, f in df.groupby("CampID")
         }
 
-    def distribute_kids_to_learning_centers(self, areas: "Areas"):
+    def distribute_kids_to_learning_centers(self, areas: "Areas") -> Dict[str, int]:
         """
         Given a list of areas, distribute kids in the area to the ```self.neighbour_centers``` closest
         learning centers. Kids will be distributed according to the enrollment rates of their sex and age cohort.
         If a chosen learning center is already over capacity, find another one. If all the closest ones
         are full, pick one at random. Shifts are also assigned uniformly
 
+        The closest learning centers of all areas are found in a single tree query, and the
+        remaining capacity of every learning center is kept in a single array, so that
+        all the enrolled kids of an area are assigned in one pass.
+
         Parameters
         ----------
         areas
@@ -136,41 +141,188 @@ class LearningCenterDistributor:
 
         Returns
         -------
-        None
+        Dictionary with the number of enrolled kids and the number of kids that could not
+        find a learning center with availability (overflow)
         """
-
-        for area in areas.members:
-            region = self.area_region_df[self.area_region_df["area"] == area.name][
-                "region"
-            ].iloc[0]
-            closest_centers_idx = self.learning_centers.get_closest(
-                coordinates=area.coordinates, k=self.neighbour_centers
+        area_to_region = dict(
+            zip(self.area_region_df["area"], self.area_region_df["region"])
+        )
+        remaining_capacity = self._get_remaining_capacity()
+        closest_centers_per_area = self.learning_centers.get_closest_many(
+            coordinates=np.array([area.coordinates for area in areas.members]),
+            k=self.neighbour_centers,
+        )
+        n_enrolled = 0
+        n_overflow = 0
+        for area, closest_centers_idx in zip(areas.members, closest_centers_per_area):
+            region = area_to_region[area.name]
+            kids = self._get_enrolled_kids(area.people, region)
+            if not kids:
+                continue
+            n_enrolled += len(kids)
+            n_overflow += self.send_kids_to_closest_centers_with_availability(
+                kids, closest_centers_idx, remaining_capacity=remaining_capacity
+            )
+        if n_overflow > 0:
+            logger.info(
+                f"{n_overflow} of {n_enrolled} enrolled kids could not find "
+                f"a learning center with availability"
             )
-            for person in area.people:
+        return {"n_enrolled": n_enrolled, "n_overflow": n_overflow}
+
+    def redistribute_kids_near_centers(
+        self, areas: "Areas", new_centers_idx: List[int]
+    ) -> Dict[str, int]:
+        """
+        After learning centers have been added to ```self.learning_centers```, redistribute
+        only the kids of the areas that have any of the new learning centers among their
+        ```self.neighbour_centers``` closest ones. Enrolled kids keep their enrollment, but
+        are removed from their current learning center and shift, and sent again to their
+        closest learning centers with availability.
+
+        Parameters
+        ----------
+        areas
+            areas object where people to be distributed live
+        new_centers_idx
+            ids of the added learning centers
+
+        Returns
+        -------
+        Dictionary with the number of redistributed kids and the number of kids that could
+        not find a learning center with availability (overflow)
+        """
+        closest_centers_per_area = self.learning_centers.get_closest_many(
+            coordinates=np.array([area.coordinates for area in areas.members]),
+            k=self.neighbour_centers,
+        )
+        affected = np.isin(closest_centers_per_area, new_centers_idx).any(axis=1)
+        kids_per_area = {}
+        removed_ids_per_center = {}
+        for area_idx in np.flatnonzero(affected):
+            kids = []
+            for person in areas.members[area_idx].people:
+                subgroup = person.primary_activity
                 if (
-                    person.sex == "m"
-                    and self.male_enrollment_rates[region][person.age] != 0
-                ):
-                    if (
-                        random.random()
-                        <= self.male_enrollment_rates[region][person.age]
-                    ):
-                        self.send_kid_to_closest_center_with_availability(
-                            person, closest_centers_idx
-                        )
-                elif (
-                    person.sex == "f"
-                    and self.female_enrollment_rates[region][person.age] != 0
+                    subgroup is None
+                    or subgroup.group.spec != "learning_center"
+                    or subgroup.subgroup_type != subgroup.group.SubgroupType.students
                 ):
-                    if (
-                        random.random()
-                        <= self.female_enrollment_rates[region][person.age]
-                    ):
-                        self.send_kid_to_closest_center_with_availability(
-                            person, closest_centers_idx
-                        )
-                else:
                     continue
+                if person in subgroup.people:
+                    subgroup.remove(person)
+                person.subgroups.primary_activity = None
+                removed_ids_per_center.setdefault(subgroup.group, set()).add(person.id)
+                kids.append(person)
+            kids_per_area[area_idx] = kids
+        for learning_center, removed_ids in removed_ids_per_center.items():
+            for shift, ids in learning_center.ids_per_shift.items():
+                learning_center.ids_per_shift[shift] = [
+                    person_id for person_id in ids if person_id not in removed_ids
+                ]
+        remaining_capacity = self._get_remaining_capacity()
+        n_redistributed = 0
+        n_overflow = 0
+        for area_idx, kids in kids_per_area.items():
+            if not kids:
+                continue
+            n_redistributed += len(kids)
+            n_overflow += self.send_kids_to_closest_centers_with_availability(
+                kids,
+                closest_centers_per_area[area_idx],
+                remaining_capacity=remaining_capacity,
+            )
+        logger.info(
+            f"Redistributed {n_redistributed} kids in {int(affected.sum())} areas "
+            f"close to {len(new_centers_idx)} new learning center(s)"
+        )
+        return {"n_redistributed": n_redistributed, "n_overflow": n_overflow}
+
+    def _get_enrolled_kids(self, people: List["Person"], region: str) -> List["Person"]:
+        """
+        Draws the enrollment of all the given people at once, according to
+        the enrollment rates of their sex and age in the region.
+        """
+        if not people:
+            return []
+        ages = np.fromiter((person.age for person in people), dtype=int, count=len(people))
+        is_male = np.fromiter(
+            (person.sex == "m" for person in people), dtype=bool, count=len(people)
+        )
+        rates = np.where(
+            is_male,
+            np.asarray(self.male_enrollment_rates[region])[ages],
+            np.asarray(self.female_enrollment_rates[region])[ages],
+        )
+        enrolled = (rates > 0) & (np.random.random(len(people)) <= rates)
+        return [people[i] for i in np.flatnonzero(enrolled)]
+
+    def _get_remaining_capacity(self) -> np.ndarray:
+        """
+        Remaining number of pupils each learning center can take. Learning centers
+        without teachers are treated as having no availability.
+        """
+        return np.array(
+            [
+                center.n_pupils_max - len(center.students)
+                if len(center.teachers) > 0
+                else 0
+                for center in self.learning_centers.members
+            ],
+            dtype=float,
+        )
+
+    def send_kids_to_closest_centers_with_availability(
+        self,
+        kids: List["Person"],
+        closest_centers_idx: List[int],
+        remaining_capacity: Optional[np.ndarray] = None,
+    ) -> int:
+        """
+        Sends the given kids to their closest learning centers with availability,
+        filling the centers in order of proximity. Kids that do not fit in any of
+        the closest centers are sent to one of them at random. Shifts are drawn for
+        all kids at once.
+
+        Parameters
+        ----------
+        kids
+            people to be sent to learning centers, sharing the same closest centers
+        closest_centers_idx
+            ids of the closest centers, sorted by distance
+        remaining_capacity
+            remaining capacity of all learning centers, updated in place. If not given
+            it is computed from the current state of the learning centers
+
+        Returns
+        -------
+        Number of kids that did not find a learning center with availability
+        """
+        if remaining_capacity is None:
+            remaining_capacity = self._get_remaining_capacity()
+        closest_centers_idx = np.asarray(closest_centers_idx)
+        n_kids = len(kids)
+        cumulative_capacity = np.cumsum(
+            np.clip(remaining_capacity[closest_centers_idx], 0, None)
+        )
+        positions = np.searchsorted(cumulative_capacity, np.arange(n_kids), side="right")
+        overflow = positions >= len(closest_centers_idx)
+        n_overflow = int(overflow.sum())
+        positions[overflow] = np.random.randint(
+            0, len(closest_centers_idx), size=n_overflow
+        )
+        centers_idx = closest_centers_idx[positions]
+        np.subtract.at(remaining_capacity, centers_idx, 1)
+        shifts = np.random.randint(0, self.n_shifts, size=n_kids)
+        members = self.learning_centers.members
+        for kid, center_idx, shift in zip(kids, centers_idx, shifts):
+            center = members[center_idx]
+            center.add(
+                person=kid,
+                shift=int(shift),
+                subgroup_type=center.SubgroupType.students,
+            )
+        return n_overflow
 
     def send_kid_to_closest_center_with_availability(
         self, person: "Person", closest_centers_idx: List[int]
@@ -190,77 +342,57 @@ class LearningCenterDistributor:
         -------
         None
         """
-        for i in closest_centers_idx:
-            center = self.learning_centers.members[i]
-            if len(center.teachers) == 0:
-                continue
-            if len(center.students) >= center.n_pupils_max:
-                continue
-            else:
-                center.add(
-                    person=person,
-                    shift=random.randint(0, self.n_shifts - 1),
-                    subgroup_type=center.SubgroupType.students,
-                )
-                return
-
-        center = self.learning_centers[random.choice(closest_centers_idx)]
-        center.add(
-            person=person,
-            shift=random.randint(0, self.n_shifts - 1),
-            subgroup_type=center.SubgroupType.students,
+        self.send_kids_to_closest_centers_with_availability(
+            [person], closest_centers_idx
         )
-        return
 
-    def distribute_teachers_to_learning_centers(self, areas: "Areas"):
+    def distribute_teachers_to_learning_centers(
+        self,
+        areas: "Areas",
+        learning_centers: Optional[List["LearningCenter"]] = None,
+    ):
         """
-        Distribute teachers from closest area to the learning center. There is only
-        one teacher per learning center currently
+        Distribute teachers from closest area to the learning center. The number of
+        teachers of every learning center is drawn from a Poisson distribution, and they
+        are picked from the eligible adults (older than ```self.teacher_min_age``` and
+        without a primary activity) of the closest area that has any. The eligible
+        adults of each area are only gathered once.
 
         Parameters
         ----------
         areas
             Instance of the Areas class (group of Area classes)
+        learning_centers
+            Learning centers to staff. Defaults to all the learning centers
 
         Returns
         -------
         None
         """
-        area_k_max = 5
-        if len(areas) < area_k_max:
-            area_k_max = len(areas)
-
-        for learning_center in self.learning_centers.members:
-            # Find closest area to learning center
-            area = areas.get_closest_areas(
-                coordinates=learning_center.coordinates,
-                k=area_k_max,
-                return_distance=False,
-            )
-            area_k = 0
-            while True:
-                # get someone in working age
-                old_people = [
-                    person
-                    for person in area[area_k].people
-                    if person.age >= self.teacher_min_age
-                    and person.primary_activity is None
-                ]
-                if len(old_people) > 0:
+        if learning_centers is None:
+            learning_centers = self.learning_centers.members
+        if not learning_centers:
+            return
+        area_k_max = min(5, len(areas))
+        closest_areas = areas.get_closest_areas(
+            coordinates=np.array([lc.coordinates for lc in learning_centers]),
+            k=area_k_max,
+            return_distance=False,
+        )
+        n_teachers_per_center = np.random.poisson(3, size=len(learning_centers)) + 1
+        pools = {}
+        for i, learning_center in enumerate(learning_centers):
+            for area in closest_areas[i * area_k_max : (i + 1) * area_k_max]:
+                if area.id not in pools:
+                    pools[area.id] = _EligibleAdultsPool(
+                        area.people, min_age=self.teacher_min_age
+                    )
+                pool = pools[area.id]
+                if len(pool) > 0:
                     break
-
-                if len(old_people) == 0:
-                    area_k += 1
-                    if area_k >= area_k_max or area_k == len(area):
-                        break
-
-            if len(old_people) == 0:
+            else:
                 continue
-
-            NTeachers = int(np.random.poisson(3) + 1)
-            if NTeachers > len(old_people):
-                NTeachers = len(old_people)
-            teachers = np.random.choice(old_people, NTeachers, replace=False)
+            teachers = pool.draw(int(n_teachers_per_center[i]))
             # add the teacher to all shifts in the school
             for teacher in teachers:
                 for shift in range(self.n_shifts):
@@ -269,3 +401,40 @@ class LearningCenterDistributor:
                         shift=shift,
                         subgroup_type=learning_center.SubgroupType.teachers,
                     )
+
+
+class _EligibleAdultsPool:
+    """
+    Indices of the people of an area that can become teachers. Drawn people are
+    swapped to the end of the active part of the array, so removing them is O(1).
+    """
+
+    def __init__(self, people: List["Person"], min_age: int):
+        self.people = people
+        self.indices = np.array(
+            [
+                i
+                for i, person in enumerate(people)
+                if person.age >= min_age and person.primary_activity is None
+            ],
+            dtype=int,
+        )
+        self.size = len(self.indices)
+
+    def __len__(self):
+        return self.size
+
+    def draw(self, n: int) -> List["Person"]:
+        """
+        Draws up to n people without replacement, removing them from the pool.
+        """
+        drawn = []
+        for _ in range(min(n, self.size)):
+            i = np.random.randint(self.size)
+            self.size -= 1
+            self.indices[i], self.indices[self.size] = (
+                self.indices[self.size],
+                self.indices[i],
+            )
+            drawn.append(self.people[self.indices[self.size]])
+        return drawn
@@ -14,45 +14,392 @@ the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 See the GNU General Public License for more details.
 """
 
-from typing import List
+from typing import List, Tuple, Optional
 from june.groups import Group, Supergroup
 from june.demography import Person
 from june.groups.hospital import MedicalFacility, MedicalFacilities
 from enum import IntEnum
+from sklearn.neighbors import BallTree
 import numpy as np
+import itertools
+import heapq
+import tables
 
 import logging
 
 logger = logging.getLogger("isolation units")
 
+default_occupancy_buffer_size = 4096
+occupancy_dtype = np.dtype(
+    [
+        ("time", np.float64),
+        ("isolation_unit_id", np.int32),
+        ("n_patients", np.int32),
+        ("n_waitlisted", np.int32),
+    ]
+)
+# tie breaker so that heap entries never compare people
+_heap_order = itertools.count()
+
 
 class IsolationUnit(Group, MedicalFacility):
-    def __init__(self, area, age_group_limits: List[int] = [0, 17, 100]):
+    def __init__(
+        self,
+        area,
+        age_group_limits: List[int] = [0, 17, 100],
+        n_beds: Optional[int] = None,
+    ):
+        """
+        Isolation unit where symptomatic people quarantine after testing.
 
+        Parameters
+        ----------
+        area
+            Area where the isolation unit is located
+        age_group_limits
+            Age limits of the people the unit takes in
+        n_beds
+            Number of patients the unit can hold at once. If None, the unit
+            has unlimited capacity
+        """
         super().__init__()
         self.age_group_limits = age_group_limits
         self.min_age = age_group_limits[0]
         self.max_age = age_group_limits[-1] - 1
         self.area = area
+        self.n_beds = n_beds
+        self.n_patients = 0
+        self.n_admitted = 0
+        self.release_times = {}
+        self._patients = {}
+        self._releases = []
 
     @property
     def coordinates(self):
         return self.area.coordinates
 
-    def add(self, person: Person):
+    @property
+    def has_capacity(self):
+        return self.n_beds is None or self.n_patients < self.n_beds
+
+    def add(self, person: Person, release_time: float = np.inf):
+        """
+        Adds a person to the isolation unit. A bed is taken the first time the
+        person is added, and kept until they are released.
+
+        Parameters
+        ----------
+        person
+            Patient to isolate
+        release_time
+            Time (in days from the start of the simulation) after which the
+            patient is released
+        """
+        if person.id not in self.release_times:
+            self.release_times[person.id] = release_time
+            self._patients[person.id] = person
+            self.n_patients += 1
+            self.n_admitted += 1
+            heapq.heappush(self._releases, (release_time, next(_heap_order), person))
         super().add(person=person, activity="medical_facility", subgroup_type=0)
 
+    def release_patient(self, person: Person):
+        """
+        Releases patient from the isolation unit, so they go back to their
+        usual activities from the next time step. Their bed is freed even if
+        they have left for hospital or died.
+        """
+        if self.release_times.pop(person.id, None) is not None:
+            self._patients.pop(person.id, None)
+            self.n_patients -= 1
+        if (
+            person.medical_facility is not None
+            and person.medical_facility.group is self
+        ):
+            person.subgroups.medical_facility = None
+
+    def release_patients(self, time: float) -> int:
+        """
+        Releases all patients whose quarantine ended before the given time,
+        including those who left for hospital or died while isolated.
+
+        Returns
+        -------
+        Number of released patients
+        """
+        n_released = 0
+        for person in list(self._patients.values()):
+            if person.dead or (
+                person.medical_facility is not None
+                and person.medical_facility.group is not self
+            ):
+                self.release_patient(person)
+                n_released += 1
+        while self._releases and self._releases[0][0] < time:
+            release_time, _, person = heapq.heappop(self._releases)
+            # entries of patients released earlier and readmitted are stale
+            if self.release_times.get(person.id) == release_time:
+                self.release_patient(person)
+                n_released += 1
+        return n_released
+
 
 class IsolationUnits(Supergroup, MedicalFacilities):
     venue_class = IsolationUnit
 
-    def __init__(self, isolation_units: List[IsolationUnit]):
+    def __init__(
+        self,
+        isolation_units: List[IsolationUnit],
+        occupancy_buffer_size: int = default_occupancy_buffer_size,
+    ):
+        """
+        Collection of isolation units. People who find every unit full wait in
+        a queue, where the most severe cases and those tested earliest go first.
+
+        Parameters
+        ----------
+        isolation_units
+            List of isolation units
+        occupancy_buffer_size
+            Number of occupancy rows kept in memory before they are written to
+            the records file
+        """
         super().__init__(isolation_units)
-        self.refused_to_go_ids = set()
+        self.n_refused = 0
+        self._closest_cache = {}
+        self._waitlist = []
+        self._waitlist_priorities = {}
+        self._occupancy = np.zeros(occupancy_buffer_size, dtype=occupancy_dtype)
+        self._n_occupancy_rows = 0
+        self.occupancy_record_filename = None
+        self.isolation_units_tree = None
+        if isolation_units and all(
+            isolation_unit.area is not None for isolation_unit in isolation_units
+        ):
+            self.isolation_units_tree = BallTree(
+                np.deg2rad(
+                    np.vstack(
+                        [
+                            np.array(isolation_unit.coordinates)
+                            for isolation_unit in isolation_units
+                        ]
+                    )
+                ),
+                metric="haversine",
+            )
         logger.info(f"There are {len(isolation_units)} isolation unit(s)")
 
-    def get_closest(self):
-        return self[0]
+    def _get_units_by_distance(self, coordinates: Tuple[float, float]) -> List[int]:
+        key = tuple(coordinates)
+        units_idx = self._closest_cache.get(key)
+        if units_idx is None:
+            units_idx = self.isolation_units_tree.query(
+                np.deg2rad(np.array(coordinates).reshape(1, -1)),
+                k=len(self.members),
+                return_distance=False,
+                sort_results=True,
+            )[0].tolist()
+            self._closest_cache[key] = units_idx
+        return units_idx
+
+    def get_closest(
+        self, coordinates: Optional[Tuple[float, float]] = None
+    ) -> Optional[IsolationUnit]:
+        """
+        Get the closest isolation unit with free beds to a given coordinate
+
+        Parameters
+        ----------
+        coordinates
+            latitude and longitude. If None, or if the units are not located,
+            units are tried in the order they were given
+
+        Returns
+        -------
+        Closest isolation unit with remaining capacity, None if all are full
+        """
+        if coordinates is None or self.isolation_units_tree is None:
+            units_idx = range(len(self.members))
+        else:
+            units_idx = self._get_units_by_distance(coordinates)
+        for unit_idx in units_idx:
+            isolation_unit = self.members[unit_idx]
+            if isolation_unit.has_capacity:
+                return isolation_unit
+        return None
+
+    @property
+    def n_waitlisted(self):
+        return len(self._waitlist_priorities)
+
+    @staticmethod
+    def _get_coordinates(person: Person):
+        if person.area is not None:
+            return person.area.coordinates
+        return None
+
+    def admit_patient(
+        self, person: Person, release_time: float = np.inf
+    ) -> Optional[IsolationUnit]:
+        """
+        Sends a person to the unit they are already isolated in, or to the
+        closest unit with free beds. If all units are full, or others are
+        already waiting for a bed, the person joins the waitlist.
+
+        Parameters
+        ----------
+        person
+            Person to isolate
+        release_time
+            Time (in days from the start of the simulation) after which the
+            patient is released
+
+        Returns
+        -------
+        Isolation unit the person has been sent to, None if they are waiting
+        """
+        if (
+            person.medical_facility is not None
+            and person.medical_facility.group.spec == "isolation_unit"
+        ):
+            isolation_unit = person.medical_facility.group
+        elif self._waitlist_priorities and person.id not in self._waitlist_priorities:
+            isolation_unit = None
+        else:
+            isolation_unit = self.get_closest(self._get_coordinates(person))
+        if isolation_unit is None:
+            self.add_to_waitlist(person, release_time=release_time)
+            return None
+        self._waitlist_priorities.pop(person.id, None)
+        isolation_unit.add(person, release_time=release_time)
+        return isolation_unit
+
+    def add_to_waitlist(self, person: Person, release_time: float = np.inf):
+        """
+        Puts a person in the queue for a bed, or updates their place in it if
+        their symptoms have changed.
+        """
+        priority = (-person.symptoms.tag.value, person.infection.time_of_testing)
+        if self._waitlist_priorities.get(person.id) == priority:
+            return
+        self._waitlist_priorities[person.id] = priority
+        heapq.heappush(
+            self._waitlist, (priority, next(_heap_order), release_time, person)
+        )
+
+    def admit_from_waitlist(self, time: float) -> int:
+        """
+        Fills free beds with people from the waitlist, most severe first.
+        People whose quarantine has ended, who recovered or went to hospital
+        leave the queue.
+
+        Returns
+        -------
+        Number of admitted patients
+        """
+        n_admitted = 0
+        while self._waitlist:
+            priority, _, release_time, person = self._waitlist[0]
+            if self._waitlist_priorities.get(person.id) != priority:
+                heapq.heappop(self._waitlist)
+                continue
+            if (
+                release_time < time
+                or not person.infected
+                or person.medical_facility is not None
+            ):
+                heapq.heappop(self._waitlist)
+                del self._waitlist_priorities[person.id]
+                continue
+            isolation_unit = self.get_closest(self._get_coordinates(person))
+            if isolation_unit is None:
+                break
+            heapq.heappop(self._waitlist)
+            del self._waitlist_priorities[person.id]
+            isolation_unit.add(person, release_time=release_time)
+            n_admitted += 1
+        return n_admitted
+
+    def release_patient(self, person: Person):
+        """
+        Releases a patient from the unit holding their bed, wherever they are
+        now.
+        """
+        for isolation_unit in self:
+            if person.id in isolation_unit.release_times:
+                isolation_unit.release_patient(person)
+                return
+
+    def release_patients(self, time: float) -> int:
+        """
+        Releases, in every unit, the patients whose quarantine ended before
+        the given time, and gives their beds to people on the waitlist.
+
+        Returns
+        -------
+        Number of released patients
+        """
+        n_released = sum(
+            isolation_unit.release_patients(time) for isolation_unit in self
+        )
+        if n_released > 0:
+            self.admit_from_waitlist(time)
+        return n_released
+
+    def set_occupancy_record(self, record):
+        """
+        Writes the occupancy time series to the file of the given record.
+        """
+        self.occupancy_record_filename = record.record_path / record.filename
+
+    def record_occupancy(self, time: float):
+        """
+        Stores the number of patients of every unit, and the length of the
+        waitlist, at the given time. Rows are kept in a fixed size buffer that
+        is written to the records file when full. Without a records file, the
+        oldest rows are overwritten.
+        """
+        buffer_size = len(self._occupancy)
+        n_waitlisted = self.n_waitlisted
+        for isolation_unit in self:
+            if (
+                self._n_occupancy_rows >= buffer_size
+                and self.occupancy_record_filename is not None
+            ):
+                self.flush_occupancy()
+            self._occupancy[self._n_occupancy_rows % buffer_size] = (
+                time,
+                isolation_unit.id,
+                isolation_unit.n_patients,
+                n_waitlisted,
+            )
+            self._n_occupancy_rows += 1
+
+    @property
+    def occupancy(self) -> np.ndarray:
+        """
+        Occupancy rows not yet written to the records file, oldest first.
+        """
+        buffer_size = len(self._occupancy)
+        if self._n_occupancy_rows <= buffer_size:
+            return self._occupancy[: self._n_occupancy_rows].copy()
+        start = self._n_occupancy_rows % buffer_size
+        return np.concatenate((self._occupancy[start:], self._occupancy[:start]))
 
-    def release_patient(self, person):
-        pass
+    def flush_occupancy(self):
+        """
+        Appends the buffered occupancy rows to the isolation_units_occupancy
+        table of the records file.
+        """
+        if self.occupancy_record_filename is None or self._n_occupancy_rows == 0:
+            return
+        occupancy = self.occupancy
+        with tables.open_file(self.occupancy_record_filename, mode="a") as file:
+            if "isolation_units_occupancy" not in file.root:
+                file.create_table(
+                    file.root, "isolation_units_occupancy", description=occupancy_dtype
+                )
+            table = file.root.isolation_units_occupancy
+            table.append(occupancy)
+            table.flush()
+        self._n_occupancy_rows = 0
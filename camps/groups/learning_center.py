@@ -122,9 +122,9 @@ class LearningCenters(Supergroup):
         """
         super().__init__(members=learning_centers)
         self.members = learning_centers
+        self._closest_cache = {}
         if learning_centers_tree:
-            coordinates = np.vstack([np.array(lc.coordinates) for lc in self.members])
-            self.learning_centers_tree = self._create_learning_center_tree(coordinates)
+            self._build_learning_center_tree()
         self.has_shifts = True
         self.n_shifts = n_shifts
 
@@ -266,6 +266,38 @@ class LearningCenters(Supergroup):
             learning_centers.append(lc)
         return cls(learning_centers, **kwargs)
 
+    def _build_learning_center_tree(self):
+        self.learning_centers_coordinates = np.vstack(
+            [np.array(lc.coordinates) for lc in self.members]
+        )
+        self.learning_centers_tree = self._create_learning_center_tree(
+            self.learning_centers_coordinates
+        )
+        self.n_centers_in_tree = len(self.learning_centers_coordinates)
+        self._closest_cache.clear()
+
+    def add_centers(self, learning_centers: List[LearningCenter]) -> np.ndarray:
+        """
+        Add learning centers to the collection and to the tree used to query them.
+        Existing learning centers, and the people already distributed to them, are
+        left untouched.
+
+        Parameters
+        ----------
+        learning_centers
+            List of learning centers to add
+
+        Returns
+        -------
+        Array with the IDs of the added learning centers
+        """
+        n_centers = len(self.members)
+        for learning_center in learning_centers:
+            self.add(learning_center)
+        if hasattr(self, "learning_centers_tree"):
+            self._build_learning_center_tree()
+        return np.arange(n_centers, len(self.members))
+
     @staticmethod
     def _create_learning_center_tree(
         learning_centers_coordinates: np.ndarray,
@@ -300,12 +332,38 @@ class LearningCenters(Supergroup):
 
         """
         coordinates_rad = np.deg2rad(coordinates).reshape(1, -1)
-        k = min(k, len(list(self.learning_centers_tree.data)))
+        k = min(k, self.n_centers_in_tree)
         distances, neighbours = self.learning_centers_tree.query(
             coordinates_rad, k=k, sort_results=True
         )
         return neighbours[0]
 
+    def get_closest_many(self, coordinates: np.ndarray, k: int) -> np.ndarray:
+        """
+        Get the k closest learning centers to each of the given coordinates, querying
+        the tree once for all of them. Results are cached, so that repeated queries for
+        the same coordinates (e.g. all the area centroids of the world) are free.
+
+        Parameters
+        ----------
+        coordinates
+            array of shape (n, 2) with latitudes and longitudes
+        k
+            number of neighbours
+
+        Returns
+        -------
+        Array of shape (n, k) with the IDs of the closest learning centers, sorted by distance
+        """
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        k = min(k, self.n_centers_in_tree)
+        key = (k, coordinates.tobytes())
+        if key not in self._closest_cache:
+            self._closest_cache[key] = self.learning_centers_tree.query(
+                np.deg2rad(coordinates), k=k, sort_results=True, return_distance=False
+            )
+        return self._closest_cache[key]
+
     def activate_next_shift(self, n_shifts):
         """
         Activate next shift in all learning centers
@@ -25,7 +25,7 @@ from june.geography import Areas
 
 
 class Shelter(Household):
-    __slots__ = "shelters_to_visit"
+    __slots__ = ("shelters_to_visit", "_family_subgroups")
 
     class SubgroupType(IntEnum):
         household_1 = 1
@@ -42,6 +42,7 @@ class Shelter(Household):
         """
         super().__init__(type="shelter", area=area)
         self.shelters_to_visit = None
+        self._family_subgroups = None
         # self.age_group_limits = age_group_limits
         # self.min_age = age_group_limits[0]
         # self.max_age = age_group_limits[-1] - 1
@@ -81,6 +82,7 @@ class Shelter(Household):
 
         # add to residents
         self.residents = tuple((*self.residents, *household.people))
+        self._family_subgroups = None
 
     @property
     def families(self):
@@ -111,10 +113,31 @@ class Shelter(Household):
     #         subgroup = "adults"
     #     return subgroup
 
+    @property
+    def family_subgroups(self):
+        """
+        Subgroups where the families of the shelter live, worked out from the
+        residents since the subgroups are emptied at every time step.
+        """
+        if self._family_subgroups is None:
+            subgroup_types = sorted(
+                set(resident.residence.subgroup_type for resident in self.residents)
+            )
+            self._family_subgroups = tuple(
+                self[subgroup_type] for subgroup_type in subgroup_types
+            ) or (self[0],)
+        return self._family_subgroups
+
     def get_leisure_subgroup(self, person, subgroup_type, to_send_abroad):
-        self.being_visited = True
-        self.make_household_residents_stay_home(to_send_abroad=to_send_abroad)
-        return self[randint(0, 1)]  # Pick house to visit
+        # residents only need to be called home by the first visitor of the time step
+        if not self.being_visited:
+            self.being_visited = True
+            self.make_household_residents_stay_home(to_send_abroad=to_send_abroad)
+        # Pick house to visit among those with a family in it
+        family_subgroups = self.family_subgroups
+        if len(family_subgroups) == 1:
+            return family_subgroups[0]
+        return family_subgroups[randint(0, len(family_subgroups) - 1)]
 
     def get_interactive_group(self, people_from_abroad=None):
         return InteractiveGroup(self, people_from_abroad=people_from_abroad)
@@ -18,7 +18,9 @@ import numpy as np
 import pandas as pd
 import yaml
 from itertools import chain
-from random import randint, shuffle
+from random import randint
+from typing import List, Optional
+from sklearn.neighbors import BallTree
 from june.geography import Areas, SuperAreas
 from june.groups.leisure import ResidenceVisitsDistributor
 from june.paths import data_path, configs_path
@@ -27,11 +29,19 @@ from camps.paths import camp_data_path, camp_configs_path
 from camps.groups import Shelter, Shelters
 
 default_config_filename = camp_configs_path / "defaults/groups/shelter_visits.yaml"
+earth_radius = 6371  # km
 
 
 class SheltersVisitsDistributor(ResidenceVisitsDistributor):
     def __init__(
-        self, times_per_week, daytypes, hours_per_day, drags_household_probability=0
+        self,
+        times_per_week,
+        daytypes,
+        hours_per_day,
+        drags_household_probability=0,
+        link_degree_probabilities: Optional[List[float]] = None,
+        link_distance_scale: Optional[float] = None,
+        link_neighbour_areas: int = 20,
     ):
         """
         Like other 'leisure' distributors in JUNE, this defines the distributor for the shelters
@@ -44,6 +54,14 @@ class SheltersVisitsDistributor(ResidenceVisitsDistributor):
             Number of hours per day they spend visiting
         drags_household_probability
             Probability that, if one person from a household goes, that they bring everyone else with them
+        link_degree_probabilities
+            Probability of linking a shelter to 0, 1, 2, ... other shelters. Defaults to
+            equal probabilities for 0 to 3 links
+        link_distance_scale
+            Distance (in km) of the exponential kernel used to pick the shelters to visit
+            among those in nearby areas. If None, they are picked uniformly within the super area
+        link_neighbour_areas
+            Number of closest areas considered when picking shelters by distance
         """
         super().__init__(
             times_per_week=times_per_week,
@@ -52,6 +70,19 @@ class SheltersVisitsDistributor(ResidenceVisitsDistributor):
             residence_type_probabilities={"household": 1.0},
             drags_household_probability=drags_household_probability,
         )
+        if link_degree_probabilities is None:
+            link_degree_probabilities = [0.25, 0.25, 0.25, 0.25]
+        self.link_degree_probabilities = np.array(link_degree_probabilities) / np.sum(
+            link_degree_probabilities
+        )
+        self.link_distance_scale = link_distance_scale
+        self.link_neighbour_areas = link_neighbour_areas
+        # visit network in CSR form: the shelters visited from the shelter in
+        # row i are visit_shelters[visit_targets[visit_offsets[i]:visit_offsets[i+1]]]
+        self.visit_shelters = []
+        self.visit_offsets = np.zeros(1, dtype=np.int64)
+        self.visit_targets = np.zeros(0, dtype=np.int64)
+        self._visit_rows = {}
 
     @classmethod
     def from_config(
@@ -74,12 +105,24 @@ class SheltersVisitsDistributor(ResidenceVisitsDistributor):
             config = yaml.load(f, Loader=yaml.FullLoader)
         return cls(daytypes=daytypes, **config)
 
+    def _draw_n_links(self, has_residents: np.ndarray) -> np.ndarray:
+        n_links = np.random.choice(
+            len(self.link_degree_probabilities),
+            size=len(has_residents),
+            p=self.link_degree_probabilities,
+        )
+        n_links[~has_residents] = 0
+        return n_links
+
     def link_shelters_to_shelters(self, super_areas):
         """
         Links people between shelters.
-        Strategy: We pair each shelter with 0, 1, or 2 other shelters (with equal prob.).
-        The shelter of the former then has a probability of visiting the shelter of the later
-        at every time step.
+        Strategy: We pair each shelter with 0, 1, 2 or 3 other shelters (with equal prob. by
+        default). The shelter of the former then has a probability of visiting the shelter of
+        the later at every time step.
+        If a distance scale is given, shelters to visit are picked across the whole camp, with
+        a preference for close ones. Otherwise they are picked uniformly within the super area.
+        The links are stored as CSR offsets and targets indexed by shelter.
 
         Parameters
         ----------
@@ -90,27 +133,136 @@ class SheltersVisitsDistributor(ResidenceVisitsDistributor):
         -------
         None
         """
+        if self.link_distance_scale is not None:
+            shelters = list(
+                chain.from_iterable(
+                    area.shelters for super_area in super_areas for area in super_area.areas
+                )
+            )
+            self._link_shelters_by_distance(shelters)
+            return
+        visit_shelters, visit_counts, visit_targets = [], [], []
         for super_area in super_areas:
             shelters_super_area = list(
                 chain.from_iterable(area.shelters for area in super_area.areas)
             )
-            shuffle(shelters_super_area)
-            for shelter in shelters_super_area:
-                if shelter.n_families == 0:
-                    continue
-                shelters_to_link_n = randint(0, 3)
-                shelters_to_visit = []
-                for _ in range(shelters_to_link_n):
-                    shelter_idx = randint(0, len(shelters_super_area) - 1)
-                    shelter_to_visit = shelters_super_area[shelter_idx]
-                    if (
-                        shelter_to_visit.id == shelter.id
-                        or shelter_to_visit.n_families == 0
-                    ):
-                        continue
-                    shelters_to_visit.append(shelter_to_visit)
-                if shelters_to_visit:
-                    shelter.shelters_to_visit = tuple(shelters_to_visit)
+            n_shelters = len(shelters_super_area)
+            if n_shelters == 0:
+                continue
+            has_residents = np.array(
+                [len(shelter.residents) > 0 for shelter in shelters_super_area],
+                dtype=bool,
+            )
+            n_links = self._draw_n_links(has_residents)
+            sources = np.repeat(np.arange(n_shelters), n_links)
+            targets = np.random.randint(0, n_shelters, size=len(sources))
+            valid = (targets != sources) & has_residents[targets]
+            sources, targets = sources[valid], targets[valid]
+            visit_counts.append(np.bincount(sources, minlength=n_shelters))
+            visit_targets.append(targets + len(visit_shelters))
+            visit_shelters += shelters_super_area
+        self._set_visit_network(visit_shelters, visit_counts, visit_targets)
+
+    def _link_shelters_by_distance(self, shelters: List[Shelter]):
+        """
+        Links shelters to shelters picked with an exponential kernel on the distance
+        between their areas. Areas are queried once with a ball tree, so the cost
+        grows as n log n with the number of shelters.
+
+        Parameters
+        ----------
+        shelters
+            list of all the shelters to link
+        """
+        n_shelters = len(shelters)
+        if n_shelters == 0:
+            self._set_visit_network([], [], [])
+            return
+        has_residents = np.array(
+            [len(shelter.residents) > 0 for shelter in shelters], dtype=bool
+        )
+        area_idx_by_id = {}
+        shelter_areas = np.array(
+            [
+                area_idx_by_id.setdefault(shelter.area.id, len(area_idx_by_id))
+                for shelter in shelters
+            ],
+            dtype=np.int64,
+        )
+        areas = {shelter.area.id: shelter.area for shelter in shelters}
+        area_coordinates = np.array(
+            [areas[area_id].coordinates for area_id in area_idx_by_id], dtype=float
+        )
+        n_areas = len(area_coordinates)
+        # shelters with residents, sorted by area, can be visited
+        targets_by_area = np.flatnonzero(has_residents)
+        targets_by_area = targets_by_area[
+            np.argsort(shelter_areas[targets_by_area], kind="stable")
+        ]
+        n_targets_per_area = np.bincount(
+            shelter_areas[targets_by_area], minlength=n_areas
+        )
+        area_offsets = np.concatenate(([0], np.cumsum(n_targets_per_area)))
+        # kernel weights of the closest areas to every area
+        k = min(self.link_neighbour_areas, n_areas)
+        tree = BallTree(np.deg2rad(area_coordinates), metric="haversine")
+        distances, neighbour_areas = tree.query(np.deg2rad(area_coordinates), k=k)
+        weights = (
+            np.exp(-distances * earth_radius / self.link_distance_scale)
+            * n_targets_per_area[neighbour_areas]
+        )
+        cumulative_weights = np.cumsum(weights, axis=1)
+        total_weights = cumulative_weights[:, -1:]
+        cumulative_weights = np.where(
+            cumulative_weights >= total_weights,
+            1.0,
+            cumulative_weights / np.where(total_weights > 0, total_weights, 1),
+        )
+        # draw links, then the area and the shelter they point to
+        n_links = self._draw_n_links(has_residents)
+        n_links[total_weights[shelter_areas, 0] == 0] = 0
+        sources = np.repeat(np.arange(n_shelters), n_links)
+        source_areas = shelter_areas[sources]
+        neighbour_idx = (
+            cumulative_weights[source_areas] < np.random.random((len(sources), 1))
+        ).sum(axis=1)
+        target_areas = neighbour_areas[source_areas, neighbour_idx]
+        targets = targets_by_area[
+            area_offsets[target_areas]
+            + (np.random.random(len(sources)) * n_targets_per_area[target_areas]).astype(
+                np.int64
+            )
+        ]
+        valid = targets != sources
+        sources, targets = sources[valid], targets[valid]
+        self._set_visit_network(
+            shelters, [np.bincount(sources, minlength=n_shelters)], [targets]
+        )
+
+    def _set_visit_network(self, visit_shelters, visit_counts, visit_targets):
+        """
+        Stores the visit network in CSR form, which get_leisure_group samples
+        from. It is mirrored in the shelters_to_visit attribute of every
+        shelter for the code that inspects the links.
+        """
+        self.visit_shelters = visit_shelters
+        self.visit_offsets = np.zeros(len(visit_shelters) + 1, dtype=np.int64)
+        if visit_counts:
+            np.cumsum(np.concatenate(visit_counts), out=self.visit_offsets[1:])
+            self.visit_targets = np.concatenate(visit_targets).astype(np.int64)
+        else:
+            self.visit_targets = np.zeros(0, dtype=np.int64)
+        self._visit_rows = {
+            shelter.id: row for row, shelter in enumerate(visit_shelters)
+        }
+        for row, shelter in enumerate(visit_shelters):
+            start, end = self.visit_offsets[row], self.visit_offsets[row + 1]
+            if end > start:
+                shelter.shelters_to_visit = tuple(
+                    visit_shelters[target] for target in self.visit_targets[start:end]
+                )
+            else:
+                shelter.shelters_to_visit = None
 
     def get_leisure_group(self, person):
         """
@@ -126,14 +278,15 @@ class SheltersVisitsDistributor(ResidenceVisitsDistributor):
         group
             Group of a person
         """
-        candidates = person.residence.group.shelters_to_visit
-        if candidates is None:
+        row = self._visit_rows.get(person.residence.group.id)
+        if row is None:
             return
-        n_candidates = len(candidates)
+        start = self.visit_offsets[row]
+        n_candidates = self.visit_offsets[row + 1] - start
         if n_candidates == 0:
             return
         elif n_candidates == 1:
-            group = candidates[0]
+            target = self.visit_targets[start]
         else:
-            group = candidates[randint(0, n_candidates - 1)]
-        return group
+            target = self.visit_targets[start + randint(0, n_candidates - 1)]
+        return self.visit_shelters[target]
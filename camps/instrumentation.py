@@ -0,0 +1,194 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import resource
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("instrumentation")
+
+default_profile_filename = "profile.json"
+
+
+def get_rss_mb() -> float:
+    """
+    Current resident set size of the process in MB. Falls back to the peak
+    resident set size where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            n_pages = int(f.read().split()[1])
+        return n_pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return get_peak_rss_mb()
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Peak resident set size of the process in MB.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss / 1024 ** 2
+    return peak_rss / 1024
+
+
+class RunProfiler:
+    """
+    Records wall time, CPU time and resident memory of the stages of a run,
+    and writes them to a profile file next to the run results.
+
+    Stages can be timed with the stage context manager, which can be nested,
+    with the profile decorator, or, in scripts made of consecutive top-level
+    blocks, with next_stage, which closes the stage opened before it.
+
+    Parameters
+    ----------
+    name
+        name of the run, written to the profile
+    verbose
+        whether to print every stage as it finishes
+    """
+
+    def __init__(self, name: str = "run", verbose: bool = True):
+        self.name = name
+        self.verbose = verbose
+        self.stages = []
+        self._open_stages = []
+        self.start_date = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._rss_start = get_rss_mb()
+
+    def start_stage(self, name: str):
+        """
+        Opens a stage inside the stage currently open, if any.
+        """
+        path = "/".join([stage["name"] for stage in self._open_stages] + [name])
+        self._open_stages.append(
+            {
+                "name": name,
+                "path": path,
+                "wall_start": time.perf_counter(),
+                "cpu_start": time.process_time(),
+                "rss_start": get_rss_mb(),
+            }
+        )
+
+    def stop_stage(self) -> Optional[dict]:
+        """
+        Closes the innermost open stage and returns its record.
+        """
+        if not self._open_stages:
+            return None
+        opened = self._open_stages.pop()
+        rss = get_rss_mb()
+        stage = {
+            "stage": opened["path"],
+            "depth": len(self._open_stages),
+            "start": opened["wall_start"] - self._wall_start,
+            "wall_time": time.perf_counter() - opened["wall_start"],
+            "cpu_time": time.process_time() - opened["cpu_start"],
+            "rss_mb": rss,
+            "rss_delta_mb": rss - opened["rss_start"],
+            "peak_rss_mb": get_peak_rss_mb(),
+        }
+        self.stages.append(stage)
+        if self.verbose:
+            print(
+                f"[{self.name}] {stage['stage']}: {stage['wall_time']:.2f}s wall, "
+                f"{stage['cpu_time']:.2f}s cpu, {stage['rss_delta_mb']:+.1f} MB rss"
+            )
+        return stage
+
+    def next_stage(self, name: str):
+        """
+        Closes the stage open at the top level, if any, and opens a new one.
+        """
+        while self._open_stages:
+            self.stop_stage()
+        self.start_stage(name)
+
+    @contextmanager
+    def stage(self, name: str):
+        self.start_stage(name)
+        try:
+            yield self
+        finally:
+            self.stop_stage()
+
+    def profile(self, name: Optional[str] = None):
+        """
+        Decorator that times every call to the decorated function as a stage,
+        named after the function unless a name is given.
+        """
+
+        def decorator(function):
+            stage_name = name or function.__name__
+
+            @wraps(function)
+            def profiled(*args, **kwargs):
+                with self.stage(stage_name):
+                    return function(*args, **kwargs)
+
+            return profiled
+
+        return decorator
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "job_id": os.environ.get("SLURM_JOB_ID"),
+            "start_date": self.start_date.isoformat(timespec="seconds"),
+            "wall_time": time.perf_counter() - self._wall_start,
+            "cpu_time": time.process_time() - self._cpu_start,
+            "rss_delta_mb": get_rss_mb() - self._rss_start,
+            "peak_rss_mb": get_peak_rss_mb(),
+            "stages": self.stages,
+        }
+
+    def save(self, save_path: str, filename: str = default_profile_filename) -> Path:
+        """
+        Closes every open stage and writes the profile as JSON to
+        save_path / filename.
+
+        Parameters
+        ----------
+        save_path
+            directory of the run results
+        filename
+            name of the profile file
+        """
+        while self._open_stages:
+            self.stop_stage()
+        save_path = Path(save_path)
+        save_path.mkdir(parents=True, exist_ok=True)
+        profile_path = save_path / filename
+        with open(profile_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Run profile saved to {profile_path}")
+        return profile_path
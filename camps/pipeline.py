@@ -0,0 +1,923 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import copy
+import random
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import numba as nb
+import pandas as pd
+import yaml
+
+from june.demography.demography import load_comorbidity_data, generate_comorbidity
+from june.distributors import HospitalDistributor
+from june.epidemiology.epidemiology import Epidemiology
+from june.epidemiology.infection import (
+    HealthIndexGenerator,
+    ImmunitySetter,
+    InfectionSelector,
+    InfectionSelectors,
+)
+from june.epidemiology.infection.immunity_setter import default_susceptibility_dict
+from june.epidemiology.infection_seed import (
+    InfectionSeed,
+    InfectionSeeds,
+    ExactNumClusteredInfectionSeed,
+    ExactNumInfectionSeed,
+)
+from june.groups import Hospitals, Cemeteries
+from june.interaction import Interaction
+from june.policy import Policies
+
+from camps.camp_creation import (
+    generate_empty_world,
+    populate_world,
+    distribute_people_to_households,
+)
+from camps.distributors import LearningCenterDistributor
+from camps.groups import (
+    PumpLatrines,
+    PlayGroups,
+    DistributionCenters,
+    DistributionCenterDistributor,
+    Communals,
+    CommunalDistributor,
+    FemaleCommunals,
+    FemaleCommunalDistributor,
+    Religiouss,
+    ReligiousDistributor,
+    EVouchers,
+    EVoucherDistributor,
+    NFDistributionCenters,
+    NFDistributionCenterDistributor,
+    InformalWorks,
+    Shelters,
+    ShelterDistributor,
+    IsolationUnit,
+    IsolationUnits,
+    LearningCenter,
+    LearningCenters,
+)
+from camps.groups.leisure import generate_leisure_for_config
+from camps.instrumentation import RunProfiler
+from camps.paths import camp_data_path, camp_configs_path
+from camps.post_processing import count_infection_locations
+from camps.checkpoint import SimulationCheckpointer
+from camps.records import CampRecord
+from camps.simulator import CampSimulator, EarlyStopping
+
+logger = logging.getLogger("pipeline")
+
+transmission_config_paths = {
+    "nature": camp_configs_path / "defaults/transmission/nature.yaml",
+    "correction_nature": camp_configs_path
+    / "defaults/transmission/correction_nature.yaml",
+    "nature_larger": camp_configs_path
+    / "defaults/transmission/nature_larger_presymptomatic_transmission.yaml",
+    "nature_lower": camp_configs_path
+    / "defaults/transmission/nature_lower_presymptomatic_transmission.yaml",
+    "xnexp": camp_configs_path / "defaults/transmission/XNExp.yaml",
+}
+
+default_parameters = {
+    "save_path": "results",
+    "random_seed": 0,
+    "regions": ["CXB-219"],
+    "config": None,
+    "parameters": "interaction_Survey.yaml",
+    "comorbidities": True,
+    "comorbidity_scaling": False,
+    "male_life_expectancy": 79.4,
+    "female_life_expectancy": 83.1,
+    "cut_off_age": 16,
+    "infectiousness_path": "nature",
+    "child_susceptibility": False,
+    "household_beta": 0.25,
+    "indoor_beta_ratio": 0.55,
+    "outdoor_beta_ratio": 0.05,
+    "learning_center_beta_ratio": False,
+    "play_group_beta_ratio": False,
+    "policy": "defaults/policy/home_care_policy.yaml",
+    "no_vaccines": False,
+    "vaccines": False,
+    "isolation_units": False,
+    "isolation_units_at_hospitals": False,
+    "isolation_testing": 3,
+    "isolation_time": 7,
+    "isolation_compliance": 0.6,
+    "isolation_beds": None,
+    "mask_wearing": False,
+    "mask_compliance": False,
+    "mask_beta_factor": 0.5,
+    "learning_centers": False,
+    "learning_center_shifts": 4,
+    "extra_learning_centers": False,
+    "informal_works": False,
+    "subgroups_from_interaction": False,
+    "no_visits": False,
+    "nearest_venues_to_visit": 3,
+    "seeding": "cluster",
+    "n_seeding_days": 10,
+    "n_seeding_case_per_day": 10,
+    "tracker": False,
+    "early_stop": "none",
+    "plateau_days": 14,
+    "plateau_tolerance": 0.01,
+    "checkpoint_every": 0,
+    "resume": False,
+}
+
+
+def set_random_seed(seed=999):
+    """
+    Sets global seeds in numpy, random, and numbaized numpy.
+    """
+
+    @nb.njit(cache=True)
+    def set_seed_numba(seed):
+        random.seed(seed)
+        return np.random.seed(seed)
+
+    np.random.seed(seed)
+    set_seed_numba(seed)
+    random.seed(seed)
+    return
+
+
+def _parse_flag(value):
+    if isinstance(value, str):
+        if value == "True":
+            return True
+        if value == "False":
+            return False
+    return value
+
+
+def parse_parameters(values: dict, **overrides) -> dict:
+    """
+    Converts command line style values into run parameters, turning the
+    "True" and "False" strings into booleans. Parameters missing from values
+    and overrides are taken from default_parameters.
+
+    Parameters
+    ----------
+    values
+        parameter values, as given on the command line or in a parameter grid
+    overrides
+        parameters to set regardless of values
+    """
+    parameters = dict(default_parameters)
+    for key, value in values.items():
+        parameters[key] = _parse_flag(value)
+    if "cluster_seeding" in parameters:
+        cluster_seeding = parameters.pop("cluster_seeding")
+        parameters["seeding"] = "cluster" if cluster_seeding else "exact"
+    parameters.update(overrides)
+    if parameters["learning_center_shifts"] is False:
+        parameters["learning_center_shifts"] = default_parameters[
+            "learning_center_shifts"
+        ]
+    if parameters["isolation_beds"] is not None:
+        parameters["isolation_beds"] = int(parameters["isolation_beds"])
+    if parameters["infectiousness_path"] not in transmission_config_paths:
+        raise NotImplementedError(
+            f"Unknown infectiousness {parameters['infectiousness_path']}"
+        )
+    return parameters
+
+
+def parameters_from_args(args, **overrides) -> dict:
+    """
+    Converts the arguments parsed by the run scripts into run parameters.
+    Parameters that the scripts do not expose are taken from overrides, then
+    from default_parameters.
+
+    Parameters
+    ----------
+    args
+        namespace returned by argparse
+    overrides
+        parameters to set regardless of the arguments
+    """
+    return parse_parameters(vars(args), **overrides)
+
+
+def get_config_path(parameters: dict) -> Path:
+    """
+    Simulation config of a run: the one given, or the example config adapted
+    to learning centers and shelter visits.
+    """
+    if parameters["config"] is not None:
+        return Path(parameters["config"])
+    if parameters["no_visits"]:
+        return camp_configs_path / "no_visits_config.yaml"
+    if parameters["learning_centers"]:
+        return camp_configs_path / "learning_center_config.yaml"
+    return camp_configs_path / "config_example.yaml"
+
+
+def get_interaction_path(parameters: dict) -> Path:
+    return camp_configs_path / "defaults/interaction" / parameters["parameters"]
+
+
+# =================================== stages ===============================#
+
+
+def build_world(context: dict, parameters: dict) -> dict:
+    """
+    Builds the geography of the selected regions, populates it and
+    distributes people to households and shelters.
+    """
+    set_random_seed(parameters["random_seed"])
+    if parameters["regions"]:
+        world = generate_empty_world({"region": list(parameters["regions"])})
+    else:
+        world = generate_empty_world()
+    populate_world(world)
+    distribute_people_to_households(world)
+    world.shelters = Shelters.for_areas(world.areas)
+    shelter_distributor = ShelterDistributor(
+        sharing_shelter_ratio=0.75
+    )  # proportion of families that share a shelter
+    for area in world.areas:
+        shelter_distributor.distribute_people_in_shelters(
+            area.shelters, area.households
+        )
+    world.cemeteries = Cemeteries()
+    logger.info(
+        f"Total people = {len(world.people)}, "
+        f"mean age = {np.mean([person.age for person in world.people]):.1f}"
+    )
+    return {"world": world}
+
+
+def _add_extra_learning_centers(world, learning_center_distributor, n_extra: int):
+    """
+    Adds learning centers next to the n_extra most enrolled ones, staffs them
+    and moves the kids closer to them.
+    """
+    enrolled = []
+    learning_centers = []
+    for learning_center in world.learning_centers:
+        total = 0
+        for i in range(world.learning_centers.n_shifts):
+            total += len(learning_center.ids_per_shift[i])
+        enrolled.append(total)
+        learning_centers.append(learning_center)
+    learning_centers = np.array(learning_centers)
+    learning_centers_sorted = learning_centers[np.argsort(enrolled)]
+
+    extra_learning_centers = []
+    for learning_center in learning_centers_sorted[-n_extra:]:
+        extra_lc = LearningCenter(coordinates=learning_center.super_area.coordinates)
+        extra_lc.area = learning_center.area
+        extra_learning_centers.append(extra_lc)
+    new_centers_idx = world.learning_centers.add_centers(extra_learning_centers)
+
+    learning_center_distributor.distribute_teachers_to_learning_centers(
+        world.areas, learning_centers=extra_learning_centers
+    )
+    learning_center_distributor.redistribute_kids_near_centers(
+        world.areas, new_centers_idx
+    )
+
+
+def attach_venues(context: dict, parameters: dict) -> dict:
+    """
+    Adds hospitals, isolation units, learning centers and the leisure venues
+    to the world.
+    """
+    world = context["world"]
+    hospitals = Hospitals.from_file(
+        filename=camp_data_path / "input/hospitals/hospitals.csv"
+    )
+    for hospital in hospitals:
+        hospital.area = world.areas.get_closest_area(hospital.coordinates)
+    world.hospitals = hospitals
+    hospital_distributor = HospitalDistributor(
+        hospitals, medic_min_age=20, patients_per_medic=10
+    )
+    hospital_distributor.assign_closest_hospitals_to_super_areas(world.super_areas)
+    if parameters["isolation_units_at_hospitals"]:
+        world.isolation_units = IsolationUnits(
+            [
+                IsolationUnit(area=hospital.area, n_beds=parameters["isolation_beds"])
+                for hospital in world.hospitals
+            ]
+        )
+    elif parameters["isolation_units"]:
+        world.isolation_units = IsolationUnits(
+            [IsolationUnit(area=world.areas[0], n_beds=parameters["isolation_beds"])]
+        )
+    hospital_distributor.distribute_medics_from_world(world.people)
+
+    if parameters["learning_centers"]:
+        world.learning_centers = LearningCenters.for_areas(
+            world.areas, n_shifts=int(parameters["learning_center_shifts"])
+        )
+        learning_center_distributor = LearningCenterDistributor.from_file(
+            learning_centers=world.learning_centers
+        )
+        learning_center_distributor.distribute_kids_to_learning_centers(world.areas)
+        learning_center_distributor.distribute_teachers_to_learning_centers(
+            world.areas
+        )
+        if parameters["extra_learning_centers"]:
+            _add_extra_learning_centers(
+                world,
+                learning_center_distributor,
+                int(parameters["extra_learning_centers"]),
+            )
+
+    world.pump_latrines = PumpLatrines.for_areas(world.areas)
+    world.play_groups = PlayGroups.for_areas(world.areas)
+    world.distribution_centers = DistributionCenters.for_areas(world.areas)
+    world.communals = Communals.for_areas(world.areas)
+    world.female_communals = FemaleCommunals.for_areas(world.areas)
+    world.religiouss = Religiouss.for_areas(world.areas)
+    world.e_vouchers = EVouchers.for_areas(world.areas)
+    world.n_f_distribution_centers = NFDistributionCenters.for_areas(world.areas)
+    if parameters["informal_works"]:
+        world.informal_works = InformalWorks.for_areas(world.areas)
+
+    if parameters["subgroups_from_interaction"]:
+        interaction_path = get_interaction_path(parameters)
+        for supergroup in [
+            world.hospitals,
+            world.isolation_units,
+            world.learning_centers,
+            world.pump_latrines,
+            world.play_groups,
+            world.distribution_centers,
+            world.communals,
+            world.female_communals,
+            world.religiouss,
+            world.e_vouchers,
+            world.n_f_distribution_centers,
+            world.informal_works,
+            world.shelters,
+        ]:
+            if supergroup is not None:
+                supergroup.get_interaction(interaction_path)
+    return {"world": world}
+
+
+def get_policies(parameters: dict) -> Policies:
+    """
+    Loads the policies of the run, with the isolation and mask wearing
+    parameters applied.
+    """
+    if parameters["isolation_units"]:
+        policy_path = "defaults/policy/isolation.yaml"
+    elif parameters["mask_wearing"]:
+        policy_path = "defaults/policy/mask_wearing.yaml"
+    elif parameters["no_vaccines"]:
+        policy_path = "vaccine_tests/no_vaccine.yaml"
+    elif parameters["vaccines"]:
+        policy_path = "vaccine_tests/vaccine.yaml"
+    else:
+        policy_path = parameters["policy"]
+    policies = Policies.from_file(
+        camp_configs_path / policy_path,
+        base_policy_modules=("june.policy", "camps.policy"),
+    )
+    for policy in policies:
+        if parameters["isolation_units"] and policy.spec == "isolation":
+            policy.n_quarantine_days = int(parameters["isolation_time"])
+            policy.testing_mean_time = int(parameters["isolation_testing"])
+            policy.compliance = float(parameters["isolation_compliance"])
+        elif parameters["mask_wearing"] and policy.spec == "mask_wearing":
+            policy.compliance = float(parameters["mask_compliance"])
+            policy.beta_factor = float(parameters["mask_beta_factor"])
+    return policies
+
+
+def get_interaction(parameters: dict) -> Interaction:
+    """
+    Loads the interaction betas and rescales them from the household beta.
+    """
+    interaction = Interaction.from_file(
+        config_filename=get_interaction_path(parameters)
+    )
+    betas = interaction.betas
+    if parameters["household_beta"]:
+        betas["household"] = float(parameters["household_beta"])
+        betas["hospital"] = float(parameters["household_beta"]) * 0.1
+        betas["shelter"] = float(parameters["household_beta"])
+    if parameters["outdoor_beta_ratio"]:
+        for spec in ("play_group", "pump_latrine"):
+            betas[spec] = betas["household"] * float(parameters["outdoor_beta_ratio"])
+    if parameters["indoor_beta_ratio"]:
+        for spec in (
+            "communal",
+            "female_communal",
+            "religious",
+            "distribution_center",
+            "n_f_distribution_center",
+            "e_voucher",
+            "learning_center",
+        ):
+            betas[spec] = betas["household"] * float(parameters["indoor_beta_ratio"])
+    if parameters["learning_centers"] and parameters["learning_center_beta_ratio"]:
+        betas["learning_center"] = betas["household"] * float(
+            parameters["learning_center_beta_ratio"]
+        )
+    if parameters["play_group_beta_ratio"]:
+        betas["play_group"] = betas["household"] * float(
+            parameters["play_group_beta_ratio"]
+        )
+    return interaction
+
+
+def get_infection_seeds(world, selector, parameters: dict) -> InfectionSeeds:
+    """
+    Seeds n_seeding_case_per_day cases a day during the first n_seeding_days
+    of the simulation, either clustered in households, spread across the
+    population, or as a rate per capita.
+    """
+    with open(get_config_path(parameters)) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    start_date = datetime.strptime(config["time"]["initial_day"], "%Y-%m-%d %H:%M")
+    seeding_dates = [
+        start_date + timedelta(days=day)
+        for day in range(int(parameters["n_seeding_days"]))
+    ]
+    index = pd.MultiIndex.from_product(
+        [seeding_dates, ["0-100"]], names=["date", "age"]
+    )
+    cases = pd.DataFrame(index=index, columns=["all"])
+    if parameters["seeding"] == "cluster":
+        seed_class = ExactNumClusteredInfectionSeed
+        cases[:] = int(parameters["n_seeding_case_per_day"])
+    elif parameters["seeding"] == "exact":
+        seed_class = ExactNumInfectionSeed
+        cases[:] = int(parameters["n_seeding_case_per_day"])
+    elif parameters["seeding"] == "per_capita":
+        seed_class = InfectionSeed
+        cases[:] = float(parameters["n_seeding_case_per_day"]) / len(world.people)
+    else:
+        raise NotImplementedError(f"Unknown seeding {parameters['seeding']}")
+    infection_seed = seed_class(
+        world=world,
+        infection_selector=selector,
+        daily_cases_per_capita_per_age_per_region=cases,
+    )
+    return InfectionSeeds([infection_seed])
+
+
+def get_immunity_setter(parameters: dict) -> ImmunitySetter:
+    """
+    Susceptibility set from the comorbidity multipliers, scaled by
+    comorbidity_scaling if given. With child_susceptibility, children are
+    half as susceptible as adults, otherwise everyone is fully susceptible.
+    """
+    comorbidities_multipliers_path = camp_configs_path / "defaults/comorbidities.yaml"
+    if parameters["comorbidity_scaling"]:
+        with open(comorbidities_multipliers_path) as f:
+            multipliers = yaml.load(f, Loader=yaml.FullLoader)
+        for key in multipliers:
+            multipliers[key] *= float(parameters["comorbidity_scaling"])
+        multipliers["no_condition"] = 1.0
+        save_path = Path(parameters["save_path"])
+        save_path.mkdir(parents=True, exist_ok=True)
+        comorbidities_multipliers_path = save_path / "comorbidities_multipliers.yaml"
+        with open(comorbidities_multipliers_path, "w") as f:
+            yaml.dump(multipliers, f)
+    return ImmunitySetter.from_file_with_comorbidities(
+        susceptibility_dict=(
+            default_susceptibility_dict if parameters["child_susceptibility"] else None
+        ),
+        comorbidity_multipliers_path=comorbidities_multipliers_path,
+        male_comorbidity_reference_prevalence_path=camp_data_path
+        / "input/demography/uk_male_comorbidities.csv",
+        female_comorbidity_reference_prevalence_path=camp_data_path
+        / "input/demography/uk_female_comorbidities.csv",
+    )
+
+
+def configure_epidemiology(context: dict, parameters: dict) -> dict:
+    """
+    Sets comorbidities, policies, betas, the infection selector and the
+    infection seeds.
+    """
+    # stages from here on are not cached, reseed so that runs from a cached
+    # world draw the same numbers as runs that built it
+    set_random_seed(parameters["random_seed"])
+    world = context["world"]
+    if parameters["comorbidities"]:
+        comorbidity_data = load_comorbidity_data(
+            camp_data_path / "input/demography/myanmar_male_comorbidities.csv",
+            camp_data_path / "input/demography/myanmar_female_comorbidities.csv",
+        )
+        for person in world.people:
+            person.comorbidity = generate_comorbidity(person, comorbidity_data)
+    else:
+        logger.warning("No comorbidities, everyone starts healthy")
+    health_index_generator = HealthIndexGenerator.from_file(
+        m_exp=float(parameters["male_life_expectancy"]),
+        f_exp=float(parameters["female_life_expectancy"]),
+        cutoff_age=np.round(float(parameters["cut_off_age"])),
+    )
+    selector = InfectionSelector(
+        transmission_config_path=transmission_config_paths[
+            parameters["infectiousness_path"]
+        ],
+        health_index_generator=health_index_generator,
+    )
+    epidemiology = Epidemiology(
+        infection_selectors=InfectionSelectors([selector]),
+        infection_seeds=get_infection_seeds(world, selector, parameters),
+        immunity_setter=get_immunity_setter(parameters),
+    )
+    return {
+        "policies": get_policies(parameters),
+        "interaction": get_interaction(parameters),
+        "epidemiology": epidemiology,
+    }
+
+
+def configure_leisure(context: dict, parameters: dict) -> dict:
+    """
+    Creates the leisure distributors of the config and links shelters and
+    venues to the areas.
+    """
+    world = context["world"]
+    config_path = get_config_path(parameters)
+    leisure = generate_leisure_for_config(world=world, config_filename=config_path)
+    if parameters["nearest_venues_to_visit"]:
+        with open(config_path) as f:
+            config = yaml.load(f, Loader=yaml.FullLoader)
+        daytypes = {"weekday": config["weekday"], "weekend": config["weekend"]}
+        config_override = {
+            "maximum_distance": 1.0,
+            "nearest_venues_to_visit": int(parameters["nearest_venues_to_visit"]),
+        }
+        for activity, distributor_class, venues in [
+            (
+                "distribution_center",
+                DistributionCenterDistributor,
+                "distribution_centers",
+            ),
+            ("communal", CommunalDistributor, "communals"),
+            ("female_communal", FemaleCommunalDistributor, "female_communals"),
+            ("religious", ReligiousDistributor, "religiouss"),
+            ("e_voucher", EVoucherDistributor, "e_vouchers"),
+            (
+                "n_f_distribution_center",
+                NFDistributionCenterDistributor,
+                "n_f_distribution_centers",
+            ),
+        ]:
+            if activity in leisure.leisure_distributors:
+                leisure.leisure_distributors[activity] = distributor_class.from_config(
+                    getattr(world, venues),
+                    daytypes=daytypes,
+                    config_override=config_override,
+                )
+    leisure.distribute_social_venues_to_areas(world.areas, world.super_areas)
+    return {"leisure": leisure}
+
+
+def get_tracker(world, parameters: dict):
+    from june.tracker.tracker import Tracker
+
+    group_types = [
+        world.hospitals,
+        world.distribution_centers,
+        world.communals,
+        world.female_communals,
+        world.pump_latrines,
+        world.religiouss,
+        world.play_groups,
+        world.e_vouchers,
+        world.n_f_distribution_centers,
+        world.shelters,
+        world.learning_centers,
+        world.informal_works,
+        world.isolation_units,
+    ]
+    return Tracker(
+        world=world,
+        record_path=parameters["save_path"],
+        group_types=[group for group in group_types if group is not None],
+        load_interactions_path=get_interaction_path(parameters),
+        contact_sexes=["unisex", "male", "female"],
+    )
+
+
+def get_checkpointer(parameters: dict) -> SimulationCheckpointer:
+    return SimulationCheckpointer(
+        Path(parameters["save_path"]) / "checkpoints",
+        every=int(parameters["checkpoint_every"]) or 1,
+    )
+
+
+def get_resume_checkpoint(parameters: dict) -> Optional[Path]:
+    """
+    Latest checkpoint of the run, if it is to be resumed and has one.
+    """
+    if not parameters["resume"]:
+        return None
+    return get_checkpointer(parameters).get_latest()
+
+
+def simulate(context: dict, parameters: dict) -> dict:
+    """
+    Runs the simulation, recording to save_path. The run ends early when the
+    early_stop criterion holds, unless contacts are tracked. With
+    checkpoint_every days, the simulation state is saved in save_path/
+    checkpoints, and a checkpoint in the context is run from instead of the
+    world.
+    """
+    if "checkpoint" in context:
+        simulator = CampSimulator.from_checkpoint(context["checkpoint"])
+    else:
+        simulator = get_simulator(context, parameters)
+    return finish_simulation(simulator)
+
+
+def get_simulator(context: dict, parameters: dict) -> CampSimulator:
+    """
+    Simulator of the run, recording to save_path, with the early stopping and
+    checkpoints of its parameters.
+    """
+    world = context["world"]
+    record = CampRecord(record_path=parameters["save_path"], record_static_data=True)
+    if world.isolation_units is not None:
+        world.isolation_units.set_occupancy_record(record)
+    tracker = get_tracker(world, parameters) if parameters["tracker"] else None
+    simulator = CampSimulator.from_file(
+        world=world,
+        interaction=context["interaction"],
+        tracker=tracker,
+        leisure=context["leisure"],
+        policies=context["policies"],
+        config_filename=get_config_path(parameters),
+        epidemiology=context["epidemiology"],
+        record=record,
+    )
+    simulator.timer.reset()
+    if tracker is None:
+        simulator.early_stopping = EarlyStopping.from_parameters(parameters)
+    if int(parameters["checkpoint_every"]) > 0:
+        simulator.checkpointer = get_checkpointer(parameters)
+    return simulator
+
+
+def finish_simulation(simulator: CampSimulator) -> dict:
+    simulator.run()
+    simulator.record.finalise()
+    if simulator.world.isolation_units is not None:
+        simulator.world.isolation_units.flush_occupancy()
+    return {"simulator": simulator, "record": simulator.record}
+
+
+def post_process(context: dict, parameters: dict) -> dict:
+    """
+    Writes the number of infections per location type and time step, and the
+    counts by region and age bin too. A CampRecord has counted them during the
+    run already, otherwise they are read from the records file.
+    """
+    save_path = Path(parameters["save_path"])
+    record = context.get("record")
+    if isinstance(record, CampRecord):
+        counter = record.infection_locations
+    else:
+        counter = count_infection_locations(save_path)
+    if parameters["tracker"]:
+        tracker = context["simulator"].tracker
+        tracker.contract_matrices("AC", np.array([0, 18, 60]))
+        tracker.contract_matrices("All", np.array([0, 100]))
+        tracker.post_process_simulation(save=True)
+    return {"locations": counter.get_locations_df(), "infection_locations": counter}
+
+
+# =================================== pipeline ===============================#
+
+
+class Stage:
+    """
+    One step of a run.
+
+    Parameters
+    ----------
+    name
+        name of the stage, used for caching and in the run profile
+    function
+        function taking the context built by the previous stages and the run
+        parameters, and returning the entries it adds to the context
+    parameters
+        names of the run parameters the stage depends on
+    cache
+        whether to keep the context after this stage, so that runs whose
+        parameters only differ in later stages start from a copy of it
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[dict, dict], dict],
+        parameters: Sequence[str] = (),
+        cache: bool = False,
+    ):
+        self.name = name
+        self.function = function
+        self.parameters = tuple(parameters)
+        self.cache = cache
+
+    def __call__(self, context: dict, parameters: dict) -> dict:
+        return self.function(context, parameters)
+
+
+default_stages = [
+    Stage("build_world", build_world, ("random_seed", "regions"), cache=True),
+    Stage(
+        "attach_venues",
+        attach_venues,
+        (
+            "isolation_units",
+            "isolation_units_at_hospitals",
+            "isolation_beds",
+            "learning_centers",
+            "learning_center_shifts",
+            "extra_learning_centers",
+            "informal_works",
+            "subgroups_from_interaction",
+            "parameters",
+        ),
+        cache=True,
+    ),
+    Stage(
+        "configure_epidemiology",
+        configure_epidemiology,
+        (
+            "random_seed",
+            "save_path",
+            "config",
+            "no_visits",
+            "comorbidities",
+            "comorbidity_scaling",
+            "male_life_expectancy",
+            "female_life_expectancy",
+            "cut_off_age",
+            "infectiousness_path",
+            "household_beta",
+            "indoor_beta_ratio",
+            "outdoor_beta_ratio",
+            "learning_center_beta_ratio",
+            "play_group_beta_ratio",
+            "policy",
+            "no_vaccines",
+            "vaccines",
+            "isolation_testing",
+            "isolation_time",
+            "isolation_compliance",
+            "mask_wearing",
+            "mask_compliance",
+            "mask_beta_factor",
+            "seeding",
+            "n_seeding_days",
+            "n_seeding_case_per_day",
+        ),
+    ),
+    Stage(
+        "configure_leisure",
+        configure_leisure,
+        ("config", "no_visits", "nearest_venues_to_visit"),
+    ),
+    Stage(
+        "simulate",
+        simulate,
+        (
+            "save_path",
+            "tracker",
+            "early_stop",
+            "plateau_days",
+            "plateau_tolerance",
+            "checkpoint_every",
+        ),
+    ),
+    Stage("post_process", post_process, ("save_path", "tracker")),
+]
+
+
+class RunPipeline:
+    """
+    Runs the stages of a camp simulation in order, timing each of them.
+    Stages marked as cached keep a copy of the context they produce, keyed by
+    the parameters of every stage up to them, so a sweep over parameters of
+    the later stages builds the world once and simulates copies of it.
+
+    Parameters
+    ----------
+    stages
+        stages to run, in order
+    """
+
+    def __init__(self, stages: Optional[List[Stage]] = None):
+        self.stages = list(default_stages if stages is None else stages)
+        self.cache = {}
+
+    def get_stage_index(self, name: str) -> int:
+        for index, stage in enumerate(self.stages):
+            if stage.name == name:
+                return index
+        raise ValueError(f"No stage named {name}")
+
+    def cache_key(self, index: int, parameters: dict) -> tuple:
+        """
+        Values of the parameters the stages up to index depend on.
+        """
+        keys = []
+        for stage in self.stages[: index + 1]:
+            for name in stage.parameters:
+                value = parameters[name]
+                if isinstance(value, (list, dict)):
+                    value = repr(value)
+                keys.append((name, value))
+        return tuple(keys)
+
+    def clear_cache(self):
+        self.cache = {}
+
+    def run(
+        self,
+        parameters: Optional[dict] = None,
+        until: Optional[str] = None,
+        profiler: Optional[RunProfiler] = None,
+        save_profile: bool = True,
+        context: Optional[dict] = None,
+        after: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        Runs the stages with the given parameters.
+
+        Parameters
+        ----------
+        parameters
+            run parameters, missing ones are taken from default_parameters
+        until
+            name of the last stage to run, all stages are run if not given
+        profiler
+            profiler to record the stages on, a new one is made if not given
+        save_profile
+            whether to write the profile to the save path of the run
+        context
+            context to start from, built by the stages up to after
+        after
+            name of the last stage already in context, the run starts with
+            the stage following it and ignores the cache
+        use_cache
+            whether to start from, and store, cached contexts
+
+        Returns
+        -------
+        context
+            dictionary with the objects built by the stages
+        """
+        parameters = {**default_parameters, **(parameters or {})}
+        profiler = profiler or RunProfiler(name=Path(parameters["save_path"]).name)
+        last = len(self.stages) - 1 if until is None else self.get_stage_index(until)
+
+        context = dict(context or {})
+        first = 0
+        if after is not None:
+            first = self.get_stage_index(after) + 1
+        elif use_cache:
+            for index in range(last, -1, -1):
+                stage = self.stages[index]
+                key = (stage.name, self.cache_key(index, parameters))
+                if stage.cache and key in self.cache:
+                    with profiler.stage(f"{stage.name}_from_cache"):
+                        context = copy.deepcopy(self.cache[key])
+                    first = index + 1
+                    break
+
+        for index in range(first, last + 1):
+            stage = self.stages[index]
+            with profiler.stage(stage.name):
+                context.update(stage(context, parameters))
+            if stage.cache and use_cache:
+                key = (stage.name, self.cache_key(index, parameters))
+                self.cache[key] = copy.deepcopy(context)
+        if save_profile:
+            profiler.save(parameters["save_path"])
+        return context
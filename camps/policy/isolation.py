@@ -23,6 +23,8 @@ from june.epidemiology.infection.symptoms import SymptomTag
 
 from camps.groups import IsolationUnits
 
+default_buffer_size = 1024
+
 
 class Isolation(MedicalCarePolicy):
     def __init__(
@@ -39,11 +41,40 @@ class Isolation(MedicalCarePolicy):
         self.testing_std_time = testing_std_time
         self.n_quarantine_days = n_quarantine_days
         self.compliance = compliance
+        self._medical_facilities = None
+        self._isolation_units = None
+        # state of every person seen by the policy, one row per person
+        self._row_by_id = {}
+        self._people = []
+        self._time_of_symptoms_onset = np.empty(default_buffer_size, dtype=float)
+        self._time_of_testing = np.empty(default_buffer_size, dtype=float)
+        self._complies = np.empty(default_buffer_size, dtype=bool)
+        self._in_quarantine_window = np.empty(default_buffer_size, dtype=bool)
+        self._current_time = None
+        # random numbers are drawn in bulk and consumed one by one
+        self._compliance_draws = np.empty(0)
+        self._testing_delay_draws = np.empty(0)
+
+    def _draw_compliance(self) -> bool:
+        if len(self._compliance_draws) == 0:
+            self._compliance_draws = np.random.rand(default_buffer_size)
+        complies = self._compliance_draws[-1] <= self.compliance
+        self._compliance_draws = self._compliance_draws[:-1]
+        return complies
 
     def _generate_time_from_symptoms_to_testing(self):
-        return max(
-            0, np.random.normal(loc=self.testing_mean_time, scale=self.testing_std_time)
-        )
+        if len(self._testing_delay_draws) == 0:
+            self._testing_delay_draws = np.maximum(
+                0,
+                np.random.normal(
+                    loc=self.testing_mean_time,
+                    scale=self.testing_std_time,
+                    size=default_buffer_size,
+                ),
+            )
+        time_to_testing = self._testing_delay_draws[-1]
+        self._testing_delay_draws = self._testing_delay_draws[:-1]
+        return time_to_testing
 
     def _generate_time_of_testing(self, person: Person):
         try:
@@ -59,35 +90,161 @@ class Isolation(MedicalCarePolicy):
                 f"Trying to generate time of testing for a non infected person."
             )
 
+    def _get_isolation_units(self, medical_facilities) -> IsolationUnits:
+        """
+        Finds the isolation units among the medical facilities. The result is
+        kept until a different collection of medical facilities is given, so the
+        lookup happens once per simulation rather than once per patient.
+        """
+        if medical_facilities is not self._medical_facilities:
+            if isinstance(medical_facilities, IsolationUnits):
+                isolation_units = medical_facilities
+            else:
+                isolation_units = [
+                    medical_facility
+                    for medical_facility in medical_facilities
+                    if isinstance(medical_facility, IsolationUnits)
+                ][0]
+            self._medical_facilities = medical_facilities
+            self._isolation_units = isolation_units
+        return self._isolation_units
+
+    def _get_row(self, person: Person, days_from_start: float) -> int:
+        row = self._row_by_id.get(person.id)
+        if row is None:
+            row = len(self._people)
+            if row == len(self._time_of_testing):
+                row = self._compact_rows(days_from_start)
+            if row == len(self._time_of_testing):
+                self._time_of_symptoms_onset = np.resize(
+                    self._time_of_symptoms_onset, 2 * row
+                )
+                self._time_of_testing = np.resize(self._time_of_testing, 2 * row)
+                self._complies = np.resize(self._complies, 2 * row)
+                self._in_quarantine_window = np.resize(
+                    self._in_quarantine_window, 2 * row
+                )
+            self._row_by_id[person.id] = row
+            self._people.append(person)
+            self._complies[row] = True
+        return row
+
+    def _compact_rows(self, days_from_start: float) -> int:
+        """
+        Forgets the people whose quarantine window has closed or who are no
+        longer infected, so the state only grows with the current outbreak.
+
+        Returns
+        -------
+        Number of rows kept
+        """
+        n_people = len(self._people)
+        keep = (
+            self._time_of_testing[:n_people] + self.n_quarantine_days
+            >= days_from_start
+        ) & np.array([person.infected for person in self._people], dtype=bool)
+        kept_rows = np.flatnonzero(keep)
+        n_kept = len(kept_rows)
+        for array in (
+            self._time_of_symptoms_onset,
+            self._time_of_testing,
+            self._complies,
+            self._in_quarantine_window,
+        ):
+            array[:n_kept] = array[kept_rows]
+        self._people = [self._people[row] for row in kept_rows]
+        self._row_by_id = {person.id: row for row, person in enumerate(self._people)}
+        return n_kept
+
+    def _is_in_quarantine_window(self, row: int, days_from_start: float) -> bool:
+        time_of_testing = self._time_of_testing[row]
+        return bool(
+            self._complies[row]
+            and time_of_testing
+            <= days_from_start
+            <= time_of_testing + self.n_quarantine_days
+        )
+
+    def _register(
+        self, person: Person, isolation_units: IsolationUnits, days_from_start: float
+    ) -> int:
+        """
+        Stores the testing time and compliance of a person the first time
+        the policy sees their infection.
+        """
+        row = self._get_row(person, days_from_start)
+        if person.infection.time_of_testing is None:
+            self._complies[row] = self._draw_compliance()
+            if not self._complies[row]:
+                isolation_units.n_refused += 1
+            person.infection.time_of_testing = self._generate_time_of_testing(person)
+        time_of_symptoms_onset = person.infection.time_of_symptoms_onset
+        self._time_of_symptoms_onset[row] = (
+            np.inf if time_of_symptoms_onset is None else time_of_symptoms_onset
+        )
+        self._time_of_testing[row] = person.infection.time_of_testing
+        self._in_quarantine_window[row] = self._is_in_quarantine_window(
+            row, days_from_start
+        )
+        return row
+
+    def _update_quarantine_windows(
+        self, days_from_start: float, isolation_units: IsolationUnits
+    ):
+        """
+        Decides at once who is within their quarantine window at this time
+        step. Patients whose window has closed are released in bulk, their
+        beds go to the waitlist, and the occupancy of the units is recorded.
+        """
+        self._current_time = days_from_start
+        n_people = len(self._people)
+        time_of_testing = self._time_of_testing[:n_people]
+        self._in_quarantine_window[:n_people] = (
+            self._complies[:n_people]
+            & (time_of_testing <= days_from_start)
+            & (days_from_start <= time_of_testing + self.n_quarantine_days)
+        )
+        isolation_units.release_patients(days_from_start)
+        isolation_units.record_occupancy(days_from_start)
+
+    def start_timestep(self, world, days_from_start: float):
+        """
+        Updates the quarantine windows, releases the patients whose window has
+        closed and records the occupancy of the units. Called once per time
+        step by the CampActivityManager, before people move, so releases go on
+        when nobody infected is left to apply the policy to.
+        """
+        if world.isolation_units is not None:
+            self._update_quarantine_windows(days_from_start, world.isolation_units)
+
     def apply(
         self, person: Person, medical_facilities: IsolationUnits, days_from_start: float
     ):
-        isolation_units = [
-            medical_facility
-            for medical_facility in medical_facilities
-            if isinstance(medical_facility, IsolationUnits)
-        ][0]
-        if person.infected:
-            if person.infection.time_of_testing is None:
-                if np.random.rand() > self.compliance:
-                    isolation_units.refused_to_go_ids.add(person.id)
-                person.infection.time_of_testing = self._generate_time_of_testing(
-                    person
-                )
-        else:
+        isolation_units = self._get_isolation_units(medical_facilities)
+        if not person.infected:
             return False
+        row = self._row_by_id.get(person.id)
+        if (
+            row is None
+            or person.infection.time_of_testing is None
+            or self._people[row] is not person
+        ):
+            row = self._register(person, isolation_units, days_from_start)
+        if days_from_start == self._current_time:
+            in_quarantine_window = self._in_quarantine_window[row]
+        else:
+            # outside of a simulation time step, only this person is checked
+            in_quarantine_window = self._is_in_quarantine_window(row, days_from_start)
         if (
-            not person.hospitalised
+            in_quarantine_window
+            and not person.hospitalised
             and not person.intensive_care
-            and person.id not in isolation_units.refused_to_go_ids
+            and person.symptoms.tag.value >= SymptomTag.mild.value  # mild or more
         ):
-            if person.symptoms.tag.value >= SymptomTag.mild.value:  # mild or more
-                if (
-                    person.infection.time_of_testing
-                    <= days_from_start
-                    <= person.infection.time_of_testing + self.n_quarantine_days
-                ):
-                    isolation_unit = isolation_units.get_closest()
-                    isolation_unit.add(person)
-                    return True
+            isolation_unit = isolation_units.admit_patient(
+                person,
+                release_time=self._time_of_testing[row] + self.n_quarantine_days,
+            )
+            return isolation_unit is not None
+        isolation_units.release_patient(person)
         return False
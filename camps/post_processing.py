@@ -0,0 +1,189 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+import tables
+
+logger = logging.getLogger("post_processing")
+
+default_age_bins = (0, 5, 12, 18, 60)
+
+
+class InfectionLocationCounter:
+    """
+    Counts the infections of a run by location type, day, region and age
+    bin, reading the infections table of the record in chunks. Only the
+    ages of the population and one chunk of infections are in memory at any
+    time, rather than the whole infection table merged with the population.
+
+    Parameters
+    ----------
+    age_bins
+        lower edges of the age bins, the last one is open ended
+    chunk_size
+        number of infections read at once
+    """
+
+    axes = ("location_specs", "timestamp", "region", "age_bin")
+
+    def __init__(self, age_bins: Sequence[int] = default_age_bins, chunk_size=500_000):
+        self.age_bins = np.array(age_bins)
+        self.chunk_size = chunk_size
+        self.labels = {
+            "location_specs": [],
+            "timestamp": [],
+            "region": [],
+            "age_bin": [
+                f"{low}-{high - 1}" for low, high in zip(age_bins[:-1], age_bins[1:])
+            ]
+            + [f"{age_bins[-1]}+"],
+        }
+        self.codes = {axis: {} for axis in self.axes[:-1]}
+        self.counts = np.zeros(
+            (0, 0, 0, len(self.labels["age_bin"])), dtype=np.int64
+        )
+
+    def _encode(self, axis: str, values: np.ndarray) -> np.ndarray:
+        """
+        Maps the values of a chunk to the indices of the axis, adding the
+        values not seen before.
+        """
+        uniques, inverse = np.unique(values, return_inverse=True)
+        codes = self.codes[axis]
+        for value in uniques:
+            if value not in codes:
+                codes[value] = len(codes)
+                self.labels[axis].append(value.decode("utf-8"))
+        return np.array([codes[value] for value in uniques], dtype=np.int64)[inverse]
+
+    def _grow(self):
+        shape = tuple(len(self.labels[axis]) for axis in self.axes)
+        if shape != self.counts.shape:
+            padding = [(0, new - old) for new, old in zip(shape, self.counts.shape)]
+            self.counts = np.pad(self.counts, padding)
+
+    def add(self, location_specs, timestamps, regions, ages):
+        """
+        Adds a chunk of infections, given as arrays of the location type, day
+        and region as bytes, and the age of the infected.
+        """
+        indices = (
+            self._encode("location_specs", location_specs),
+            self._encode("timestamp", timestamps),
+            self._encode("region", regions),
+            np.digitize(ages, self.age_bins) - 1,
+        )
+        self._grow()
+        flat_indices = np.ravel_multi_index(indices, self.counts.shape)
+        self.counts += np.bincount(flat_indices, minlength=self.counts.size).reshape(
+            self.counts.shape
+        )
+
+    @staticmethod
+    def get_ages(record_file: tables.File):
+        """
+        Returns the sorted ids of the population and their ages.
+        """
+        population = record_file.root.population
+        ids = population.read(field="id")
+        ages = population.read(field="age")
+        order = np.argsort(ids)
+        return ids[order], ages[order]
+
+    def read(self, record_path: Path) -> "InfectionLocationCounter":
+        """
+        Counts the infections of the record at record_path.
+        """
+        with tables.open_file(str(record_path), mode="r") as record_file:
+            person_ids, person_ages = self.get_ages(record_file)
+            infections = record_file.root.infections
+            for start in range(0, infections.nrows, self.chunk_size):
+                chunk = infections.read(start, start + self.chunk_size)
+                positions = np.searchsorted(person_ids, chunk["infected_ids"])
+                self.add(
+                    chunk["location_specs"],
+                    chunk["timestamp"],
+                    chunk["region_names"],
+                    person_ages[np.minimum(positions, len(person_ids) - 1)],
+                )
+            logger.info(f"Counted {infections.nrows} infections")
+        return self
+
+    def get_locations_df(self) -> pd.Series:
+        """
+        Number of infections by location type and day, as the groupby of the
+        infections table used to give.
+        """
+        counts = self.counts.sum(axis=(2, 3))
+        spec_index, time_index = np.nonzero(counts)
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.array(self.labels["location_specs"], dtype=object)[spec_index],
+                pd.to_datetime(np.array(self.labels["timestamp"])[time_index]),
+            ],
+            names=["location_specs", "timestamp"],
+        )
+        return pd.Series(counts[spec_index, time_index], index=index).sort_index()
+
+    def to_dict(self) -> Dict[str, np.ndarray]:
+        return {
+            "counts": self.counts,
+            **{axis: np.array(self.labels[axis]) for axis in self.axes},
+        }
+
+    def save(self, save_path: Path, filename="infection_locations.npz"):
+        """
+        Writes the counts and the labels of their axes, compressed.
+        """
+        np.savez_compressed(Path(save_path) / filename, **self.to_dict())
+
+    @classmethod
+    def load(cls, path: Path) -> pd.Series:
+        """
+        Reads saved counts as a series indexed by the four axes, without the
+        empty combinations.
+        """
+        with np.load(path) as data:
+            counts = data["counts"]
+            nonzero = np.nonzero(counts)
+            index = pd.MultiIndex.from_arrays(
+                [data[axis][indices] for axis, indices in zip(cls.axes, nonzero)],
+                names=cls.axes,
+            )
+            return pd.Series(counts[nonzero], index=index, name="infections")
+
+
+def count_infection_locations(
+    save_path: Path,
+    record_name: str = "june_record.h5",
+    age_bins: Sequence[int] = default_age_bins,
+    chunk_size: int = 500_000,
+) -> InfectionLocationCounter:
+    """
+    Counts the infections in the record of a run and writes locations.csv and
+    infection_locations.npz next to it.
+    """
+    save_path = Path(save_path)
+    counter = InfectionLocationCounter(age_bins=age_bins, chunk_size=chunk_size)
+    counter.read(save_path / record_name)
+    counter.get_locations_df().to_csv(save_path / "locations.csv")
+    counter.save(save_path)
+    return counter
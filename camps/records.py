@@ -0,0 +1,287 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import csv
+import shutil
+import logging
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from june.records import Record
+
+from camps.post_processing import InfectionLocationCounter, default_age_bins
+
+logger = logging.getLogger("records")
+
+
+class CampRecord(Record):
+    """
+    Record that also keeps daily counters of the events of a camp run, so the
+    infection locations and the counts by region are available while the
+    simulation runs, without reading the records file afterwards.
+
+    Every day, the number of infections by venue type, hospital and ICU
+    admissions, isolation unit admissions and deaths are counted by region.
+    Finished days are kept in memory and appended to camp_summary.csv and
+    locations.csv every flush_every days, so memory does not grow with the
+    length of the run. The infections by venue type, day, region and age bin
+    are kept in an InfectionLocationCounter, saved to infection_locations.npz
+    on every flush. The number of people infected at the last time step and
+    of infections so far are kept for the whole camp, for the early stopping
+    of CampSimulator.
+
+    Parameters
+    ----------
+    record_path
+        folder where the records are written
+    record_static_data
+        whether to record the population and geography
+    mpi_rank
+        rank of the process, when running with MPI
+    age_bins
+        lower edges of the age bins of the infection counts
+    flush_every
+        number of days kept in memory before they are written
+    """
+
+    camp_summary_filename = "camp_summary.csv"
+    locations_filename = "locations.csv"
+
+    def __init__(
+        self,
+        record_path: str,
+        record_static_data=False,
+        mpi_rank: Optional[int] = None,
+        age_bins: Sequence[int] = default_age_bins,
+        flush_every: int = 7,
+    ):
+        super().__init__(
+            record_path=record_path,
+            record_static_data=record_static_data,
+            mpi_rank=mpi_rank,
+        )
+        self.flush_every = flush_every
+        self.infection_locations = InfectionLocationCounter(age_bins=age_bins)
+        self.current_date = None
+        self.daily_counts = defaultdict(int)
+        self.daily_locations = Counter()
+        self._isolation_admissions = {}
+        self._summary_rows = []
+        self._location_rows = []
+        self._n_buffered_days = 0
+        self.n_infected = 0
+        self.n_infections = 0
+        self._current_counts = {}
+        self._time_step_summary = {}
+        with open(self.record_path / self.camp_summary_filename, "w", newline="") as f:
+            csv.writer(f).writerow(["time_stamp", "region", "counter", "count"])
+        with open(self.record_path / self.locations_filename, "w", newline="") as f:
+            csv.writer(f).writerow(["location_specs", "timestamp", "0"])
+
+    def summarise_infections(self, world):
+        daily_infected, current_infected = super().summarise_infections(world)
+        self._time_step_summary["infections"] = (daily_infected, current_infected)
+        return daily_infected, current_infected
+
+    def summarise_hospitalisations(self, world):
+        hospitalisations = super().summarise_hospitalisations(world)
+        self._time_step_summary["hospitalisations"] = hospitalisations
+        return hospitalisations
+
+    def summarise_deaths(self, world):
+        daily_deaths, daily_deaths_in_hospital = super().summarise_deaths(world)
+        self._time_step_summary["deaths"] = (daily_deaths, daily_deaths_in_hospital)
+        return daily_deaths, daily_deaths_in_hospital
+
+    def summarise_time_step(self, timestamp, world):
+        """
+        Writes the rows of summary.csv for the time step with Record, sorted
+        by region, and adds its events to the counters of the day. The
+        summaries Record computes are kept by the summarise_* methods, so
+        they are not computed twice.
+        """
+        date = timestamp.strftime("%Y-%m-%d")
+        if self.current_date is not None and date != self.current_date:
+            self.close_day()
+        self.current_date = date
+
+        self._time_step_summary = {}
+        summary_path = self.record_path / self.summary_filename
+        summary_size = summary_path.stat().st_size
+        super().summarise_time_step(timestamp, world)
+        # Record writes the regions of a set, in an order that changes with
+        # the hash seed
+        self.sort_rows(summary_path, summary_size)
+
+        daily_infected, current_infected = self._time_step_summary["infections"]
+        (
+            daily_hospitalised,
+            daily_intensive_care,
+            current_hospitalised,
+            current_intensive_care,
+        ) = self._time_step_summary["hospitalisations"]
+        daily_deaths, daily_deaths_in_hospital = self._time_step_summary["deaths"]
+        self.n_infected = sum(current_infected.values())
+        self.n_infections += sum(daily_infected.values())
+        regions = set(current_infected) | set(current_hospitalised)
+        regions.update(current_intensive_care)
+        self._current_counts = {
+            region: (
+                current_infected.get(region, 0),
+                current_hospitalised.get(region, 0),
+                current_intensive_care.get(region, 0),
+            )
+            for region in sorted(regions)
+        }
+
+        self.count_infections(date, world)
+        for counter, counts in (
+            ("hospital_admissions", daily_hospitalised),
+            ("icu_admissions", daily_intensive_care),
+            ("deaths", daily_deaths),
+            ("hospital_deaths", daily_deaths_in_hospital),
+            ("isolation_admissions", self.count_isolation_admissions(world)),
+        ):
+            for region, count in counts.items():
+                self.daily_counts[region, counter] += count
+
+    @staticmethod
+    def sort_rows(path: Path, offset: int):
+        """
+        Sorts the rows written to a csv file after offset bytes.
+        """
+        with open(path, "r+", newline="") as f:
+            f.seek(offset)
+            rows = sorted(csv.reader(f))
+            if not rows:
+                return
+            f.seek(offset)
+            csv.writer(f).writerows(rows)
+            f.truncate()
+
+    def summarise_constant_time_steps(self, timestamps):
+        """
+        Writes the rows of summary.csv for time steps that are not simulated,
+        with no new events and the current counts of the last simulated time
+        step. Once no one is infected, these rows are all zero and, like
+        Record, none are written.
+        """
+        with open(
+            self.record_path / self.summary_filename, "a", newline=""
+        ) as summary_file:
+            summary_writer = csv.writer(summary_file)
+            for timestamp in timestamps:
+                date = timestamp.strftime("%Y-%m-%d")
+                for region, (infected, hospitalised, intensive_care) in sorted(
+                    self._current_counts.items()
+                ):
+                    data = [infected, 0, hospitalised, 0, intensive_care, 0, 0, 0]
+                    if sum(data) > 0:
+                        summary_writer.writerow([date, region] + data)
+
+    def move_to(self, record_path):
+        """
+        Copies the files written so far to record_path, and writes there from
+        now on, so runs that share their start can each go on recording in
+        their own folder.
+        """
+        record_path = Path(record_path)
+        record_path.mkdir(parents=True, exist_ok=True)
+        for path in self.record_path.iterdir():
+            if path.is_file():
+                shutil.copy2(path, record_path / path.name)
+        self.record_path = record_path
+
+    def count_infections(self, date: str, world):
+        infections = self.events["infections"]
+        if not infections.infected_ids:
+            return
+        for spec, region in zip(infections.location_specs, infections.region_names):
+            self.daily_counts[region, f"infections_{spec}"] += 1
+        self.daily_locations.update(infections.location_specs)
+        people = world.people
+        ages = np.array(
+            [people.get_from_id(person_id).age for person_id in infections.infected_ids]
+        )
+        self.infection_locations.add(
+            np.array(infections.location_specs, dtype="S20"),
+            np.full(len(ages), date, dtype="S10"),
+            np.array(infections.region_names, dtype="S20"),
+            ages,
+        )
+
+    def count_isolation_admissions(self, world) -> dict:
+        """
+        Number of people admitted to the isolation units of every region since
+        the last time step.
+        """
+        admissions = defaultdict(int)
+        if getattr(world, "isolation_units", None) is None:
+            return admissions
+        for isolation_unit in world.isolation_units:
+            n_admitted = isolation_unit.n_admitted
+            new_admissions = n_admitted - self._isolation_admissions.get(
+                isolation_unit.id, 0
+            )
+            self._isolation_admissions[isolation_unit.id] = n_admitted
+            if new_admissions > 0 and isolation_unit.area is not None:
+                region = isolation_unit.area.super_area.region.name
+                admissions[region] += new_admissions
+        return admissions
+
+    def close_day(self):
+        """
+        Moves the counters of the current day to the rows waiting to be
+        written, and writes them if enough days are waiting.
+        """
+        if self.current_date is None:
+            return
+        for (region, counter), count in sorted(self.daily_counts.items()):
+            if count > 0:
+                self._summary_rows.append([self.current_date, region, counter, count])
+        for spec, count in sorted(self.daily_locations.items()):
+            self._location_rows.append([spec, self.current_date, count])
+        self.daily_counts.clear()
+        self.daily_locations.clear()
+        self._n_buffered_days += 1
+        if self._n_buffered_days >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the rows of the finished days to the csv files and saves the
+        infection counts.
+        """
+        with open(self.record_path / self.camp_summary_filename, "a", newline="") as f:
+            csv.writer(f).writerows(self._summary_rows)
+        with open(self.record_path / self.locations_filename, "a", newline="") as f:
+            csv.writer(f).writerows(self._location_rows)
+        self.infection_locations.save(self.record_path)
+        self._summary_rows = []
+        self._location_rows = []
+        self._n_buffered_days = 0
+
+    def finalise(self):
+        """
+        Writes the counters of the last day. To be called once the simulation
+        is over.
+        """
+        self.close_day()
+        self.current_date = None
+        self.flush()
@@ -0,0 +1,467 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import re
+import json
+import time
+import pickle
+import sqlite3
+import logging
+import argparse
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import tables
+import yaml
+
+logger = logging.getLogger("results")
+
+# parameters that differ between repeats of the same cell of a sweep
+non_cell_parameters = ("save_path", "s", "random_seed")
+
+run_metrics = [
+    "peak_infections",
+    "days_to_peak",
+    "total_infections",
+    "attack_rate",
+    "total_hospitalisations",
+    "total_deaths",
+]
+
+daily_columns = [
+    "current_infected",
+    "daily_infected",
+    "current_hospitalised",
+    "daily_hospitalised",
+    "daily_deaths",
+]
+
+
+def _to_sql_value(value):
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return json.dumps(value, default=str)
+
+
+def _quote(name: str) -> str:
+    if not re.fullmatch(r"\w+", name):
+        raise ValueError(f"{name} can not be used as a parameter name")
+    return f'"{name}"'
+
+
+def get_population_size(save_path: Path) -> Optional[int]:
+    """
+    Number of people in the records file of a run, if it was recorded.
+    """
+    record_path = Path(save_path) / "june_record.h5"
+    if not record_path.exists():
+        return None
+    with tables.open_file(str(record_path), mode="r") as f:
+        if "population" not in f.root:
+            return None
+        return f.root.population.nrows
+
+
+def get_daily_summary(summary_path: Path) -> pd.DataFrame:
+    """
+    World totals of the summary of a run by day. Like RecordReader, current
+    values are averaged over the time steps of a day and daily values summed.
+    """
+    df = pd.read_csv(summary_path)
+    columns = [col for col in df.columns if col not in ["time_stamp", "region"]]
+    aggregator = {col: "mean" if "current" in col else "sum" for col in columns}
+    daily = (
+        df.groupby(["region", "time_stamp"])
+        .agg(aggregator)
+        .groupby("time_stamp")
+        .sum()
+    )
+    daily.index = pd.to_datetime(daily.index)
+    return daily.sort_index()
+
+
+def _total(daily: pd.DataFrame, column: str) -> Optional[float]:
+    return float(daily[column].sum()) if column in daily else None
+
+
+def get_initial_date(save_path: Path) -> Optional[pd.Timestamp]:
+    """
+    Day a run started on, from the config.yaml of its records, if it was
+    recorded.
+    """
+    config_path = Path(save_path) / "config.yaml"
+    if not config_path.exists():
+        return None
+    with open(config_path) as f:
+        config = yaml.safe_load(f) or {}
+    initial_day = config.get("time", {}).get("initial_day")
+    if initial_day is None:
+        return None
+    return pd.Timestamp(initial_day).normalize()
+
+
+def _get_start(daily: pd.DataFrame, initial_date=None) -> pd.Timestamp:
+    # summaries have no rows for days without infected people
+    if initial_date is None:
+        return daily.index[0]
+    return min(pd.Timestamp(initial_date).normalize(), daily.index[0])
+
+
+def get_run_metrics(
+    daily: pd.DataFrame, population: Optional[int] = None, initial_date=None
+) -> dict:
+    """
+    Peak infections, time to peak, attack rate and totals of a run, from its
+    daily world summary. Days to peak are counted from initial_date, the
+    first day of the summary if not given.
+    """
+    if len(daily) == 0:
+        return {metric: None for metric in run_metrics}
+    peak_date = daily["current_infected"].idxmax()
+    total_infections = float(daily["daily_infected"].sum())
+    start = _get_start(daily, initial_date)
+    return {
+        "peak_infections": float(daily["current_infected"].max()),
+        "peak_date": peak_date.strftime("%Y-%m-%d"),
+        "days_to_peak": float((peak_date - start).days),
+        "total_infections": total_infections,
+        "attack_rate": total_infections / population if population else None,
+        "total_hospitalisations": _total(daily, "daily_hospitalised"),
+        "total_deaths": _total(daily, "daily_deaths"),
+    }
+
+
+class SweepResultStore:
+    """
+    SQLite database of the results of a sweep, filled as runs finish.
+
+    Every run is a row of the runs table, with a column for each of its
+    parameters and its metrics (peak infections, days to peak, attack rate and
+    totals), and its world summary by day is in the daily table. Runs whose
+    parameters only differ by seed or save path share a cell, and the cells
+    table keeps, for every metric, the count, mean, sum of squared deviations
+    from the mean, minimum and maximum over the runs of the cell. These are
+    updated with Welford's method when a run is added, so reading the
+    aggregates does not go through the runs. Parameter columns are indexed in
+    both tables.
+
+    Parameters
+    ----------
+    path
+        database file, created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        metric_columns = ", ".join(f"{metric} REAL" for metric in run_metrics)
+        aggregate_columns = ", ".join(
+            f"mean_{metric} REAL DEFAULT 0, m2_{metric} REAL DEFAULT 0, "
+            f"n_{metric} INTEGER DEFAULT 0, min_{metric} REAL, max_{metric} REAL"
+            for metric in run_metrics
+        )
+        daily = ", ".join(f"{column} REAL" for column in daily_columns)
+        with self.connection:
+            self.connection.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run INTEGER PRIMARY KEY, cell INTEGER, save_path TEXT,
+                    population INTEGER, peak_date TEXT, ingested_at REAL,
+                    {metric_columns}
+                );
+                CREATE TABLE IF NOT EXISTS cells (
+                    cell INTEGER PRIMARY KEY, key TEXT UNIQUE,
+                    n_runs INTEGER DEFAULT 0, {aggregate_columns}
+                );
+                CREATE TABLE IF NOT EXISTS daily (
+                    run INTEGER, time_stamp TEXT, day INTEGER, {daily}
+                );
+                CREATE INDEX IF NOT EXISTS daily_run ON daily (run);
+                CREATE INDEX IF NOT EXISTS runs_cell ON runs (cell);
+                """
+            )
+        self.parameters = [
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(cells)")
+            if row[1] not in self._cell_columns()
+        ]
+
+    @staticmethod
+    def _cell_columns():
+        columns = {"cell", "key", "n_runs"}
+        for metric in run_metrics:
+            columns.update(
+                f"{prefix}_{metric}" for prefix in ["mean", "m2", "n", "min", "max"]
+            )
+        return columns
+
+    def close(self):
+        self.connection.close()
+
+    def _add_parameter(self, name: str):
+        """
+        Adds an indexed column for a parameter seen for the first time.
+        """
+        for table in ["runs", "cells"]:
+            self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(name)}")
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({_quote(name)})"
+            )
+        self.parameters.append(name)
+
+    def _get_cell(self, cell_parameters: dict) -> int:
+        key = json.dumps(cell_parameters, sort_keys=True, default=str)
+        row = self.connection.execute(
+            "SELECT cell FROM cells WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        names = list(cell_parameters)
+        columns = ", ".join(["key"] + [_quote(name) for name in names])
+        placeholders = ", ".join("?" * (len(names) + 1))
+        cursor = self.connection.execute(
+            f"INSERT INTO cells ({columns}) VALUES ({placeholders})",
+            [key] + [cell_parameters[name] for name in names],
+        )
+        return cursor.lastrowid
+
+    def _update_cell(self, cell: int, metrics: dict, sign: int = 1):
+        """
+        Adds the metrics of a run to the aggregates of its cell, or removes
+        them with sign=-1, after which the extrema are recomputed. Running
+        means and sums of squared deviations keep the variance accurate when
+        it is small next to the mean, unlike sums of squares.
+        """
+        aggregates = ", ".join(
+            f"n_{metric}, mean_{metric}, m2_{metric}" for metric in run_metrics
+        )
+        row = self.connection.execute(
+            f"SELECT {aggregates} FROM cells WHERE cell = ?", (cell,)
+        ).fetchone()
+        assignments = ["n_runs = n_runs + ?"]
+        values = [sign]
+        for ii, metric in enumerate(run_metrics):
+            value = metrics.get(metric)
+            if value is None:
+                continue
+            n, mean, m2 = row[3 * ii : 3 * ii + 3]
+            n += sign
+            if n > 0:
+                delta = value - mean
+                mean += sign * delta / n
+                m2 = max(m2 + sign * delta * (value - mean), 0.0)
+            else:
+                mean, m2 = 0.0, 0.0
+            assignments += [f"n_{metric} = ?", f"mean_{metric} = ?", f"m2_{metric} = ?"]
+            values += [n, mean, m2]
+            if sign > 0:
+                assignments += [
+                    f"min_{metric} = min(coalesce(min_{metric}, ?), ?)",
+                    f"max_{metric} = max(coalesce(max_{metric}, ?), ?)",
+                ]
+                values += [value, value, value, value]
+        self.connection.execute(
+            f"UPDATE cells SET {', '.join(assignments)} WHERE cell = ?",
+            values + [cell],
+        )
+        if sign < 0:
+            extrema = ", ".join(
+                f"min_{metric} = (SELECT min({metric}) FROM runs WHERE cell = ?), "
+                f"max_{metric} = (SELECT max({metric}) FROM runs WHERE cell = ?)"
+                for metric in run_metrics
+            )
+            self.connection.execute(
+                f"UPDATE cells SET {extrema} WHERE cell = ?",
+                [cell] * (2 * len(run_metrics) + 1),
+            )
+
+    def _remove_run(self, run: int):
+        columns = ", ".join(["cell"] + run_metrics)
+        row = self.connection.execute(
+            f"SELECT {columns} FROM runs WHERE run = ?", (run,)
+        ).fetchone()
+        if row is None:
+            return
+        self.connection.execute("DELETE FROM runs WHERE run = ?", (run,))
+        self.connection.execute("DELETE FROM daily WHERE run = ?", (run,))
+        self._update_cell(row[0], dict(zip(run_metrics, row[1:])), sign=-1)
+
+    def add_run(
+        self,
+        run: int,
+        parameters: dict,
+        daily: pd.DataFrame,
+        population: Optional[int] = None,
+        save_path=None,
+        initial_date=None,
+    ) -> dict:
+        """
+        Stores a run from its parameters and daily world summary, and adds its
+        metrics to the aggregates of its cell. A run added again replaces the
+        previous version. Days are counted from initial_date, the first day of
+        the summary if not given.
+        """
+        parameters = {
+            name: _to_sql_value(value)
+            for name, value in parameters.items()
+            if name not in ["save_path", "s"]
+        }
+        metrics = get_run_metrics(
+            daily, population=population, initial_date=initial_date
+        )
+        with self.connection:
+            for name in parameters:
+                if name not in self.parameters:
+                    self._add_parameter(name)
+            self._remove_run(run)
+            cell = self._get_cell(
+                {
+                    name: value
+                    for name, value in parameters.items()
+                    if name not in non_cell_parameters
+                }
+            )
+            row = {
+                "run": run,
+                "cell": cell,
+                "save_path": None if save_path is None else str(save_path),
+                "population": population,
+                "ingested_at": time.time(),
+                **{metric: metrics.get(metric) for metric in run_metrics},
+                "peak_date": metrics.get("peak_date"),
+                **parameters,
+            }
+            columns = ", ".join(_quote(name) for name in row)
+            self.connection.execute(
+                f"INSERT INTO runs ({columns}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()),
+            )
+            if len(daily):
+                days = (daily.index - _get_start(daily, initial_date)).days
+                self.connection.executemany(
+                    f"INSERT INTO daily (run, time_stamp, day, "
+                    f"{', '.join(daily_columns)}) "
+                    f"VALUES ({', '.join('?' * (len(daily_columns) + 3))})",
+                    [
+                        [run, date.strftime("%Y-%m-%d"), int(day)]
+                        + [
+                            float(values[column]) if column in values else None
+                            for column in daily_columns
+                        ]
+                        for (date, values), day in zip(daily.iterrows(), days)
+                    ],
+                )
+            self._update_cell(cell, metrics)
+        return metrics
+
+    def ingest(self, run: int, parameters: dict, save_path, population=None) -> dict:
+        """
+        Adds a finished run from the summary.csv in its save_path.
+        """
+        save_path = Path(save_path)
+        if population is None:
+            population = get_population_size(save_path)
+        return self.add_run(
+            run,
+            parameters,
+            get_daily_summary(save_path / "summary.csv"),
+            population=population,
+            save_path=save_path,
+            initial_date=get_initial_date(save_path),
+        )
+
+    def ingest_sweep(self, output_dir, parameter_grid=None) -> list:
+        """
+        Adds the finished runs of a sweep directory that are not stored yet.
+        """
+        output_dir = Path(output_dir)
+        if parameter_grid is None:
+            with open(output_dir / "parameter_grid.pkl", "rb") as f:
+                parameter_grid = list(pickle.load(f))
+        stored = {row[0] for row in self.connection.execute("SELECT run FROM runs")}
+        ingested = []
+        for run, parameters in enumerate(parameter_grid):
+            save_path = output_dir / f"run_{run:03d}"
+            if run in stored or not (save_path / "summary.csv").exists():
+                continue
+            self.ingest(run, parameters, save_path)
+            ingested.append(run)
+        return ingested
+
+    def _select(self, table: str, columns: str, parameters: dict) -> pd.DataFrame:
+        conditions = [f"{_quote(name)} = ?" for name in parameters]
+        query = f"SELECT {columns} FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return pd.read_sql_query(
+            query,
+            self.connection,
+            params=[_to_sql_value(value) for value in parameters.values()],
+        )
+
+    def get_runs(self, **parameters) -> pd.DataFrame:
+        """
+        Runs with the given parameter values, with their metrics.
+        """
+        return self._select("runs", "*", parameters).set_index("run")
+
+    def get_cells(self, **parameters) -> pd.DataFrame:
+        """
+        Mean, standard deviation, minimum and maximum of the metrics of every
+        cell with the given parameter values, and its number of runs.
+        """
+        cells = self._select("cells", "*", parameters).set_index("cell")
+        result = cells[self.parameters + ["n_runs"]].copy()
+        for metric in run_metrics:
+            n = cells[f"n_{metric}"].replace(0, np.nan)
+            result[f"mean_{metric}"] = cells[f"mean_{metric}"].where(n.notna())
+            result[f"std_{metric}"] = np.sqrt(cells[f"m2_{metric}"] / n)
+            result[f"min_{metric}"] = cells[f"min_{metric}"]
+            result[f"max_{metric}"] = cells[f"max_{metric}"]
+        return result
+
+    def get_daily(self, run: int) -> pd.DataFrame:
+        return pd.read_sql_query(
+            "SELECT * FROM daily WHERE run = ? ORDER BY day",
+            self.connection,
+            params=(run,),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Add the finished runs of a sweep to its results database"
+    )
+    parser.add_argument("sweep_dir", help="output directory of the sweep")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="database file, sweep_dir/results.sqlite by default",
+    )
+    args = parser.parse_args()
+    sweep_dir = Path(args.sweep_dir)
+    store = SweepResultStore(args.output or sweep_dir / "results.sqlite")
+    ingested = store.ingest_sweep(sweep_dir)
+    print(f"Added {len(ingested)} runs to {store.path}")
+    store.close()
@@ -0,0 +1,256 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import logging
+from collections import deque
+from typing import Optional
+
+from june.simulator import Simulator
+
+from camps.activity import CampActivityManager
+from camps.checkpoint import SimulationCheckpointer
+from camps.records import CampRecord
+
+logger = logging.getLogger("simulator")
+
+early_stop_criteria = ("none", "extinction", "plateau")
+
+
+class EarlyStopping:
+    """
+    Criteria to end a camp run before its final date, checked at the end of
+    every simulated day.
+
+    The epidemic is extinct when no one is infected and no infection seed has
+    seeding dates left. Nothing can happen after that, so stopping changes no
+    output. It has reached a plateau when the infections so far grew by less
+    than plateau_tolerance, relative to their number, over the last
+    plateau_days days. This is an approximation: the people still infected
+    are counted as infected until the final date.
+
+    Parameters
+    ----------
+    extinction
+        whether to stop once the epidemic is extinct
+    plateau_days
+        days over which the infections are compared, no plateau criterion if
+        not given
+    plateau_tolerance
+        relative growth of the infections under which the epidemic has
+        reached a plateau
+    min_days
+        days to simulate before checking any criterion
+    """
+
+    def __init__(
+        self,
+        extinction: bool = True,
+        plateau_days: Optional[int] = None,
+        plateau_tolerance: float = 0.01,
+        min_days: int = 0,
+    ):
+        self.extinction = extinction
+        self.plateau_days = plateau_days
+        self.plateau_tolerance = plateau_tolerance
+        self.min_days = min_days
+        self.n_infections = deque(maxlen=(plateau_days or 0) + 1)
+
+    @classmethod
+    def from_parameters(cls, parameters: dict) -> Optional["EarlyStopping"]:
+        """
+        Early stopping of a run from its early_stop, plateau_days and
+        plateau_tolerance parameters, None for early_stop "none".
+        """
+        criterion = parameters.get("early_stop", "none")
+        if criterion not in early_stop_criteria:
+            raise ValueError(
+                f"early_stop is one of {early_stop_criteria}, not {criterion}"
+            )
+        if criterion == "none":
+            return None
+        return cls(
+            extinction=True,
+            plateau_days=(
+                int(parameters["plateau_days"]) if criterion == "plateau" else None
+            ),
+            plateau_tolerance=float(parameters.get("plateau_tolerance", 0.01)),
+        )
+
+    @staticmethod
+    def has_pending_seeds(simulator) -> bool:
+        infection_seeds = getattr(simulator.epidemiology, "infection_seeds", None)
+        if not infection_seeds:
+            return False
+        for infection_seed in infection_seeds:
+            max_date = getattr(infection_seed, "max_date", None)
+            if max_date is None or max_date >= simulator.timer.date:
+                return True
+        return False
+
+    def check(self, simulator) -> Optional[str]:
+        """
+        Name of the criterion that holds at the end of the day just
+        simulated, None if the run should go on.
+        """
+        record = simulator.record
+        if isinstance(record, CampRecord):
+            n_infected, n_infections = record.n_infected, record.n_infections
+        else:
+            n_infected, n_infections = len(simulator.world.people.infected), None
+        self.n_infections.append(n_infections)
+        if simulator.timer.now < self.min_days:
+            return None
+        if self.extinction and n_infected == 0:
+            if not self.has_pending_seeds(simulator):
+                return "extinction"
+        if (
+            self.plateau_days
+            and n_infections
+            and len(self.n_infections) == self.n_infections.maxlen
+            and not self.has_pending_seeds(simulator)
+        ):
+            growth = n_infections - self.n_infections[0]
+            if growth <= self.plateau_tolerance * n_infections:
+                return "plateau"
+        return None
+
+
+class CampSimulator(Simulator):
+    """
+    Simulator of camp runs, using the CampActivityManager, that can end a run
+    once an EarlyStopping criterion holds. The summary rows of the time steps
+    left are then written by the CampRecord, with no new events and the
+    current counts of the last simulated time step.
+
+    With a SimulationCheckpointer, its state is saved at the end of every few
+    days, and from_checkpoint gives back a simulator whose run continues from
+    there.
+    """
+
+    ActivityManager = CampActivityManager
+    early_stopping = None
+    checkpointer = None
+    started = False
+
+    def __init__(
+        self,
+        *args,
+        early_stopping: Optional[EarlyStopping] = None,
+        checkpointer: Optional[SimulationCheckpointer] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.early_stopping = early_stopping
+        self.checkpointer = checkpointer
+        self.stopped_early = None
+        self.started = False
+
+    @classmethod
+    def from_checkpoint(cls, path) -> "CampSimulator":
+        """
+        Simulator saved in a checkpoint, with the random generators and the
+        outputs set back to their state at the checkpoint.
+        """
+        return SimulationCheckpointer.load(path)
+
+    def run(self, until=None):
+        """
+        Runs the simulation like Simulator.run, checking the early stopping
+        criteria and saving checkpoints at the end of every day. A simulator
+        that has started, run until a date or read from a checkpoint, goes on
+        from the time step its timer is at.
+
+        Parameters
+        ----------
+        until
+            date to stop at, before the final date, from where a later call
+            continues
+        """
+        if self.record is not None and not self.started:
+            # days to peak are counted from here, see camps.results
+            self.record.append_dict_to_configs(
+                config_dict={
+                    "time": {
+                        "initial_day": self.timer.initial_date.strftime(
+                            "%Y-%m-%d %H:%M"
+                        )
+                    }
+                }
+            )
+        if (
+            self.early_stopping is None
+            and self.checkpointer is None
+            and not self.started
+            and until is None
+        ):
+            return super().run()
+        end_date = self.timer.final_date if until is None else until
+        if self.started:
+            logger.info(f"Resuming simulation at {self.timer.date}")
+        else:
+            self.started = True
+            logger.info(
+                f"Starting simulation at day {self.timer.date}, "
+                f"to run for at most {self.timer.total_days} days"
+            )
+            self.clear_world()
+            if self.record is not None:
+                self.record.parameters(
+                    interaction=self.interaction,
+                    epidemiology=self.epidemiology,
+                    activity_manager=self.activity_manager,
+                )
+        while self.timer.date < end_date:
+            if self.epidemiology:
+                self.epidemiology.infection_seeds_timestep(
+                    self.timer, record=self.record
+                )
+            self.do_timestep()
+            end_of_day = (self.timer.now + self.timer.duration).is_integer()
+            if end_of_day and self.timer.date.date() in self.checkpoint_save_dates:
+                logger.info(f"Saving simulation checkpoint at {self.timer.date.date()}")
+                self.save_checkpoint(self.timer.date.date())
+            next(self.timer)
+            if not end_of_day:
+                continue
+            if self.early_stopping is not None:
+                criterion = self.early_stopping.check(self)
+                if criterion is not None:
+                    self.stop_early(criterion)
+                    break
+            if self.checkpointer is not None and self.checkpointer.is_due(self):
+                self.checkpointer.save(self)
+
+    def stop_early(self, criterion: str):
+        """
+        Moves the timer to the final date, writing the summary rows of the
+        time steps skipped.
+        """
+        self.stopped_early = {
+            "criterion": criterion,
+            "date": self.timer.date,
+            "days_skipped": (self.timer.final_date - self.timer.date).days,
+        }
+        logger.info(
+            f"Stopping at {self.timer.date.date()} on {criterion}, "
+            f"{self.stopped_early['days_skipped']} days before the final date"
+        )
+        timestamps = []
+        while self.timer.date < self.timer.final_date:
+            timestamps.append(self.timer.date)
+            next(self.timer)
+        if isinstance(self.record, CampRecord):
+            self.record.summarise_constant_time_steps(timestamps)
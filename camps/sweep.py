@@ -0,0 +1,181 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import gc
+import os
+import time
+import logging
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from camps.instrumentation import RunProfiler, get_peak_rss_mb
+from camps.pipeline import RunPipeline, parse_parameters
+
+logger = logging.getLogger("sweep")
+
+# state shared with the forked workers, set by the parent before forking
+_shared = {}
+
+
+def _run_parameter_set(job) -> dict:
+    """
+    Runs the stages after the shared ones for one parameter set, in a worker
+    forked from the process holding the shared world.
+    """
+    index, parameters = job
+    tick = time.perf_counter()
+    try:
+        Path(parameters["save_path"]).mkdir(parents=True, exist_ok=True)
+        _shared["pipeline"].run(
+            parameters,
+            context=_shared["context"],
+            after=_shared["after"],
+            profiler=RunProfiler(name=f"run_{index:03d}", verbose=False),
+            use_cache=False,
+        )
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return {
+        "index": index,
+        "save_path": str(parameters["save_path"]),
+        "status": "failed" if error else "done",
+        "error": error,
+        "wall_time": time.perf_counter() - tick,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "pid": os.getpid(),
+    }
+
+
+class SweepExecutor:
+    """
+    Runs a parameter grid inside one process tree. The stages up to
+    shared_until are run once in the parent for every distinct set of their
+    parameters, then every parameter set sharing them runs the remaining
+    stages in a worker forked from the parent. Forked workers see the parent's
+    world copy-on-write, and each worker runs a single parameter set, so every
+    run starts from the unmodified world.
+
+    Parameters
+    ----------
+    parameter_grid
+        list of dictionaries of run parameters, as produced by named_grids
+    output_dir
+        directory where the run_{index} results are written, unless a
+        parameter set has its own save_path
+    base_parameters
+        parameters shared by all runs, overridden by the grid
+    pipeline
+        pipeline to run, the default stages are used if not given
+    shared_until
+        name of the last stage shared by the runs
+    n_workers
+        number of runs simulated at the same time, the number of cores if not
+        given
+    """
+
+    def __init__(
+        self,
+        parameter_grid: List[dict],
+        output_dir: str,
+        base_parameters: Optional[dict] = None,
+        pipeline: Optional[RunPipeline] = None,
+        shared_until: str = "attach_venues",
+        n_workers: Optional[int] = None,
+    ):
+        self.parameter_grid = parameter_grid
+        self.output_dir = Path(output_dir)
+        self.base_parameters = base_parameters or {}
+        self.pipeline = pipeline or RunPipeline()
+        self.shared_until = shared_until
+        self.n_workers = n_workers or os.cpu_count()
+
+    def get_parameters(self, index: int) -> dict:
+        parameters = parse_parameters(
+            {**self.base_parameters, **self.parameter_grid[index]}
+        )
+        if "save_path" not in self.parameter_grid[index]:
+            parameters["save_path"] = self.output_dir / f"run_{index:03d}"
+        return parameters
+
+    def group_by_world(self, indices=None) -> "OrderedDict[tuple, list]":
+        """
+        Groups the parameter sets by the values of the parameters of the
+        shared stages, so each group needs a single world.
+        """
+        if indices is None:
+            indices = range(len(self.parameter_grid))
+        shared_index = self.pipeline.get_stage_index(self.shared_until)
+        groups = OrderedDict()
+        for index in indices:
+            parameters = self.get_parameters(index)
+            key = self.pipeline.cache_key(shared_index, parameters)
+            groups.setdefault(key, []).append((index, parameters))
+        return groups
+
+    def run(self, indices=None) -> Iterator[dict]:
+        """
+        Runs the parameter sets, yielding the result of each run as soon as
+        it finishes.
+
+        Parameters
+        ----------
+        indices
+            indices of the parameter sets to run, all of them if not given
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        mp_context = multiprocessing.get_context("fork")
+        groups = self.group_by_world(indices)
+        for group_index, jobs in enumerate(groups.values()):
+            logger.info(
+                f"Building world {group_index + 1}/{len(groups)} "
+                f"shared by {len(jobs)} runs"
+            )
+            profiler = RunProfiler(name=f"world_{group_index:02d}")
+            context = self.pipeline.run(
+                jobs[0][1],
+                until=self.shared_until,
+                profiler=profiler,
+                save_profile=False,
+                use_cache=False,
+            )
+            profiler.save(
+                self.output_dir, filename=f"profile_world_{group_index:02d}.json"
+            )
+            _shared.update(
+                pipeline=self.pipeline, context=context, after=self.shared_until
+            )
+            # keep the garbage collector from touching, and so copying, the
+            # pages of the shared world in the workers
+            gc.collect()
+            gc.freeze()
+            try:
+                with mp_context.Pool(
+                    min(self.n_workers, len(jobs)), maxtasksperchild=1
+                ) as pool:
+                    for result in pool.imap_unordered(_run_parameter_set, jobs):
+                        if result["error"] is not None:
+                            logger.error(
+                                f"Run {result['index']} failed:\n{result['error']}"
+                            )
+                        yield result
+            finally:
+                gc.unfreeze()
+                _shared.clear()
+                del context
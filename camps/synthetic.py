@@ -0,0 +1,610 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import lognorm, rv_discrete
+
+from june.demography import Person, Population
+from june.demography.person import Activities
+from june.epidemiology.infection import Immunity
+from june.geography import Area
+from june.groups import Households
+
+from camps.geography import CampGeography
+from camps.world import CampWorld
+from camps.camp_creation import GenerateDiscretePDF
+from camps.distributors import camp_household_distributor
+from camps.paths import project_directory
+
+logger = logging.getLogger("synthetic")
+
+default_basecamp_path = project_directory / "camp_test_data"
+
+# venues to be assigned from coordinates and relative per-capita baseline parameters
+coords_venues_types = [
+    "distribution_centers",
+    "n_f_distribution_centers",
+    "e_vouchers",
+    "communals",
+    "female_communals",
+    "religiouss",
+    "learning_centers",
+    "hospitals",
+]
+venues_per_capita = {
+    "pump_latrines": 1 / 50,  # from unhcr/sphere -- not used here
+    "play_groups": 1 / 20,  # on kids_population, from unhcr/sphere -- not used here
+    "distribution_centers": 1 / 20000,  # from unhcr/sphere
+    "n_f_distribution_centers": 1 / 20000,
+    "e_vouchers": 1 / 20000,
+    "communals": 1 / 5000,
+    "female_communals": 1 / 5000,
+    "religiouss": 1 / 500,
+    "learning_centers": 1 / 500,  # on kids_population
+    "hospitals": 1 / 20000,
+}
+
+earth_radius = 6371000.0  # meters
+
+# layout of a region: 2x2 super areas of 3x3 areas each
+super_areas_per_side = 2
+areas_per_side = 3
+
+
+def load_basecamp_distributions(data_path=default_basecamp_path) -> dict:
+    """
+    Reads the distributions fitted on a basecamp, which the grid camps are
+    populated from.
+
+    Parameters
+    ----------
+    data_path : Path
+        Folder with the basecamp pickles and enrollment rates.
+
+    Returns
+    -------
+    distributions : dict
+        population_dist_df, n_residents_params, famsize_dict, famsize_avg and
+        flat_enrollment_rates.
+    """
+    data_path = Path(data_path)
+    with open(data_path / "basecamp_population_dist_df.pkl", "rb") as f:
+        population_dist_df = pickle.load(f)
+    with open(data_path / "basecamp_residents_area_fit_params.pkl", "rb") as f:
+        n_residents_params = pickle.load(f)
+    with open(data_path / "basecamp_famsize.pkl", "rb") as f:
+        famsize_dict = pickle.load(f)
+        famsize_avg = pickle.load(f)
+    with open(data_path / "basecamp_flat_enrollment_rates.json") as f:
+        flat_enrollment_rates = json.load(f)
+    return {
+        "population_dist_df": population_dist_df,
+        "n_residents_params": n_residents_params,
+        "famsize_dict": famsize_dict,
+        "famsize_avg": famsize_avg,
+        "flat_enrollment_rates": flat_enrollment_rates,
+    }
+
+
+def new_lat_lon(lat, lon, d_lat, d_lon):
+    """
+    Shifts a position by d_lat and d_lon meters. Works on arrays of shifts.
+    """
+    new_lat = lat + (d_lat / earth_radius) * (180 / np.pi)
+    new_lon = lon + (d_lon / earth_radius) * (180 / np.pi) / np.cos(lat * np.pi / 180)
+    return new_lat, new_lon
+
+
+def generate_geo_grid(n_regions, area_spacing=150, init_lat=0.0, init_lon=0.0):
+    """
+    Generate geographical location for a grid-like world.
+    Every region is divided into 4 super areas of 9 areas each (total n_areas = 4*9*n_regions).
+    With this geography of 4*9 areas in each region, an area_spacing of 150m allows to get regions (i.e. UNHCR camps)
+    that can accommodate 20K people with ~40m^2 per person, which satisfies minimal standards.
+
+    Regions are numbered row by row, and so are super areas within a region and
+    areas within a super area. The offsets of every level are computed at once
+    on a grid of indices.
+
+    Parameters
+    ----------
+    n_regions : int
+        Number of regions the grid-like world should contain. Must be a square number.
+    area_spacing: float
+        Spacing between centers of areas.
+    init_lat : float
+        Initial latitude used to position the grid.
+    init_lon : float
+        Initial longitude used to position the grid.
+
+    Returns
+    -------
+    region_coords, super_area_coords, area_coords, area_super_area_region : pd.DataFrame
+        DataFrames containing coordinates and hierarchy of regions, super areas and areas.
+    """
+    if np.sqrt(n_regions) % 1 != 0:
+        raise ValueError("Number of regions must be a square number")
+    side_length = int(np.sqrt(n_regions))
+    region_size = super_areas_per_side * areas_per_side * area_spacing
+    super_area_size = areas_per_side * area_spacing
+
+    r_i, r_j = np.meshgrid(
+        np.arange(side_length), np.arange(side_length), indexing="ij"
+    )
+    r_i, r_j = r_i.ravel(), r_j.ravel()
+    region_lat, region_lon = new_lat_lon(
+        init_lat,
+        init_lon,
+        r_j * region_size + 2.5 * area_spacing,
+        r_i * region_size + 2.5 * area_spacing,
+    )
+
+    r, sa_i, sa_j = np.meshgrid(
+        np.arange(n_regions),
+        np.arange(super_areas_per_side),
+        np.arange(super_areas_per_side),
+        indexing="ij",
+    )
+    r, sa_i, sa_j = r.ravel(), sa_i.ravel(), sa_j.ravel()
+    super_area_lat, super_area_lon = new_lat_lon(
+        init_lat,
+        init_lon,
+        sa_j * super_area_size + r_j[r] * region_size + area_spacing,
+        sa_i * super_area_size + r_i[r] * region_size + area_spacing,
+    )
+
+    sa, a_i, a_j = np.meshgrid(
+        np.arange(len(r)),
+        np.arange(areas_per_side),
+        np.arange(areas_per_side),
+        indexing="ij",
+    )
+    sa, a_i, a_j = sa.ravel(), a_i.ravel(), a_j.ravel()
+    area_lat, area_lon = new_lat_lon(
+        init_lat,
+        init_lon,
+        a_j * area_spacing + sa_j[sa] * super_area_size + r_j[r[sa]] * region_size,
+        a_i * area_spacing + sa_i[sa] * super_area_size + r_i[r[sa]] * region_size,
+    )
+
+    region_names = np.char.add("r", np.arange(n_regions).astype(str))
+    super_area_names = np.char.add("sa", np.arange(len(r)).astype(str))
+    area_names = np.char.add("a", np.arange(len(sa)).astype(str))
+
+    region_coords = pd.DataFrame(
+        {"region": region_names, "latitude": region_lat, "longitude": region_lon}
+    )
+    super_area_coords = pd.DataFrame(
+        {
+            "super_area": super_area_names,
+            "latitude": super_area_lat,
+            "longitude": super_area_lon,
+        }
+    )
+    area_coords = pd.DataFrame(
+        {"area": area_names, "latitude": area_lat, "longitude": area_lon}
+    )
+    area_super_area_region = pd.DataFrame(
+        {
+            "area": area_names,
+            "super_area": super_area_names[sa],
+            "region": region_names[r[sa]],
+        }
+    )
+    for df in (region_coords, super_area_coords, area_coords, area_super_area_region):
+        for column in df.columns:
+            if df[column].dtype.kind == "U":
+                df[column] = df[column].astype(object)
+    return region_coords, super_area_coords, area_coords, area_super_area_region
+
+
+def get_gridcamp_boundary(n_areas, area_spacing, init_lat, init_lon):
+    """
+    Get latitude and longitude ranges for gridcamp.
+    """
+    length = np.sqrt(n_areas) * area_spacing  # total length of gridcamp side
+    # (init_lat,init_long) is the center of the first area, shift by -area_spacing/2 to get the lower left (ll) corner
+    ll_lat, ll_lon = new_lat_lon(
+        init_lat, init_lon, -area_spacing / 2, -area_spacing / 2
+    )
+    lat_delta = ll_lat + (length / earth_radius) * (180 / np.pi)
+    lon_delta = ll_lon + (length / earth_radius) * (180 / np.pi) / np.cos(
+        ll_lat * np.pi / 180
+    )
+    return [ll_lat, lat_delta], [ll_lon, lon_delta]
+
+
+def generate_empty_virtual_world(
+    n_regions, area_spacing=150, init_lat=0.0, init_lon=0.0
+):
+    """
+    Creates a CampWorld with the geography of a grid camp and no people.
+
+    Returns
+    -------
+    world : CampWorld
+    area_super_area_region : pd.DataFrame
+        Hierarchy of the areas, indexed by super area.
+    """
+    (
+        region_coords,
+        super_area_coords,
+        area_coords,
+        area_super_area_region,
+    ) = generate_geo_grid(
+        n_regions=n_regions,
+        area_spacing=area_spacing,
+        init_lat=init_lat,
+        init_lon=init_lon,
+    )
+
+    # set indices to use create_geographical_units (cf. june.geography)
+    area_super_area_region.set_index("super_area", inplace=True)
+    area_coords.set_index("area", inplace=True)
+    super_area_coords.set_index("super_area", inplace=True)
+
+    areas, super_areas, regions = CampGeography.create_geographical_units(
+        hierarchy=area_super_area_region,
+        area_coordinates=area_coords,
+        super_area_coordinates=super_area_coords,
+        area_socioeconomic_indices=None,
+    )
+    geography = CampGeography(areas=areas, super_areas=super_areas, regions=regions)
+
+    world = CampWorld()
+    world.areas = geography.areas
+    world.super_areas = geography.super_areas
+    world.regions = geography.regions
+    return world, area_super_area_region
+
+
+def sample_area_sizes(n_areas: int, area_n_residents_params: dict, seed: int):
+    """
+    Samples the number of residents of every area from the lognorm fitted on
+    the basecamp.
+    """
+    sizes = lognorm.rvs(
+        s=area_n_residents_params["s"],
+        loc=area_n_residents_params["loc"],
+        scale=area_n_residents_params["scale"],
+        size=n_areas,
+        random_state=seed,
+    )
+    return np.round(sizes).astype(int)
+
+
+def get_age_sampler(basecamp_population_dist_df: pd.DataFrame, seed: int):
+    """
+    Discrete distribution of the basecamp population. The first bins are for
+    female, the last bins for male (fictitious age+100).
+    """
+    upper_ages = basecamp_population_dist_df["upper_age"].values
+    xk = np.concatenate((upper_ages, upper_ages + 100))
+    pk = np.concatenate(
+        (
+            basecamp_population_dist_df["f_per"].values / 100,
+            basecamp_population_dist_df["m_per"].values / 100,
+        )
+    )
+    return rv_discrete(name="grid_populator", values=(xk, pk), seed=seed)
+
+
+def iter_area_ages(
+    areas: List[Area], area_sizes, age_sampler, chunk_size: int = 500
+) -> Iterator[Tuple[List[Area], List[np.ndarray]]]:
+    """
+    Samples the ages of the residents of chunk_size areas at a time, so the
+    whole world is never held as arrays. The draws are the same as sampling
+    area by area with the same sampler.
+
+    Yields
+    ------
+    areas, ages
+        The areas of the chunk and the sampled ages (+100 for men) of each.
+    """
+    for start in range(0, len(areas), chunk_size):
+        chunk_sizes = area_sizes[start : start + chunk_size]
+        ages = age_sampler.rvs(size=int(chunk_sizes.sum()))
+        chunk_ages = np.split(ages, np.cumsum(chunk_sizes)[:-1])
+        yield areas[start : start + chunk_size], chunk_ages
+
+
+def add_people_to_area(area: Area, ages: np.ndarray) -> List[Person]:
+    """
+    Creates the residents of an area from their sampled ages (+100 for men)
+    and adds them to it.
+    """
+    males = ages >= 100
+    people = [
+        Person(
+            id=next(Person._id),
+            sex=sex,
+            age=age,
+            area=area,
+            immunity=Immunity(),
+            subgroups=Activities(None, None, None, None, None, None),
+        )
+        for age, sex in zip(
+            np.where(males, ages - 100, ages).tolist(),
+            np.where(males, "m", "f").tolist(),
+        )
+    ]
+    area.people.extend(people)
+    return people
+
+
+def populate_virtual_world(
+    world, basecamp_population_dist_df, area_n_residents_params, seed, chunk_size=500
+):
+    """
+    Generate population for gridcamp based on age distribution and n_residents/area obtained from a basecamp.
+    Note: this currently works only with lognorm parameters and model.
+
+    Parameters
+    ----------
+    world : CampWorld
+        The gridcamp object to be populated.
+    basecamp_population_dist_df : pd.DataFrame
+        Population distribution of the basecamp (e.g., obtained with get_basecamp_age_distribution).
+    area_n_residents_params: dict
+        (lognorm) Parameters to sample areas' density (e.g., obtained with fit_basecamp_n_residents_area).
+    seed : int
+        Random seed
+    chunk_size : int
+        Number of areas whose ages are sampled at once.
+
+    Returns
+    -------
+    gridcamp_ages : dict
+        Sampled ages for each area.
+    """
+    areas = list(world.areas)
+    area_sizes = sample_area_sizes(len(areas), area_n_residents_params, seed)
+    age_sampler = get_age_sampler(basecamp_population_dist_df, seed)
+    world_ages = {}
+    people = []
+    for chunk_areas, chunk_ages in iter_area_ages(
+        areas, area_sizes, age_sampler, chunk_size=chunk_size
+    ):
+        for area, ages in zip(chunk_areas, chunk_ages):
+            world_ages[area.name] = ages
+            people += add_people_to_area(area, ages)
+    world.people = Population(people=people)
+    logger.info(f"There are {len(world.people)} people in the virtual world.")
+    return world_ages
+
+
+class BufferedSampler:
+    """
+    Hands out the draws of a scipy distribution from batches of buffer_size.
+    The household distributor draws ages and gaps one at a time, and the
+    overhead of a scipy call is much larger than the draw itself.
+    """
+
+    def __init__(self, distribution, buffer_size: int = 4096):
+        self.distribution = distribution
+        self.buffer_size = buffer_size
+        self.buffer = np.empty(0, dtype=int)
+        self.position = 0
+
+    def rvs(self, size: int = 1):
+        if self.position + size > len(self.buffer):
+            self.buffer = np.concatenate(
+                (
+                    self.buffer[self.position :],
+                    self.distribution.rvs(size=max(self.buffer_size, size)),
+                )
+            )
+            self.position = 0
+        values = self.buffer[self.position : self.position + size]
+        self.position += size
+        return values
+
+
+class VirtualHouseholdDistributor:
+    """
+    Distributes the residents of an area to households, according to the
+    average family size distribution of a basecamp. CampHouseholdDistributor
+    uses the size distribution from the histogram of basecamp data and
+    n_families for each area is len(area.people)/(basecamp average family size).
+
+    The family composition generators do not depend on the area, so they are
+    built once here rather than for every area, and sampled in batches.
+    """
+
+    # default parameters for family composition
+    mother_firstchild_gap_mean = 22
+    mother_firstchild_gap_STD = 8
+    partner_age_gap_mean = 0
+    partner_age_gap_mean_STD = 10
+    chance_single_parent = 0.179
+    chance_multigenerational = 0.268
+    chance_withchildren = 0.922
+    n_children = 2.5
+    n_children_STD = 2
+
+    def __init__(self, basecamp_famsize_dict, basecamp_famsize_avg, max_hh_size=12):
+        self.famsize_avg = basecamp_famsize_avg
+        distributor_class = camp_household_distributor.CampHouseholdDistributor
+        self.household_distributor = distributor_class(
+            kid_max_age=17,
+            adult_min_age=17,
+            adult_max_age=99,
+            young_adult_max_age=49,
+            max_household_size=max_hh_size,
+            household_size_distribution=basecamp_famsize_dict,
+            chance_unaccompanied_children=0.01,
+            min_age_gap_between_children=1,
+            chance_single_parent_mf={"m": 1, "f": 10},
+            ignore_orphans=False,
+        )
+        mother_firstchild_gap_generator, _ = GenerateDiscretePDF(
+            datarange=[14, 60],
+            Mean=self.mother_firstchild_gap_mean + 0.5 + (9.0 / 12.0),
+            SD=self.mother_firstchild_gap_STD,
+        )
+        partner_age_gap_generator, _ = GenerateDiscretePDF(
+            datarange=[-20, 20],
+            Mean=self.partner_age_gap_mean + 0.5,
+            SD=self.partner_age_gap_mean_STD,
+            stretch=True,
+        )
+        nchildren_generator, _ = GenerateDiscretePDF(
+            datarange=[0, 8], Mean=self.n_children, SD=self.n_children_STD
+        )
+        self.mother_firstchild_gap_generator = BufferedSampler(
+            mother_firstchild_gap_generator
+        )
+        self.partner_age_gap_generator = BufferedSampler(partner_age_gap_generator)
+        self.nchildren_generator = BufferedSampler(nchildren_generator)
+
+    def distribute_people_to_households(self, area: Area):
+        n_residents = len(area.people)
+        if n_residents < self.famsize_avg:
+            n_families = 1
+            logger.info(
+                f"Area {area.name} has {n_residents} residents "
+                f"(< {self.famsize_avg} avg). Set n_families = 1."
+            )
+        else:
+            n_families = int(n_residents / self.famsize_avg)
+        distributor = self.household_distributor
+        area.households = distributor.distribute_people_to_households(
+            area=area,
+            n_families=n_families,
+            n_families_wchildren=int(np.round(self.chance_withchildren * n_families)),
+            n_families_multigen=int(
+                np.round(self.chance_multigenerational * n_families)
+            ),
+            n_families_singleparent=int(
+                np.round(self.chance_single_parent * n_families)
+            ),
+            partner_age_gap_generator=self.partner_age_gap_generator,
+            mother_firstchild_gap_generator=self.mother_firstchild_gap_generator,
+            nchildren_generator=self.nchildren_generator,
+        )
+        return area.households
+
+
+def distribute_virtual_people_to_households(
+    world, basecamp_famsize_dict, basecamp_famsize_avg, max_hh_size=12
+):
+    """
+    Distribute people to households in the world, according to average family size distribution of a basecamp.
+
+    Parameters
+    ---------
+    world : CampWorld
+        The gridcamp object where households should be distributed (Population should be already defined).
+    basecamp_famsize_dict : dict
+        Dictionary describing family size distribution, up to max_hh_size.
+    basecamp_famsize_avg : float
+        Average family size from basecamp data.
+    max_hh_size : int, default=12
+        Maximum size allowed for households.
+    """
+    distributor = VirtualHouseholdDistributor(
+        basecamp_famsize_dict, basecamp_famsize_avg, max_hh_size=max_hh_size
+    )
+    households_total = []
+    for area in world.areas:
+        households_total += distributor.distribute_people_to_households(area)
+    world.households = Households(households_total)
+    logger.info(
+        f"{len(world.households)} households have been added to the virtual world."
+    )
+
+
+def generate_virtual_world(
+    n_regions: int,
+    distributions: Optional[dict] = None,
+    seed: int = 999,
+    area_spacing: float = 150,
+    init_lat: float = 0.0,
+    init_lon: float = 0.0,
+    max_hh_size: int = 12,
+    chunk_size: int = 500,
+):
+    """
+    Builds the geography, population and households of a grid camp in one
+    pass. Areas are processed chunk_size at a time: the residents of a chunk
+    are created and put into households before the ages of the next chunk are
+    sampled, so only the finished people and households accumulate.
+
+    The people are the same as the ones of populate_virtual_world with the
+    same seed, as the sampler draws in the same order.
+
+    Parameters
+    ----------
+    n_regions : int
+        Number of regions, must be a square number.
+    distributions : dict, optional
+        Basecamp distributions, as returned by load_basecamp_distributions.
+        Read from camp_test_data when not given.
+    seed : int
+        Random seed for the area sizes and the ages.
+    chunk_size : int
+        Number of areas built at once.
+
+    Returns
+    -------
+    world : CampWorld
+    area_super_area_region : pd.DataFrame
+        Hierarchy of the areas, indexed by super area.
+    """
+    if distributions is None:
+        distributions = load_basecamp_distributions()
+    world, area_super_area_region = generate_empty_virtual_world(
+        n_regions, area_spacing=area_spacing, init_lat=init_lat, init_lon=init_lon
+    )
+    areas = list(world.areas)
+    area_sizes = sample_area_sizes(
+        len(areas), distributions["n_residents_params"], seed
+    )
+    age_sampler = get_age_sampler(distributions["population_dist_df"], seed)
+    household_distributor = VirtualHouseholdDistributor(
+        distributions["famsize_dict"], distributions["famsize_avg"], max_hh_size
+    )
+    people, households = [], []
+    for chunk_areas, chunk_ages in iter_area_ages(
+        areas, area_sizes, age_sampler, chunk_size=chunk_size
+    ):
+        for area, ages in zip(chunk_areas, chunk_ages):
+            people += add_people_to_area(area, ages)
+            households += household_distributor.distribute_people_to_households(area)
+    world.people = Population(people=people)
+    world.households = Households(households)
+    logger.info(
+        f"Built a grid camp of {n_regions} regions with {len(world.people)} people "
+        f"in {len(world.households)} households."
+    )
+    return world, area_super_area_region
+
+
+def uniformly_sample_locations(coords_ranges, n_venues):
+    """
+    Uniformly sample n_venues geo-locations within given boundary.
+    """
+    xy_min = [coords_ranges[0][0], coords_ranges[1][0]]
+    xy_max = [coords_ranges[0][1], coords_ranges[1][1]]
+    return np.random.uniform(low=xy_min, high=xy_max, size=(n_venues, 2))
@@ -16,15 +16,7 @@ See the GNU General Public License for more details.
 
 import pytest
 import numpy as np
-import numba as nb
-import pandas as pd
-import random
-from scipy.stats import lognorm, rv_discrete
-from collections import defaultdict
 from datetime import datetime
-import os
-import pickle
-import json
 
 from june.demography import Person, Population
 from june.groups import Household, Households, Hospital, Hospitals, Cemeteries
@@ -36,8 +28,6 @@ from june.interaction import Interaction
 from june.policy import Hospitalisation, MedicalCarePolicies, Policies
 from june.simulator import Simulator
 
-from camps.geography import CampGeography
-from camps.world import CampWorld
 from camps.activity import CampActivityManager
 from camps.groups.leisure import generate_leisure_for_world, generate_leisure_for_config
 from camps.paths import camp_data_path, camp_configs_path
@@ -47,7 +37,6 @@ from camps.camp_creation import (
     distribute_people_to_households,
     GenerateDiscretePDF
 )
-from camps.distributors import camp_household_distributor
 from camps.groups import PumpLatrines, PumpLatrineDistributor
 from camps.groups import DistributionCenters, DistributionCenterDistributor
 from camps.groups import Communals, CommunalDistributor
@@ -62,390 +51,28 @@ from camps.groups import EVouchers, EVoucherDistributor
 from camps.groups import NFDistributionCenters, NFDistributionCenterDistributor
 from camps.groups import SheltersVisitsDistributor
 from camps.groups import InformalWorks, InformalWorkDistributor
+from camps.synthetic import (
+    load_basecamp_distributions,
+    get_gridcamp_boundary,
+    generate_empty_virtual_world,
+    populate_virtual_world,
+    distribute_virtual_people_to_households,
+    uniformly_sample_locations,
+    coords_venues_types,
+    venues_per_capita,
+)
 
 config_file_path = camp_configs_path / "config_demo.yaml"
 interactions_file_path = camp_configs_path / "defaults/interaction/interaction_Survey.yaml"
 policies_file_path = camp_configs_path / "defaults/policy/simple_policy.yaml"
 
 # read synthetic input data
-syn_data_path = "./camp_test_data"
-basecamp_population_dist_df = pickle.load(open(os.path.join(syn_data_path, "basecamp_population_dist_df.pkl"), 'rb'))
-area_n_residents_params = pickle.load(open(os.path.join(syn_data_path, "basecamp_residents_area_fit_params.pkl"), 'rb'))
-with open(os.path.join(syn_data_path, "basecamp_famsize.pkl"), 'rb') as f:
-    basecamp_famsize_dict = pickle.load(f)
-    basecamp_famsize_avg = pickle.load(f)
-with open(os.path.join(syn_data_path, "basecamp_flat_enrollment_rates.json")) as f:
-    flat_enrollment_rates = json.load(f)
-
-# venues to be assigned from coordinates and relative per-capita baseline parameters
-coords_venues_types = ['distribution_centers', 'n_f_distribution_centers', 'e_vouchers',
-                       'communals', 'female_communals', 'religiouss', 'learning_centers', 'hospitals']
-venues_per_capita = {
-    'pump_latrines': 1/50,              # from unhcr/sphere -- not used here
-    'play_groups': 1/20,                # on kids_population, from unhcr/sphere -- not used here
-    'distribution_centers': 1/20000,    # from unhcr/sphere
-    'n_f_distribution_centers': 1/20000,
-    'e_vouchers': 1/20000,
-    'communals': 1/5000,
-    'female_communals': 1/5000,
-    'religiouss': 1/500,
-    'learning_centers': 1/500,          # on kids_population
-    'hospitals': 1/20000
-}
-
-earth_radius = 6371000.  # meters
-
-
-def set_random_seed(seed=999):
-    """
-    Sets global seeds for testing in numpy, random, and numbaized numpy.
-    """
-
-    @nb.njit(cache=True)
-    def set_seed_numba(seed):
-        random.seed(seed)
-        return np.random.seed(seed)
-
-    np.random.seed(seed)
-    set_seed_numba(seed)
-    random.seed(seed)
-    return
-
-
-def new_lat_lon(lat, lon, d_lat, d_lon):
-    new_lat = lat + (d_lat / earth_radius) * (180 / np.pi)
-    new_lon = lon + (d_lon / earth_radius) * (180 / np.pi) / np.cos(lat * np.pi/180)
-    return new_lat, new_lon
-
-
-def generate_geo_grid(n_regions, area_spacing=150, init_lat=0.0, init_lon=0.0):
-    """
-    Generate geographical location for a grid-like world.
-    Every region is divided into 4 super areas of 9 areas each (total n_areas = 4*9*n_regions).
-    With this geography of 4*9 areas in each region, an area_spacing of 150m allows to get regions (i.e. UNHCR camps)
-    that can accommodate 20K people with ~40m^2 per person, which satisfies minimal standards.
-
-    Parameters
-    ----------
-    n_regions : int
-        Number of regions the grid-like world should contain. Must be a square number.
-    area_spacing: float
-        Spacing between centers of areas.
-    init_lat : float
-        Initial latitude used to position the grid.
-    init_lon : float
-        Initial longitude used to position the grid.
-
-    Returns
-    -------
-    region_coords, super_area_coords, area_coords, area_super_area_region : pd.DataFrame
-        DataFrames containing coordinates and hierarchy of regions, super areas and areas.
-    """
-
-    if np.sqrt(n_regions) % 1 != 0:
-        raise ValueError("Number of regions must be a square number")
-    else:
-        side_length = int(np.sqrt(n_regions))
-
-    n_super_areas = n_regions * 4
-    n_areas = n_super_areas * 9
-
-    region_names = []
-    region_lat = []
-    region_lon = []
-
-    super_area_names = []
-    super_area_lat = []
-    super_area_lon = []
-
-    area_names = []
-    super_area_hierarchy = []
-    region_hierarchy = []
-    area_lat = []
-    area_lon = []
-
-    region_number = 0
-    super_area_number = 0
-    area_number = 0
-
-    for r_i in range(side_length):
-        for r_j in range(side_length):
-            new_lat, new_lon = new_lat_lon(
-                init_lat,
-                init_lon,
-                (r_j * 6 * area_spacing) + 2.5 * area_spacing,
-                (r_i * 6 * area_spacing) + 2.5 * area_spacing
-            )
-            region_names.append("r{}".format(region_number))
-            region_lat.append(new_lat)
-            region_lon.append(new_lon)
-            for sa_i in range(2):
-                for sa_j in range(2):
-                    new_lat, new_lon = new_lat_lon(
-                        init_lat,
-                        init_lon,
-                        (sa_j * 3 * area_spacing) + (r_j * 6 * area_spacing) + area_spacing,
-                        (sa_i * 3 * area_spacing) + (r_i * 6 * area_spacing) + area_spacing
-                    )
-                    super_area_names.append("sa{}".format(super_area_number))
-                    super_area_lat.append(new_lat)
-                    super_area_lon.append(new_lon)
-                    for a_i in range(3):
-                        for a_j in range(3):
-                            new_lat, new_lon = new_lat_lon(
-                                init_lat,
-                                init_lon,
-                                (a_j * area_spacing) + (sa_j * 3 * area_spacing) + (r_j * 6 * area_spacing),
-                                (a_i * area_spacing) + (sa_i * 3 * area_spacing) + (r_i * 6 * area_spacing)
-                            )
-                            area_names.append("a{}".format(area_number))
-                            area_number += 1
-                            super_area_hierarchy.append("sa{}".format(super_area_number))
-                            region_hierarchy.append("r{}".format(region_number))
-                            area_lat.append(new_lat)
-                            area_lon.append(new_lon)
-                    super_area_number += 1
-            region_number += 1
-
-    region_coords = pd.DataFrame(
-        {
-            "region": region_names,
-            "latitude": region_lat,
-            "longitude": region_lon
-        }
-    )
-    super_area_coords = pd.DataFrame(
-        {
-            "super_area": super_area_names,
-            "latitude": super_area_lat,
-            "longitude": super_area_lon
-        }
-    )
-    area_coords = pd.DataFrame(
-        {
-            "area": area_names,
-            "latitude": area_lat,
-            "longitude": area_lon
-        }
-    )
-    area_super_area_region = pd.DataFrame(
-        {
-            "area": area_names,
-            "super_area": super_area_hierarchy,
-            "region": region_hierarchy
-        }
-    )
-    return region_coords, super_area_coords, area_coords, area_super_area_region
-
-
-def get_gridcamp_boundary(n_areas, area_spacing, init_lat, init_lon):
-    """
-    Get latitude and longitude ranges for gridcamp.
-    """
-    length = np.sqrt(n_areas) * area_spacing  # total length of gridcamp side
-    # (init_lat,init_long) is the center of the first area, shift by -area_spacing/2 to get the lower left (ll) corner
-    ll_lat, ll_lon = new_lat_lon(init_lat, init_lon, -area_spacing/2, -area_spacing/2)
-    lat_delta = ll_lat + (length / earth_radius) * (180 / np.pi)
-    lon_delta = ll_lon + (length / earth_radius) * (180 / np.pi) / np.cos(ll_lat * np.pi / 180)
-    return [ll_lat, lat_delta], [ll_lon, lon_delta]
-
-
-def generate_empty_virtual_world(n_regions, area_spacing=150, init_lat=0.0, init_lon=0.0):
-    # generate a geo grid with nregions
-    region_coords, super_area_coords, area_coords, area_super_area_region = generate_geo_grid(
-        n_regions=n_regions,
-        area_spacing=area_spacing,
-        init_lat=init_lat,
-        init_lon=init_lon
-    )
-
-    # set indices to use create_geographical_units (cf. june.geography)
-    area_super_area_region.set_index("super_area", inplace=True)
-    area_coords.set_index("area", inplace=True)
-    super_area_coords.set_index("super_area", inplace=True)
-
-    # use the defined geographical units to instantiate CampGeography
-    areas, super_areas, regions = CampGeography.create_geographical_units(
-        hierarchy=area_super_area_region,
-        area_coordinates=area_coords,
-        super_area_coordinates=super_area_coords,
-        area_socioeconomic_indices=None,
-    )
-    geography = CampGeography(
-        areas=areas,
-        super_areas=super_areas,
-        regions=regions
-    )
-
-    # instantiate a virtual CampWorld
-    world = CampWorld()
-    world.areas = geography.areas
-    world.super_areas = geography.super_areas
-    world.regions = geography.regions
-    return world, area_super_area_region
-
-
-def populate_virtual_world(world, basecamp_population_dist_df, area_n_residents_params, seed):
-    """
-    Generate population for gridcamp based on age distribution and n_residents/area obtained from a basecamp.
-    Note: this currently works only with lognorm parameters and model.
-
-    Parameters
-    ----------
-    world : CampWorld
-        The gridcamp object to be populated.
-    basecamp_population_dist_df : pd.DataFrame
-        Population distribution of the basecamp (e.g., obtained with get_basecamp_age_distribution).
-    area_n_residents_params: dict
-        (lognorm) Parameters to sample areas' density (e.g., obtained with fit_basecamp_n_residents_area).
-    seed : int
-        Random seed
-
-    Returns
-    -------
-    gridcamp_ages : dict
-        Sampled ages for each area.
-    """
-    # generate gridcamp areas' n_residents
-    grid_area_sizes = list(map(int, np.round(
-        lognorm.rvs(
-            s=area_n_residents_params['s'],
-            loc=area_n_residents_params['loc'],
-            scale=area_n_residents_params['scale'],
-            size=len(world.areas),
-            random_state=seed
-        ))))
-
-    # organize values and probabilities for population ages from basecamp distribution
-    # the first bins are for female, the last bins for male (fictitious age+100)
-    xk = np.concatenate((basecamp_population_dist_df['upper_age'].values, basecamp_population_dist_df['upper_age'].values + 100))
-    pk = np.concatenate((basecamp_population_dist_df['f_per'].values / 100, basecamp_population_dist_df['m_per'].values / 100))
-    grid_populator = rv_discrete(name='grid_populator', values=(xk, pk), seed=seed)
-
-    world_ages = {}
-    people = []
-    # generate people from basecamp distribution respecting the sampled area size (sampled with lognorm)
-    print("Populating by areas...")
-    for area, size in zip(world.areas, grid_area_sizes):
-        grid_area_ages = grid_populator.rvs(size=size)
-        world_ages[area.name] = grid_area_ages
-        for i in range(size):
-            if grid_area_ages[i] >= 100:  # male
-                person = Person.from_attributes(
-                    age=grid_area_ages[i]-100,
-                    sex="m",
-                )
-                area.add(person)
-                people.append(person)
-            else:  # female
-                person = Person.from_attributes(
-                    age=grid_area_ages[i],
-                    sex="f",
-                )
-                area.add(person)
-                people.append(person)
-
-    world.people = Population(people=people)
-    print(f"There are {len(world.people)} people in the virtual world.")
-
-    return world_ages
-
-
-def distribute_virtual_people_to_households(world, basecamp_famsize_dict, basecamp_famsize_avg, max_hh_size=12):
-    """
-    Distribute people to households in the world, according to average family size distribution of a basecamp.
-    CampHouseholdDistributor uses average size distribution from histogram of basecamp data;
-    n_families for each area is determined as len(area.people)/(basecamp average family size).
-
-    Parameters
-    ---------
-    world : CampWorld
-        The gridcamp object where households should be distributed (Population should be already defined).
-    basecamp_famsize_dict : dict
-        Dictionary describing family size distribution, up to max_hh_size.
-    basecamp_famsize_avg : float
-        Average family size from basecamp data.
-    max_hh_size : int, default=12
-        Maximum size allowed for households.
-    """
-    # instantiate refined household distributor
-    household_distributor = camp_household_distributor.CampHouseholdDistributor(
-        kid_max_age=17,
-        adult_min_age=17,
-        adult_max_age=99,
-        young_adult_max_age=49,
-        max_household_size=max_hh_size,
-        household_size_distribution=basecamp_famsize_dict,
-        chance_unaccompanied_children=0.01,
-        min_age_gap_between_children=1,
-        chance_single_parent_mf={"m": 1, "f": 10},
-        ignore_orphans=False
-    )
-    # distribute people area by area
-    households_total = []
-    print("Distributing households by areas...")
-    for area in world.areas:
-        n_residents = len(area.people)
-        if n_residents < basecamp_famsize_avg:
-            n_families = 1
-            print(f"\tArea {area.name} has {n_residents} residents (< {basecamp_famsize_avg} avg). Set n_families "
-                  f"= 1.")
-        else:
-            n_families = int(n_residents / basecamp_famsize_avg)
-
-        # default parameters for family composition
-        mother_firstchild_gap_mean = 22
-        mother_firstchild_gap_STD = 8
-        partner_age_gap_mean = 0
-        partner_age_gap_mean_STD = 10
-        chance_single_parent = 0.179
-        chance_multigenerational = 0.268
-        chance_withchildren = 0.922
-        n_children = 2.5
-        n_children_STD = 2
-        stretch = True
-
-        mother_firstchild_gap_generator, dist = GenerateDiscretePDF(
-            datarange=[14, 60],
-            Mean=mother_firstchild_gap_mean + 0.5 + (9.0 / 12.0),
-            SD=mother_firstchild_gap_STD
-        )
-        partner_age_gap_generator, dist = GenerateDiscretePDF(
-            datarange=[-20, 20],
-            Mean=partner_age_gap_mean + 0.5,
-            SD=partner_age_gap_mean_STD,
-            stretch=stretch
-        )
-        nchildren_generator, dist = GenerateDiscretePDF(
-            datarange=[0, 8],
-            Mean=n_children,
-            SD=n_children_STD,
-        )
-
-        area.households = household_distributor.distribute_people_to_households(
-            area=area,
-            n_families=n_families,
-            n_families_wchildren=int(np.round(chance_withchildren * n_families)),
-            n_families_multigen=int(np.round(chance_multigenerational * n_families)),
-            n_families_singleparent=int(np.round(chance_single_parent * n_families)),
-            partner_age_gap_generator=partner_age_gap_generator,
-            mother_firstchild_gap_generator=mother_firstchild_gap_generator,
-            nchildren_generator=nchildren_generator,
-        )
-        households_total += area.households
-    world.households = Households(households_total)
-    print(f"{len(world.households)} households have been added to the virtual world.")
-    return
-
-
-def uniformly_sample_locations(coords_ranges, n_venues):
-    """
-    Uniformly sample n_venues geo-locations within given boundary.
-    """
-    xy_min = [coords_ranges[0][0], coords_ranges[1][0]]
-    xy_max = [coords_ranges[0][1], coords_ranges[1][1]]
-    selected_coords = np.random.uniform(low=xy_min, high=xy_max, size=(n_venues, 2))
-    return selected_coords
+basecamp_distributions = load_basecamp_distributions()
+basecamp_population_dist_df = basecamp_distributions["population_dist_df"]
+area_n_residents_params = basecamp_distributions["n_residents_params"]
+basecamp_famsize_dict = basecamp_distributions["famsize_dict"]
+basecamp_famsize_avg = basecamp_distributions["famsize_avg"]
+flat_enrollment_rates = basecamp_distributions["flat_enrollment_rates"]
 
 
 @pytest.fixture(name="camps_world", scope="module")
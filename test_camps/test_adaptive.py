@@ -0,0 +1,180 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import ParameterGrid
+
+from camps.adaptive import AdaptiveSweepPlanner, GridEncoder
+from camps.results import SweepResultStore
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "camp_scripts/runner_scripts"))
+from create_scripts import ClusterRunner  # noqa: E402
+
+
+@pytest.fixture(name="grid")
+def make_grid():
+    grid = list(
+        ParameterGrid(
+            {
+                "mask_wearing": [True],
+                "mask_compliance": [0.1, 0.25, 0.5, 0.75, 1.0],
+                "mask_beta_factor": list(np.linspace(0.1, 0.9, 9)),
+                "infectiousness_path": ["nature", "nature_lower"],
+            }
+        )
+    )
+    grid += list(
+        ParameterGrid(
+            {
+                "mask_wearing": [False],
+                "mask_compliance": [0],
+                "mask_beta_factor": [0],
+                "infectiousness_path": ["nature", "nature_lower"],
+            }
+        )
+    )
+    for parameters in grid:
+        parameters["household_beta"] = 0.2
+    return grid
+
+
+class SubmittingBackend:
+    """
+    Backend that, like SLURM, returns before the runs it is given have
+    finished.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self.submitted = []
+
+    def run(self, runner, indices=None):
+        self.submitted.append(list(indices))
+
+
+def peak_infections(parameters):
+    scale = {"nature": 1000, "nature_lower": 700}[parameters["infectiousness_path"]]
+    reduction = parameters["mask_compliance"] * (1 - parameters["mask_beta_factor"])
+    return scale * (1 - reduction) ** 2
+
+
+def test__encoder(grid):
+    encoder = GridEncoder(grid)
+    assert list(encoder.numerical) == [
+        "mask_beta_factor",
+        "mask_compliance",
+        "mask_wearing",
+    ]
+    assert encoder.columns[3:] == [
+        "infectiousness_path='nature'",
+        "infectiousness_path='nature_lower'",
+    ]
+    points = encoder.encode(grid)
+    assert points.shape == (len(grid), 5)
+    assert points.min() == 0 and points.max() == 1
+    assert (points[:, 3:].sum(axis=1) == 1).all()
+
+
+@pytest.mark.parametrize("sampler", ["lhs", "sobol"])
+def test__initial_design(grid, sampler):
+    planner = AdaptiveSweepPlanner(grid, n_initial=12, sampler=sampler)
+    batch = planner.propose({})
+    assert len(batch) == len(set(batch)) == 12
+    assert batch == planner.propose({})
+    # every infectiousness path is covered
+    assert {grid[index]["infectiousness_path"] for index in batch} == {
+        "nature",
+        "nature_lower",
+    }
+
+
+def test__batches_do_not_repeat_runs(grid):
+    planner = AdaptiveSweepPlanner(grid, batch_size=6)
+    scheduled = planner.propose({})
+    observations = {index: peak_infections(grid[index]) for index in scheduled}
+    batch = planner.propose(observations, scheduled)
+    assert len(batch) == 6
+    assert not set(batch) & set(scheduled)
+    # too few results for a surrogate, the batch fills the space
+    assert len(planner.propose({0: 1.0}, [0, 1])) == 6
+
+
+def test__converges_with_part_of_the_grid(grid):
+    planner = AdaptiveSweepPlanner(grid, batch_size=6)
+    scheduled, observations = [], {}
+    while True:
+        batch = planner.propose(observations, scheduled)
+        if not batch:
+            break
+        scheduled += batch
+        for index in batch:
+            observations[index] = peak_infections(grid[index])
+    assert len(observations) < len(grid)
+    prediction = planner.predict(observations)
+    truth = np.array([peak_infections(parameters) for parameters in grid])
+    error = np.abs(prediction["mean_peak_infections"] - truth)
+    assert error.mean() < 0.02 * truth.mean()
+    assert prediction["peak_infections"].notna().sum() == len(observations)
+
+
+def test__observations_from_store(grid, tmp_path):
+    store = SweepResultStore(tmp_path / "results.sqlite")
+    planner = AdaptiveSweepPlanner(grid)
+    assert planner.get_observations(store) == {}
+    daily = pd.DataFrame(
+        {"current_infected": [1.0, 10.0, 2.0], "daily_infected": [1.0, 9.0, 0.0]},
+        index=pd.date_range("2020-05-01", periods=3),
+    )
+    store.add_run(3, grid[3], daily)
+    assert planner.get_observations(store) == {3: 10.0}
+    store.close()
+
+
+def add_results(output_dir, grid, indices):
+    store = SweepResultStore(output_dir / "results.sqlite")
+    for index in indices:
+        peak = peak_infections(grid[index])
+        daily = pd.DataFrame(
+            {"current_infected": [1.0, peak, 2.0], "daily_infected": [1.0, peak, 0.0]},
+            index=pd.date_range("2020-05-01", periods=3),
+        )
+        store.add_run(index, grid[index], daily)
+    store.close()
+
+
+def test__no_new_batch_without_results(grid, tmp_path):
+    runner = ClusterRunner(grid, tmp_path / "sweep")
+    planner = AdaptiveSweepPlanner(grid, n_initial=6, batch_size=4)
+    backend = SubmittingBackend()
+    first = runner.run_adaptive(backend, planner)[0]
+    assert backend.submitted == [first]
+    # the first batch has not finished, nothing new is planned
+    assert runner.run_adaptive(backend, planner) == [first]
+    add_results(runner.output_dir, grid, first[:3])
+    assert runner.run_adaptive(backend, planner) == [first]
+    assert len(backend.submitted) == 1
+    batches = runner.run_adaptive(backend, planner, plan_ahead=True)
+    assert len(batches) == 2 and len(batches[1]) == 4
+    add_results(runner.output_dir, grid, first[3:] + batches[1])
+    batches = runner.run_adaptive(backend, planner)
+    assert len(batches) == 3
+    assert backend.submitted == batches
@@ -0,0 +1,169 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import sys
+import shlex
+from pathlib import Path
+
+from camps.results import SweepResultStore
+from camps.sweep import SweepExecutor
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "camp_scripts"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "camp_scripts/runner_scripts"))
+import full_run_parse  # noqa: E402
+from backends import JobLedger, LocalBackend, get_in_process_key  # noqa: E402
+from create_scripts import ClusterRunner, get_script_parameters  # noqa: E402
+
+# writes the start and end times of the job to a log, then exits with a code
+job_code = (
+    "import os, sys, time; "
+    "log = open(sys.argv[1], 'a'); "
+    "log.write(f'{time.time()}\\n'); log.flush(); "
+    "time.sleep(0.2); "
+    "log.write(f'{time.time()}\\n'); log.close(); "
+    "code = int(sys.argv[2]); "
+    "os.kill(os.getpid(), -code) if code < 0 else sys.exit(code)"
+)
+
+
+class JobRunner:
+    def __init__(self, output_dir, exit_codes):
+        self.output_dir = output_dir
+        self.exit_codes = exit_codes
+        self.parameter_grid = [{} for _ in exit_codes]
+
+    def get_log(self, index):
+        return self.output_dir / f"job_{index}.log"
+
+    def get_command(self, index):
+        return shlex.join(
+            [
+                sys.executable,
+                "-c",
+                job_code,
+                str(self.get_log(index)),
+                str(self.exit_codes[index]),
+            ]
+        )
+
+    def get_long_parameter_grid(self):
+        return [
+            {"save_path": self.output_dir / f"run_{index:03d}"}
+            for index in range(len(self.exit_codes))
+        ]
+
+
+def make_backend(**kwargs):
+    return LocalBackend(
+        cores=1,
+        memory_limit_mb=150,
+        memory_per_run_mb=100,
+        poll_interval=0.05,
+        **kwargs,
+    )
+
+
+def test__ledger_keeps_last_state(tmp_path):
+    ledger = JobLedger(tmp_path / "ledger.jsonl")
+    ledger.record(0, "running", command="a")
+    ledger.record(0, "done", command="a", peak_rss_mb=10.0)
+    ledger.record(1, "done", command="b", peak_rss_mb=30.0)
+    with open(ledger.path, "a") as f:
+        f.write('{"index": 2, "sta')
+    ledger = JobLedger(tmp_path / "ledger.jsonl")
+    assert set(ledger.jobs) == {0, 1}
+    assert ledger.is_done(0, "a")
+    assert not ledger.is_done(0, "changed command")
+    assert ledger.peak_rss_mb() == 30.0
+
+
+def test__local_backend_resumes_from_ledger(tmp_path):
+    runner = JobRunner(tmp_path, exit_codes=[0, 0, 0, 3, -9])
+    ledger = JobLedger(tmp_path / "ledger.jsonl")
+    ledger.record(0, "done", command=runner.get_command(0))
+    ledger.record(1, "failed", command=runner.get_command(1), returncode=1)
+    make_backend().run(runner)
+
+    assert not runner.get_log(0).exists()
+    assert all(runner.get_log(index).exists() for index in range(1, 5))
+    ledger = JobLedger(tmp_path / "ledger.jsonl")
+    assert [ledger.jobs[index]["status"] for index in range(5)] == [
+        "done",
+        "done",
+        "done",
+        "failed",
+        "failed",
+    ]
+    assert ledger.jobs[3]["returncode"] == 3
+    assert ledger.jobs[4]["returncode"] == -9
+    # runs without a summary are left out of the results
+    results = SweepResultStore(tmp_path / "results.sqlite")
+    assert results.get_runs().empty
+    results.close()
+
+
+def test__in_process_runs_are_not_done_for_other_backends(tmp_path):
+    runner = JobRunner(tmp_path, exit_codes=[0, 0])
+    parameters = runner.get_long_parameter_grid()
+    key = get_in_process_key(parameters[0])
+    assert key == get_in_process_key(dict(parameters[0]))
+    assert key != get_in_process_key(parameters[1])
+    ledger = JobLedger(tmp_path / "ledger.jsonl")
+    ledger.record(0, "done", command=key)
+    ledger.record(1, "done", command=runner.get_command(1))
+    make_backend().run(runner)
+    assert runner.get_log(0).exists()
+    assert not runner.get_log(1).exists()
+    assert JobLedger(tmp_path / "ledger.jsonl").is_done(0, runner.get_command(0))
+
+
+def test__local_backend_limits_concurrent_jobs(tmp_path):
+    runner = JobRunner(tmp_path, exit_codes=[0, 0, 0])
+    make_backend().run(runner)
+    spans = sorted(
+        tuple(map(float, runner.get_log(index).read_text().split()))
+        for index in range(3)
+    )
+    assert len(spans) == 3
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert end <= start
+
+
+def test__max_concurrent_jobs():
+    backend = LocalBackend(cores=[0, 1, 2, 3], cores_per_run=2, memory_limit_mb=250)
+    assert backend.get_max_concurrent(None) == 1
+    assert backend.get_max_concurrent(100) == 2
+    assert backend.get_max_concurrent(200) == 1
+    assert backend.get_max_concurrent(10) == 2
+
+
+def test__in_process_parameters_match_the_script(tmp_path):
+    runner = ClusterRunner(
+        [{"hb": 0.3, "isolation_units": True, "mask_compliance": 0.5}],
+        tmp_path / "sweep",
+    )
+    executor = SweepExecutor(
+        runner.get_long_parameter_grid(),
+        runner.output_dir,
+        base_parameters=get_script_parameters(),
+    )
+    script_parameters = full_run_parse.get_script_parameters(
+        shlex.split(runner.script_flags[0])
+    )
+    # the script reads every value as a string
+    assert {
+        name: str(value) for name, value in executor.get_parameters(0).items()
+    } == {name: str(value) for name, value in script_parameters.items()}
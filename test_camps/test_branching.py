@@ -0,0 +1,232 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from june.epidemiology.epidemiology import Epidemiology
+from june.time import Timer
+
+from camps.branching import (
+    ScenarioBrancher,
+    apply_policy_set,
+    scenarios_from_policy_files,
+)
+from camps.checkpoint import get_random_states, set_random_states
+from camps.groups import IsolationUnit, IsolationUnits
+from camps.pipeline import (
+    RunPipeline,
+    Stage,
+    get_policies,
+    parse_parameters,
+    set_random_seed,
+)
+from camps.policy import Isolation
+from camps.records import CampRecord
+from camps.simulator import CampSimulator
+
+branch_date = datetime(2020, 6, 1)
+
+
+class WalkRecord(CampRecord):
+    def parameters(self, **kwargs):
+        pass
+
+
+class WalkSimulator(CampSimulator):
+    """
+    Simulator whose time steps write random draws to the records, whatever
+    its policies.
+    """
+
+    def __init__(self, record, policies):
+        self.timer = Timer(initial_day="2020-05-01", total_days=10)
+        self.record = record
+        self.world = SimpleNamespace(isolation_units=None)
+        self.activity_manager = SimpleNamespace(policies=policies)
+        self.epidemiology = self.interaction = None
+        self.checkpoint_save_dates = []
+        self.checkpointer = self.early_stopping = self.stopped_early = None
+        self.started = False
+        self.walk = 0.0
+
+    def clear_world(self):
+        pass
+
+    def do_timestep(self):
+        self.walk += np.random.random() + random.random()
+        with open(self.record.record_path / "walk.csv", "a") as f:
+            f.write(f"{self.timer.date},{self.walk!r}\n")
+
+
+class WalkBrancher(ScenarioBrancher):
+    def simulate_prefix(self, profiler):
+        set_random_seed(5)
+        record = WalkRecord(record_path=self.output_dir / "prefix")
+        simulator = WalkSimulator(record, get_policies(self.parameters))
+        branch_date = self.get_branch_date(simulator)
+        simulator.run(until=branch_date)
+        return {}, simulator, branch_date, None
+
+
+@pytest.fixture(autouse=True)
+def keep_random_states():
+    # tests further on draw from the generators seeded by conftest
+    states = get_random_states()
+    yield
+    set_random_states(states)
+
+
+def get_scenario_policies(name):
+    scenario = scenarios_from_policy_files([name])[name]
+    return get_policies(parse_parameters(scenario))
+
+
+def make_simulator(isolation_units=None):
+    return SimpleNamespace(
+        world=SimpleNamespace(isolation_units=isolation_units),
+        activity_manager=SimpleNamespace(
+            policies=get_scenario_policies("simple_policy")
+        ),
+        record=None,
+    )
+
+
+def test__scenarios_only_change_policies(tmp_path):
+    with pytest.raises(ValueError, match="regions"):
+        ScenarioBrancher(
+            {},
+            branch_date=30,
+            scenarios={"bigger": {"regions": ["CXB-219"]}},
+            output_dir=tmp_path,
+        )
+    scenarios = scenarios_from_policy_files(["isolation", "mask_wearing"])
+    brancher = ScenarioBrancher(
+        {}, branch_date=30, scenarios=scenarios, output_dir=tmp_path
+    )
+    assert brancher.get_parameters("isolation")["isolation_units"] is True
+    assert brancher.get_parameters("isolation")["save_path"] == tmp_path / "isolation"
+    assert brancher.get_prefix_parameters()["isolation_units"] is True
+    assert brancher.get_prefix_parameters()["save_path"] == tmp_path / "prefix"
+    assert any(
+        isinstance(policy, Isolation)
+        for policy in get_policies(brancher.get_parameters("isolation"))
+    )
+
+
+def test__branch_keeps_shared_policies():
+    simulator = make_simulator()
+    running = list(simulator.activity_manager.policies)
+    apply_policy_set(
+        simulator,
+        get_scenario_policies("mask_wearing"),
+        branch_date,
+        list(get_scenario_policies("simple_policy")),
+    )
+    merged = {policy.spec: policy for policy in simulator.activity_manager.policies}
+    assert set(merged) == {
+        policy.spec for policy in get_scenario_policies("mask_wearing")
+    }
+    running = {policy.spec: policy for policy in running}
+    assert merged["hospitalisation"] is running["hospitalisation"]
+    assert merged["severe_symptoms_stay_home"] is running["severe_symptoms_stay_home"]
+    # policies new to the branch start at the branch date at the earliest
+    assert merged["quarantine"] is not running["quarantine"]
+    assert merged["mask_wearing"].start_time == branch_date
+    assert merged["social_distancing"].start_time == datetime(9999, 1, 1)
+    assert simulator.activity_manager.policies.interaction_policies.get_active(
+        branch_date
+    )
+
+
+def test__branch_medical_care_reaches_epidemiology():
+    simulator = make_simulator(IsolationUnits([IsolationUnit(area=None)]))
+    simulator.activity_manager.all_super_groups = ["isolation_units"]
+    simulator.epidemiology = Epidemiology()
+    simulator.epidemiology.medical_care_policies = (
+        simulator.activity_manager.policies.medical_care_policies
+    )
+    apply_policy_set(
+        simulator,
+        get_scenario_policies("isolation"),
+        branch_date,
+        list(get_scenario_policies("simple_policy")),
+    )
+    medical_care_policies = simulator.epidemiology.medical_care_policies
+    assert medical_care_policies is (
+        simulator.activity_manager.policies.medical_care_policies
+    )
+    assert any(isinstance(policy, Isolation) for policy in medical_care_policies)
+    assert simulator.epidemiology.medical_facilities == [
+        simulator.world.isolation_units
+    ]
+
+
+def test__branch_needs_isolation_units():
+    with pytest.raises(ValueError, match="isolation units"):
+        apply_policy_set(
+            make_simulator(),
+            get_scenario_policies("isolation"),
+            branch_date,
+            list(get_scenario_policies("simple_policy")),
+        )
+
+
+def test__record_move_to(tmp_path):
+    record = CampRecord(record_path=tmp_path / "prefix")
+    with open(record.record_path / "walk.csv", "w") as f:
+        f.write("2020-05-01,1.0\n")
+    (record.record_path / "checkpoints").mkdir()
+    record.move_to(tmp_path / "branch")
+    assert record.record_path == tmp_path / "branch"
+    assert (tmp_path / "branch/walk.csv").read_text() == "2020-05-01,1.0\n"
+    assert (tmp_path / "prefix/walk.csv").exists()
+    assert not (tmp_path / "branch/checkpoints").exists()
+
+
+def test__branches_share_random_numbers(tmp_path):
+    set_random_seed(5)
+    straight = WalkSimulator(WalkRecord(record_path=tmp_path / "straight"), None)
+    straight.run(until=straight.timer.final_date)
+    pipeline = RunPipeline(
+        [
+            Stage("configure_leisure", None, ()),
+            Stage("simulate", None, ()),
+            Stage("post_process", lambda context, parameters: {}, ()),
+        ]
+    )
+    brancher = WalkBrancher(
+        {"policy": "defaults/policy/simple_policy.yaml"},
+        branch_date="2020-05-05",
+        scenarios=scenarios_from_policy_files(["mask_wearing", "home_care_policy"]),
+        output_dir=tmp_path / "branches",
+        n_workers=2,
+        pipeline=pipeline,
+    )
+    results = {result["name"]: result for result in brancher.run()}
+    assert set(results) == {"mask_wearing", "home_care_policy"}
+    walk = (tmp_path / "straight/walk.csv").read_text()
+    for name, result in results.items():
+        assert result["status"] == "done", result["error"]
+        assert (tmp_path / "branches" / name / "walk.csv").read_text() == walk
+        assert (tmp_path / "branches" / name / "policies.json").exists()
+    prefix = (tmp_path / "branches/prefix/walk.csv").read_text()
+    assert walk.startswith(prefix)
+    assert prefix.splitlines()[-1].startswith("2020-05-04")
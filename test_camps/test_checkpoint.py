@@ -0,0 +1,330 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from numba import njit
+
+from june.epidemiology.epidemiology import Epidemiology
+from june.epidemiology.infection import InfectionSelector, InfectionSelectors
+from june.epidemiology.infection_seed import InfectionSeed
+from june.groups import Cemeteries, Hospital, Hospitals
+from june.interaction import Interaction
+from june.policy import Hospitalisation, Policies
+from june.time import Timer
+
+from camps import checkpoint
+from camps.checkpoint import (
+    CheckpointPickler,
+    SimulationCheckpointer,
+    get_output_state,
+    get_random_states,
+    restore_output_state,
+    set_random_states,
+)
+from camps.groups import IsolationUnit, IsolationUnits, ShelterDistributor, Shelters
+from camps.paths import camp_configs_path
+from camps.pipeline import finish_simulation, set_random_seed
+from camps.policy import Isolation
+from camps.records import CampRecord
+from camps.simulator import CampSimulator
+from camps.synthetic import generate_virtual_world
+
+interactions_file_path = (
+    camp_configs_path / "defaults/interaction/interaction_Survey.yaml"
+)
+
+camp_config = """
+activity_to_super_groups:
+  residence: ['shelters']
+  medical_facility: ['hospitals', 'isolation_units']
+time:
+  initial_day: '2020-05-24 9:00'
+  total_days: 8
+  step_duration:
+    weekday: {0: 10, 1: 14}
+    weekend: {0: 10, 1: 14}
+  step_activities:
+    weekday:
+      0: ['medical_facility', 'residence']
+      1: ['medical_facility', 'residence']
+    weekend:
+      0: ['medical_facility', 'residence']
+      1: ['medical_facility', 'residence']
+weekend: ["Friday", "Saturday"]
+weekday: ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"]
+"""
+
+# resumes the run of a checkpoint, in a process with another hash seed
+resume_script = """
+import sys
+from camps.pipeline import finish_simulation
+from camps.simulator import CampSimulator
+finish_simulation(CampSimulator.from_checkpoint(sys.argv[1]))
+"""
+
+
+@njit
+def draw_numba():
+    return np.random.random() + random.random()
+
+
+def draw():
+    return [np.random.random(), random.random(), draw_numba()]
+
+
+class RandomWalkRecord(CampRecord):
+    def parameters(self, **kwargs):
+        pass
+
+
+class RandomWalkSimulator(CampSimulator):
+    """
+    Simulator whose time steps write random draws to the records, and that
+    can be killed at a given day.
+    """
+
+    def __init__(self, record, checkpointer, kill_at=None):
+        self.timer = Timer(initial_day="2020-05-01", total_days=10)
+        self.record = record
+        self.epidemiology = self.interaction = self.activity_manager = None
+        self.checkpoint_save_dates = []
+        self.checkpointer = checkpointer
+        self.early_stopping = None
+        self.stopped_early = None
+        self.started = False
+        self.kill_at = kill_at
+        self.walk = 0.0
+
+    def clear_world(self):
+        pass
+
+    def do_timestep(self):
+        self.walk += sum(draw())
+        with open(self.record.record_path / "walk.csv", "a") as f:
+            f.write(f"{self.timer.date},{self.walk!r}\n")
+        self.record.n_infected = int(self.walk)
+        self.record._current_counts = {"CXB-219": (int(self.walk), 0, 0)}
+        self.record.summarise_constant_time_steps([self.timer.date])
+        if self.kill_at is not None and self.timer.now >= self.kill_at:
+            raise KeyboardInterrupt
+
+
+@pytest.fixture(autouse=True)
+def keep_random_states():
+    # tests further on draw from the generators seeded by conftest
+    states = get_random_states()
+    yield
+    set_random_states(states)
+
+
+def run_walk(path, kill_at=None):
+    set_random_seed(5)
+    path.mkdir()
+    record = RandomWalkRecord(record_path=path)
+    checkpointer = SimulationCheckpointer(path / "checkpoints", every=3)
+    simulator = RandomWalkSimulator(record, checkpointer, kill_at=kill_at)
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+    return simulator
+
+
+def make_camp_simulator(path, until=None):
+    """
+    Simulator of a small synthetic camp where the symptomatic are isolated,
+    checkpointed every 3 days and run until the given date.
+    """
+    set_random_seed(5)
+    path.mkdir()
+    world = generate_virtual_world(n_regions=4, seed=5)[0]
+    for supergroup in [Shelters, Hospitals, IsolationUnits]:
+        supergroup.get_interaction(interactions_file_path)
+    world.shelters = Shelters.for_areas(world.areas)
+    shelter_distributor = ShelterDistributor(sharing_shelter_ratio=0.75)
+    for area in world.areas:
+        shelter_distributor.distribute_people_in_shelters(
+            area.shelters, area.households
+        )
+    hospital_area = world.areas[0]
+    world.hospitals = Hospitals(
+        [
+            Hospital(
+                n_beds=20,
+                n_icu_beds=2,
+                coordinates=hospital_area.coordinates,
+                area=hospital_area,
+            )
+        ]
+    )
+    world.isolation_units = IsolationUnits(
+        [IsolationUnit(area=area, n_beds=5) for area in world.areas[::10]]
+    )
+    world.cemeteries = Cemeteries()
+    selector = InfectionSelector.from_file()
+    InfectionSeed(world=world, infection_selector=selector).unleash_virus(
+        n_cases=20, population=world.people, time=0
+    )
+    policies = Policies(
+        [
+            Hospitalisation(),
+            Isolation(testing_mean_time=2, testing_std_time=1, n_quarantine_days=5),
+        ]
+    )
+    config_path = path / "config.yaml"
+    config_path.write_text(camp_config)
+    record = CampRecord(record_path=path / "results")
+    world.isolation_units.set_occupancy_record(record)
+    simulator = CampSimulator.from_file(
+        world=world,
+        interaction=Interaction.from_file(config_filename=interactions_file_path),
+        policies=policies,
+        config_filename=config_path,
+        epidemiology=Epidemiology(infection_selectors=InfectionSelectors([selector])),
+        record=record,
+    )
+    simulator.timer.reset()
+    simulator.checkpointer = SimulationCheckpointer(path / "checkpoints", every=3)
+    if until is not None:
+        simulator.run(until=until)
+    return simulator
+
+
+def read_tables(path) -> dict:
+    with tables.open_file(str(path), "r") as f:
+        return {
+            table._v_pathname: table.read() for table in f.walk_nodes("/", "Table")
+        }
+
+
+def test__pickles_worlds(tmp_path):
+    world = generate_virtual_world(n_regions=1)[0]
+    with open(tmp_path / "world.pkl", "wb") as f:
+        CheckpointPickler(f).dump(world)
+    world_copy = pd.read_pickle(tmp_path / "world.pkl")
+    assert len(world_copy.people) == len(world.people)
+    household = world_copy.households[0]
+    assert [member.name for member in household.SubgroupType] == [
+        member.name for member in world.households[0].SubgroupType
+    ]
+    person = household.people[0]
+    assert person.residence.group is household
+
+
+def test__random_states():
+    set_random_seed(1)
+    states = get_random_states()
+    draws = draw()
+    set_random_seed(2)
+    set_random_states(states)
+    assert draw() == draws
+
+
+def test__random_states_without_numba(monkeypatch):
+    set_random_seed(1)
+    numba_states = get_random_states()
+    monkeypatch.setattr(checkpoint, "_helperlib", None)
+    states = get_random_states()
+    assert set(states) == {"random", "numpy"}
+    draws = draw()[:2]
+    set_random_seed(2)
+    set_random_states(states)
+    assert draw()[:2] == draws
+    # checkpoints saved with the numba states still load
+    set_random_states(numba_states)
+
+
+def test__output_state(tmp_path):
+    (tmp_path / "summary.csv").write_text("a,b\n1,2\n")
+    with tables.open_file(str(tmp_path / "june_record.h5"), "w") as f:
+        table = f.create_table("/", "infections", {"id": tables.Int32Col()})
+        table.append([(1,), (2,)])
+    state = get_output_state(tmp_path)
+    with open(tmp_path / "summary.csv", "a") as f:
+        f.write("3,4\n")
+    with tables.open_file(str(tmp_path / "june_record.h5"), "a") as f:
+        f.root.infections.append([(3,)])
+        f.create_table("/", "deaths", {"id": tables.Int32Col()})
+    restore_output_state(tmp_path, state)
+    assert (tmp_path / "summary.csv").read_text() == "a,b\n1,2\n"
+    with tables.open_file(str(tmp_path / "june_record.h5"), "r") as f:
+        assert f.root.infections.col("id").tolist() == [1, 2]
+        assert "deaths" not in f.root
+
+
+def test__resume_is_identical(tmp_path):
+    complete = run_walk(tmp_path / "complete")
+    killed = run_walk(tmp_path / "killed", kill_at=7)
+    assert killed.timer.date < killed.timer.final_date
+    checkpointer = killed.checkpointer
+    assert [path.name for path in checkpointer.get_checkpoints()] == [
+        "checkpoint_2020-05-04.pkl.gz",
+        "checkpoint_2020-05-07.pkl.gz",
+    ]
+
+    set_random_seed(3)
+    resumed = CampSimulator.from_checkpoint(checkpointer.get_latest())
+    assert resumed.timer.date == datetime(2020, 5, 7)
+    resumed.kill_at = None
+    resumed.run()
+    assert resumed.timer.date == complete.timer.date
+    assert resumed.walk == complete.walk
+    for filename in ["walk.csv", "summary.csv"]:
+        assert (tmp_path / "killed" / filename).read_bytes() == (
+            tmp_path / "complete" / filename
+        ).read_bytes()
+    # the next checkpoints are written by the resumed simulator
+    assert checkpointer.get_latest().name == "checkpoint_2020-05-10.pkl.gz"
+
+
+def test__resume_camp_in_another_process(tmp_path):
+    complete = make_camp_simulator(tmp_path / "complete")
+    finish_simulation(complete)
+    assert complete.record.n_infections > 20
+    # killed after a checkpoint, with outputs written past it
+    killed = make_camp_simulator(tmp_path / "killed", until=datetime(2020, 5, 31))
+    checkpoint_path = killed.checkpointer.get_latest()
+    assert checkpoint_path.name == "checkpoint_2020-05-30.pkl.gz"
+    del killed
+
+    subprocess.run(
+        [sys.executable, "-c", resume_script, str(checkpoint_path)],
+        cwd=Path(__file__).absolute().parent.parent,
+        env=dict(os.environ, PYTHONHASHSEED="7"),
+        check=True,
+    )
+    results_path = tmp_path / "killed" / "results"
+    complete_path = tmp_path / "complete" / "results"
+    for filename in ["summary.csv", "camp_summary.csv", "locations.csv"]:
+        assert (results_path / filename).read_bytes() == (
+            complete_path / filename
+        ).read_bytes()
+    resumed_tables = read_tables(results_path / "june_record.h5")
+    complete_tables = read_tables(complete_path / "june_record.h5")
+    assert "/isolation_units_occupancy" in complete_tables
+    assert resumed_tables.keys() == complete_tables.keys()
+    for name, table in complete_tables.items():
+        assert np.array_equal(resumed_tables[name], table), name
@@ -0,0 +1,111 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import sys
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from camps.post_processing import InfectionLocationCounter
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "camp_scripts/runner_scripts"))
+from copy_summaries import collate, read_parameters, read_run  # noqa: E402
+
+
+def write_run(run_dir, index, all_outputs=True):
+    run_dir.mkdir()
+    pd.DataFrame(
+        {"day": [0, 1], "region": ["CXB-219", "CXB-219"], "infected": [index, 2]}
+    ).to_csv(run_dir / "summary.csv", index=False)
+    if not all_outputs:
+        return
+    pd.DataFrame({"region": ["CXB-219"], "dead": [1]}).to_csv(
+        run_dir / "camp_summary.csv", index=False
+    )
+    pd.DataFrame({"location_specs": ["shelter"], "0": [3]}).to_csv(
+        run_dir / "locations.csv", index=False
+    )
+    counter = InfectionLocationCounter(age_bins=(0, 18))
+    counter.add(
+        np.array([b"shelter", b"shelter"]),
+        np.array([b"2020-05-01", b"2020-05-02"]),
+        np.array([b"CXB-219", b"CXB-219"]),
+        np.array([3, 30]),
+    )
+    counter.save(run_dir)
+
+
+def make_sweep(sweep_dir):
+    sweep_dir.mkdir()
+    parameter_grid = [
+        {"beta_factor": 0.5, "isolation_units": True, "policy": Path("a.yaml")},
+        {"beta_factor": 1.0, "isolation_units": False, "policy": Path("b.yaml")},
+    ]
+    with open(sweep_dir / "parameter_grid.pkl", "wb") as f:
+        pickle.dump(parameter_grid, f)
+    write_run(sweep_dir / "run_000", 0)
+    write_run(sweep_dir / "run_001", 1, all_outputs=False)
+    # left over from a larger grid
+    write_run(sweep_dir / "run_002", 2)
+
+
+def test__read_parameters(tmp_path):
+    make_sweep(tmp_path / "sweep")
+    parameters = read_parameters(tmp_path / "sweep")
+    assert parameters.index.name == "run"
+    assert list(parameters.index) == [0, 1]
+    assert parameters["policy"].tolist() == ["a.yaml", "b.yaml"]
+    assert parameters["beta_factor"].dtype == np.float64
+
+
+def test__read_run(tmp_path):
+    make_sweep(tmp_path / "sweep")
+    index, tables, missing = read_run((1, tmp_path / "sweep/run_001"))
+    assert index == 1
+    assert set(tables) == {"summary"}
+    assert missing == ["camp_summary.csv", "locations.csv", "infection_locations.npz"]
+    _, tables, missing = read_run((0, tmp_path / "sweep/run_000"))
+    assert missing == []
+    assert tables["locations"].columns.tolist() == [
+        "run",
+        "location_specs",
+        "infections",
+    ]
+    assert tables["infection_locations"]["infections"].sum() == 2
+
+
+def test__collate(tmp_path):
+    make_sweep(tmp_path / "sweep")
+    store_path = tmp_path / "summaries.h5"
+    missing_runs = collate(tmp_path / "sweep", store_path, n_workers=2)
+    assert missing_runs == {
+        1: ["camp_summary.csv", "locations.csv", "infection_locations.npz"],
+        2: ["parameter grid entry"],
+    }
+    summary = pd.read_hdf(store_path, "summary")
+    assert summary["run"].tolist() == [0, 0, 1, 1]
+    assert summary["infected"].tolist() == [0, 2, 1, 2]
+    assert summary["beta_factor"].tolist() == [0.5, 0.5, 1.0, 1.0]
+    assert summary["policy"].tolist() == ["a.yaml", "a.yaml", "b.yaml", "b.yaml"]
+    run_1 = pd.read_hdf(store_path, "summary", where="run in [1]")
+    assert run_1["run"].tolist() == [1, 1]
+    assert pd.read_hdf(store_path, "camp_summary")["run"].tolist() == [0]
+    assert pd.read_hdf(store_path, "infection_locations")["infections"].sum() == 2
+    parameters = pd.read_hdf(store_path, "parameters")
+    assert parameters.index.name == "run"
+    assert list(parameters.index) == [0, 1]
@@ -0,0 +1,146 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from june.time import Timer
+
+from camps.records import CampRecord
+from camps.results import get_initial_date
+from camps.simulator import CampSimulator, EarlyStopping
+
+
+class ScriptedRecord(CampRecord):
+    def parameters(self, **kwargs):
+        pass
+
+
+class ScriptedSimulator(CampSimulator):
+    """
+    Simulator whose time steps set the counters of its record from the number
+    of people infected and of new infections every day.
+    """
+
+    def __init__(self, record, infected, infections, early_stopping, seeds=()):
+        self.timer = Timer(initial_day="2020-05-01", total_days=10)
+        self.record = record
+        self.epidemiology = SimpleNamespace(
+            infection_seeds=list(seeds),
+            infection_seeds_timestep=lambda timer, record: None,
+        )
+        self.interaction = self.activity_manager = None
+        self.checkpoint_save_dates = []
+        self.early_stopping = early_stopping
+        self.stopped_early = None
+        self.infected = infected
+        self.infections = infections
+        self.n_time_steps = 0
+
+    def clear_world(self):
+        pass
+
+    def do_timestep(self):
+        day = min(int(self.timer.now), len(self.infected) - 1)
+        self.n_time_steps += 1
+        self.record.n_infected = self.infected[day]
+        self.record.n_infections = self.infections[day]
+        self.record._current_counts = {"CXB-219": (self.infected[day], 1, 0)}
+
+
+@pytest.fixture(name="record")
+def make_record(tmp_path):
+    return ScriptedRecord(record_path=tmp_path)
+
+
+def read_summary(record):
+    return pd.read_csv(record.record_path / record.summary_filename)
+
+
+def test__stops_on_extinction(record):
+    simulator = ScriptedSimulator(
+        record, infected=[3, 2, 0], infections=[3, 4, 4], early_stopping=EarlyStopping()
+    )
+    simulator.run()
+    assert simulator.stopped_early["criterion"] == "extinction"
+    assert simulator.stopped_early["date"] == datetime(2020, 5, 4)
+    assert simulator.stopped_early["days_skipped"] == 7
+    # a Friday and a weekend
+    assert simulator.n_time_steps == 4
+    assert simulator.timer.date >= simulator.timer.final_date
+    # hospital counts are kept, infected counts are zero
+    summary = read_summary(record)
+    assert (summary["current_infected"] == 0).all()
+    assert (summary["current_hospitalised"] == 1).all()
+    assert (summary["daily_infected"] == 0).all()
+    # results count days from the initial day of the run
+    assert get_initial_date(record.record_path) == pd.Timestamp("2020-05-01")
+
+
+def test__pending_seeds_delay_extinction(record):
+    simulator = ScriptedSimulator(
+        record,
+        infected=[0],
+        infections=[0],
+        early_stopping=EarlyStopping(),
+        seeds=[SimpleNamespace(max_date=pd.Timestamp("2020-05-06"))],
+    )
+    simulator.run()
+    assert simulator.stopped_early["date"] == datetime(2020, 5, 7)
+
+
+def test__stops_on_plateau(record):
+    simulator = ScriptedSimulator(
+        record,
+        infected=[5, 10, 8, 5],
+        infections=[5, 10, 12, 12],
+        early_stopping=EarlyStopping(plateau_days=2, plateau_tolerance=0.1),
+    )
+    simulator.run()
+    assert simulator.stopped_early["criterion"] == "plateau"
+    # infections stopped growing on the 4th, and stayed so for two days
+    assert simulator.stopped_early["date"] == datetime(2020, 5, 6)
+    summary = read_summary(record)
+    skipped = summary[summary["time_stamp"] >= "2020-05-06"]
+    assert skipped["time_stamp"].nunique() == 5
+    assert (skipped["current_infected"] == 5).all()
+
+
+def test__runs_to_the_end(record):
+    simulator = ScriptedSimulator(
+        record,
+        infected=[5] * 10,
+        infections=list(range(5, 105, 10)),
+        early_stopping=EarlyStopping(plateau_days=2),
+    )
+    simulator.run()
+    assert simulator.stopped_early is None
+    assert simulator.timer.date == simulator.timer.final_date
+
+
+def test__from_parameters():
+    assert EarlyStopping.from_parameters({"early_stop": "none"}) is None
+    extinction = EarlyStopping.from_parameters({"early_stop": "extinction"})
+    assert extinction.extinction and extinction.plateau_days is None
+    plateau = EarlyStopping.from_parameters(
+        {"early_stop": "plateau", "plateau_days": "7", "plateau_tolerance": "0.05"}
+    )
+    assert plateau.plateau_days == 7 and plateau.plateau_tolerance == 0.05
+    with pytest.raises(ValueError):
+        EarlyStopping.from_parameters({"early_stop": "saturation"})
@@ -0,0 +1,49 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import json
+
+from camps.instrumentation import RunProfiler
+
+
+def test__stages_are_recorded_in_order(tmp_path):
+    profiler = RunProfiler(name="test", verbose=False)
+    profiler.next_stage("world_generation")
+    profiler.next_stage("simulation")
+    with profiler.stage("interaction"):
+        sum(range(10000))
+
+    @profiler.profile()
+    def post_process():
+        return 1
+
+    assert post_process() == 1
+    profile_path = profiler.save(tmp_path / "results")
+    with open(profile_path) as f:
+        profile = json.load(f)
+    assert profile["name"] == "test"
+    stages = [stage["stage"] for stage in profile["stages"]]
+    assert stages == [
+        "world_generation",
+        "simulation/interaction",
+        "simulation/post_process",
+        "simulation",
+    ]
+    for stage in profile["stages"]:
+        assert stage["wall_time"] >= 0
+        assert stage["cpu_time"] >= 0
+        assert stage["peak_rss_mb"] > 0
+    assert profile["peak_rss_mb"] > 0
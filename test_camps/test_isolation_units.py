@@ -14,15 +14,19 @@ the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 See the GNU General Public License for more details.
 """
 
+from types import SimpleNamespace
+
 import numpy as np
 import pytest
+import tables
 
 from june.demography import Person
+from june.geography import Area
 from june.epidemiology.infection import InfectionSelector
 from june.epidemiology.infection.symptoms import SymptomTag
 from june.policy.medical_care_policies import Hospitalisation
 from june import paths
-from june.groups.hospital import MedicalFacility, MedicalFacilities
+from june.groups.hospital import Hospital, MedicalFacility, MedicalFacilities
 from june.policy import Policies
 
 from camps.groups import IsolationUnit, IsolationUnits
@@ -57,6 +61,118 @@ def test__isolation_unit_group():
     assert isinstance(iso_units, MedicalFacilities)
 
 
+def test__closest_isolation_unit_with_capacity():
+    close_area = Area(name="close", super_area=None, coordinates=(12.0, 15.0))
+    far_area = Area(name="far", super_area=None, coordinates=(12.5, 15.5))
+    close_unit = IsolationUnit(area=close_area, n_beds=2)
+    far_unit = IsolationUnit(area=far_area, n_beds=1)
+    iso_units = IsolationUnits([far_unit, close_unit])
+    people = [Person.from_attributes(sex="m", age=27) for _ in range(4)]
+    assigned = []
+    for person in people:
+        iso_unit = iso_units.get_closest(coordinates=(12.01, 15.01))
+        if iso_unit is not None:
+            iso_unit.add(person)
+        assigned.append(iso_unit)
+    assert assigned == [close_unit, close_unit, far_unit, None]
+    assert close_unit.n_patients == 2
+    iso_units.release_patient(people[0])
+    assert people[0].medical_facility is None
+    assert close_unit.has_capacity
+    assert iso_units.get_closest(coordinates=(12.01, 15.01)) == close_unit
+
+
+def test__bulk_release_and_occupancy_record(tmp_path):
+    iso_unit = IsolationUnit(area=None, n_beds=3)
+    iso_units = IsolationUnits([iso_unit], occupancy_buffer_size=4)
+    people = [Person.from_attributes(sex="f", age=30) for _ in range(3)]
+    for release_time, person in zip([2.0, 4.0, 3.0], people):
+        iso_unit.add(person, release_time=release_time)
+    assert not iso_unit.has_capacity
+    n_patients = []
+    for day in range(6):
+        iso_units.release_patients(day)
+        iso_units.record_occupancy(day)
+        n_patients.append(iso_unit.n_patients)
+    assert n_patients == [3, 3, 3, 2, 1, 0]
+    assert all(person.medical_facility is None for person in people)
+    # without a records file only the latest rows are kept
+    assert list(iso_units.occupancy["time"]) == [2, 3, 4, 5]
+    iso_units.occupancy_record_filename = tmp_path / "june_record.h5"
+    iso_units.flush_occupancy()
+    for day in range(6, 12):
+        iso_units.record_occupancy(day)
+    iso_units.flush_occupancy()
+    with tables.open_file(tmp_path / "june_record.h5", mode="r") as file:
+        occupancy = file.root.isolation_units_occupancy.read()
+    assert list(occupancy["time"]) == list(range(2, 12))
+    assert list(occupancy["n_patients"][:4]) == [3, 2, 1, 0]
+    assert len(iso_units.occupancy) == 0
+
+
+def test__waitlist_by_severity_and_testing_time(selector):
+    iso_unit = IsolationUnit(area=None, n_beds=1)
+    iso_units = IsolationUnits([iso_unit])
+    occupant = Person.from_attributes(sex="m", age=27)
+    infect_person(occupant, selector, symptom_tag="mild")
+    waiting = []
+    for symptom_tag, time_of_testing in [
+        ("mild", 1.0),
+        ("severe", 2.0),
+        ("severe", 1.5),
+    ]:
+        person = Person.from_attributes(sex="f", age=27)
+        infect_person(person, selector, symptom_tag=symptom_tag)
+        person.infection.time_of_testing = time_of_testing
+        waiting.append(person)
+    occupant.infection.time_of_testing = 0.0
+    assert iso_units.admit_patient(occupant, release_time=1.0) == iso_unit
+    for person in waiting:
+        assert iso_units.admit_patient(person, release_time=10.0) is None
+    assert iso_units.n_waitlisted == 3
+    iso_units.release_patients(2.0)
+    admitted = []
+    for _ in waiting:
+        patient = [person for person in waiting if person.medical_facility is not None]
+        assert len(patient) == 1
+        admitted.append(patient[0])
+        iso_unit.release_patient(patient[0])
+        iso_units.admit_from_waitlist(2.0)
+    assert admitted == [waiting[2], waiting[1], waiting[0]]
+    assert iso_units.n_waitlisted == 0
+
+
+def test__beds_freed_when_patients_leave_for_hospital_or_die():
+    iso_unit = IsolationUnit(area=None, n_beds=1)
+    iso_units = IsolationUnits([iso_unit])
+    hospital = Hospital(n_beds=10, n_icu_beds=2)
+    people = [Person.from_attributes(sex="f", age=40) for _ in range(3)]
+    for time_of_testing, person in enumerate(people):
+        person.infection = SimpleNamespace(
+            symptoms=SimpleNamespace(tag=SymptomTag.mild),
+            time_of_testing=float(time_of_testing),
+        )
+    hospitalised, dead, waiting = people
+    assert iso_units.admit_patient(hospitalised, release_time=10.0) == iso_unit
+    assert iso_units.admit_patient(dead, release_time=10.0) is None
+    assert iso_units.admit_patient(waiting, release_time=10.0) is None
+    hospital.add_to_ward(hospitalised)
+    assert iso_units.release_patients(1.0) == 1
+    assert hospitalised.medical_facility.group is hospital
+    assert dead.medical_facility.group is iso_unit
+    assert iso_units.n_waitlisted == 1
+    dead.dead = True
+    assert iso_units.release_patients(2.0) == 1
+    assert dead.medical_facility is None
+    assert waiting.medical_facility.group is iso_unit
+    assert iso_unit.n_patients == 1
+    # a patient moved out of the unit is released wherever they are
+    hospital.add_to_ward(waiting)
+    iso_units.release_patient(waiting)
+    assert iso_unit.n_patients == 0
+    assert waiting.medical_facility.group is hospital
+
+
 def test__isolation_policy(isolation):
     assert isolation.testing_mean_time == 3
     assert isolation.testing_std_time == 1
@@ -129,6 +245,30 @@ def test__isolation_compliance(selector):
     assert np.isclose(len(go_isolation), 500, rtol=0.1)
 
 
+def test__release_when_quarantine_ends_after_recovery(selector, isolation):
+    recovered = Person.from_attributes(sex="m", age=27)
+    infect_person(recovered, selector, symptom_tag="mild")
+    isolation_units = IsolationUnits([IsolationUnit(area=None)])
+    world = SimpleNamespace(isolation_units=isolation_units)
+    isolation.start_timestep(world, days_from_start=0)
+    isolation.apply(recovered, medical_facilities=[isolation_units], days_from_start=0)
+    testing_day = int(np.ceil(recovered.infection.time_of_testing))
+    for day in range(testing_day, testing_day + 2):
+        isolation.start_timestep(world, days_from_start=day)
+        isolation.apply(
+            recovered, medical_facilities=[isolation_units], days_from_start=day
+        )
+    assert recovered.medical_facility.group == isolation_units[0]
+    # nobody infected is left, releases and occupancy go on every time step
+    recovered.infection = None
+    n_days = isolation.n_quarantine_days + 2
+    for day in range(testing_day + 2, testing_day + n_days):
+        isolation.start_timestep(world, days_from_start=day)
+    assert recovered.medical_facility is None
+    assert isolation_units[0].n_patients == 0
+    assert isolation_units.occupancy["time"][-1] == testing_day + n_days - 1
+
+
 def test__hospitalisation_takes_preference(selector):
     isolation = Isolation(
         testing_mean_time=3, testing_std_time=1, n_quarantine_days=7, compliance=0.5
@@ -147,3 +147,20 @@ def test__get_closest_learning_center():
     closest = learning_centers.get_closest(coordinates=(121.5, 130.2), k=1)
 
     assert learning_centers.members[closest[0]] == learning_center_2
+
+
+def test__get_closest_many_learning_centers():
+    coordinates = [(12.3, 15.6), (120.3, 150.6), (12.4, 15.8)]
+    learning_centers = LearningCenters(
+        learning_centers=[
+            LearningCenter(coordinates=coordinate, n_pupils_max=20)
+            for coordinate in coordinates
+        ],
+        learning_centers_tree=True,
+    )
+    query_coordinates = np.array([(121.5, 130.2), (12.3, 15.6), (12.4, 15.9)])
+    closest = learning_centers.get_closest_many(query_coordinates, k=5)
+    assert closest.shape == (3, 3)
+    for row, query in zip(closest, query_coordinates):
+        assert list(row) == list(learning_centers.get_closest(coordinates=query, k=3))
+    assert learning_centers.get_closest_many(query_coordinates, k=5) is closest
@@ -143,3 +143,132 @@ def test__distribute_teachers():
         assert learning_center.ids_per_shift[0] == learning_center.ids_per_shift[1]
         assert learning_center.ids_per_shift[1] == learning_center.ids_per_shift[2]
         assert learning_center.teachers[0].age >= 21
+
+
+def test__kids_fill_closest_centers_with_availability():
+    learning_center_1 = LearningCenter(coordinates=(12.3, 15.6), n_pupils_max=2)
+    learning_center_2 = LearningCenter(coordinates=(12.4, 15.6), n_pupils_max=3)
+    learning_centers = LearningCenters(
+        learning_centers=[learning_center_1, learning_center_2], n_shifts=2
+    )
+    for learning_center in learning_centers:
+        learning_center.add(
+            person=Person.from_attributes(sex="f", age=40),
+            shift=0,
+            subgroup_type=learning_center.SubgroupType.teachers,
+        )
+    area_region_df = pd.DataFrame({"area": ["dummy"], "region": ["dummy_region"]})
+    learning_center_distributor = LearningCenterDistributor(
+        learning_centers=learning_centers,
+        female_enrollment_rates={"dummy_region": {"0-100": 1.0}},
+        male_enrollment_rates={"dummy_region": {"0-100": 1.0}},
+        area_region_df=area_region_df,
+    )
+    kids = [Person.from_attributes(sex="m", age=8) for _ in range(7)]
+    n_overflow = learning_center_distributor.send_kids_to_closest_centers_with_availability(
+        kids, closest_centers_idx=[0, 1]
+    )
+    assert n_overflow == 2
+    assert all(kid in learning_center_1.students for kid in kids[:2])
+    assert all(kid in learning_center_2.students for kid in kids[2:5])
+    assert len(learning_center_1.students) + len(learning_center_2.students) == 7
+    for kid in kids:
+        learning_center = kid.primary_activity.group
+        shifts = [
+            shift
+            for shift, ids in learning_center.ids_per_shift.items()
+            if kid.id in ids
+        ]
+        assert len(shifts) == 1
+        assert shifts[0] in (0, 1)
+
+
+def test__teachers_are_not_shared_between_learning_centers():
+    dummy_area = Area(name="dummy", super_area=None, coordinates=(12.0, 15.0))
+    dummy_areas = Areas(areas=[dummy_area])
+    people = [Person.from_attributes(sex="f", age=age) for age in range(10, 30)]
+    for person in people:
+        person.area = dummy_area
+    dummy_area.people = people
+    learning_centers = LearningCenters(
+        learning_centers=[
+            LearningCenter(coordinates=(12.0 + 0.01 * i, 15.0), n_pupils_max=20)
+            for i in range(10)
+        ],
+        n_shifts=1,
+    )
+    learning_center_distributor = LearningCenterDistributor(
+        learning_centers=learning_centers,
+        female_enrollment_rates={"dummy_region": {"0-100": 0.0}},
+        male_enrollment_rates={"dummy_region": {"0-100": 0.0}},
+        area_region_df=pd.DataFrame({"area": ["dummy"], "region": ["dummy_region"]}),
+    )
+    learning_center_distributor.distribute_teachers_to_learning_centers(
+        areas=dummy_areas
+    )
+    teachers = [
+        teacher for learning_center in learning_centers for teacher in learning_center.teachers
+    ]
+    assert len(teachers) == 9
+    assert len(set(teacher.id for teacher in teachers)) == len(teachers)
+    assert all(teacher.age >= 21 for teacher in teachers)
+
+
+def test__add_learning_centers_and_redistribute_kids():
+    close_area = Area(name="close", super_area=None, coordinates=(12.0, 15.0))
+    far_area = Area(name="far", super_area=None, coordinates=(40.0, 60.0))
+    areas = Areas(areas=[close_area, far_area])
+    for area in areas:
+        area.people = [Person.from_attributes(sex="f", age=8) for _ in range(10)]
+        area.people += [Person.from_attributes(sex="m", age=40) for _ in range(10)]
+        for person in area.people:
+            person.area = area
+    learning_centers = LearningCenters(
+        learning_centers=[
+            LearningCenter(coordinates=(12.05, 15.0), n_pupils_max=6),
+            LearningCenter(coordinates=(40.0, 60.0), n_pupils_max=100),
+            LearningCenter(coordinates=(40.05, 60.0), n_pupils_max=100),
+        ],
+        n_shifts=2,
+    )
+    learning_center_distributor = LearningCenterDistributor(
+        learning_centers=learning_centers,
+        female_enrollment_rates={"dummy_region": {"0-18": 1.0}},
+        male_enrollment_rates={"dummy_region": {"0-18": 1.0}},
+        area_region_df=pd.DataFrame(
+            {"area": ["close", "far"], "region": ["dummy_region", "dummy_region"]}
+        ),
+        neighbour_centers=2,
+    )
+    learning_center_distributor.distribute_teachers_to_learning_centers(areas)
+    learning_center_distributor.distribute_kids_to_learning_centers(areas)
+    far_kids = [person for person in far_area.people if person.age < 18]
+    far_kids_centers = [kid.primary_activity.group for kid in far_kids]
+
+    extra_learning_center = LearningCenter(coordinates=(12.0, 15.0), n_pupils_max=6)
+    new_centers_idx = learning_centers.add_centers([extra_learning_center])
+    assert list(new_centers_idx) == [3]
+    assert learning_centers.n_centers_in_tree == 4
+    learning_center_distributor.distribute_teachers_to_learning_centers(
+        areas, learning_centers=[extra_learning_center]
+    )
+    assert len(extra_learning_center.teachers) > 0
+    stats = learning_center_distributor.redistribute_kids_near_centers(
+        areas, new_centers_idx
+    )
+    assert stats == {"n_redistributed": 10, "n_overflow": 0}
+    # kids in the far area are not touched
+    assert [kid.primary_activity.group for kid in far_kids] == far_kids_centers
+    close_kids = [person for person in close_area.people if person.age < 18]
+    for kid in close_kids:
+        learning_center = kid.primary_activity.group
+        assert learning_center in (learning_centers[0], extra_learning_center)
+        assert (
+            sum(kid.id in ids for ids in learning_center.ids_per_shift.values()) == 1
+        )
+    assert len(extra_learning_center.students) == 6
+    assert len(learning_centers[0].students) == 4
+    for learning_center in learning_centers[1:3]:
+        assert len(learning_center.students) == sum(
+            kid.primary_activity.group == learning_center for kid in far_kids
+        )
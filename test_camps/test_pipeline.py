@@ -0,0 +1,103 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import argparse
+
+from camps.instrumentation import RunProfiler
+from camps.pipeline import (
+    Stage,
+    RunPipeline,
+    default_parameters,
+    get_immunity_setter,
+    parameters_from_args,
+)
+
+
+def make_counting_pipeline(calls):
+    def build(context, parameters):
+        calls.append("build")
+        return {"world": {"size": parameters["size"], "infected": []}}
+
+    def simulate(context, parameters):
+        calls.append("simulate")
+        context["world"]["infected"].append(parameters["beta"])
+        return {"n_infected": len(context["world"]["infected"])}
+
+    return RunPipeline(
+        stages=[
+            Stage("build", build, ("size",), cache=True),
+            Stage("simulate", simulate, ("beta",)),
+        ]
+    )
+
+
+def test__cached_stages_are_reused(tmp_path):
+    calls = []
+    pipeline = make_counting_pipeline(calls)
+    for beta in [0.1, 0.2, 0.3]:
+        profiler = RunProfiler(verbose=False)
+        context = pipeline.run(
+            {"size": 10, "beta": beta, "save_path": tmp_path / str(beta)},
+            profiler=profiler,
+        )
+        # every run simulates a fresh copy of the cached world
+        assert context["world"]["infected"] == [beta]
+        assert (tmp_path / str(beta) / "profile.json").exists()
+    assert calls == ["build", "simulate", "simulate", "simulate"]
+    assert [stage["stage"] for stage in profiler.stages] == [
+        "build_from_cache",
+        "simulate",
+    ]
+    pipeline.run({"size": 20, "beta": 0.1}, save_profile=False)
+    assert calls.count("build") == 2
+    context = pipeline.run({"size": 20}, until="build", save_profile=False)
+    assert "n_infected" not in context
+    assert calls.count("build") == 2
+
+
+def test__parameters_from_args():
+    args = argparse.Namespace(
+        comorbidities="False",
+        learning_centers="True",
+        learning_center_shifts="False",
+        isolation_beds="10",
+        cluster_seeding=False,
+        household_beta=0.3,
+        child_susceptibility="True",
+    )
+    parameters = parameters_from_args(args, regions=None)
+    assert parameters["comorbidities"] is False
+    assert parameters["learning_centers"] is True
+    assert parameters["learning_center_shifts"] == 4
+    assert parameters["isolation_beds"] == 10
+    assert parameters["seeding"] == "exact"
+    assert parameters["household_beta"] == 0.3
+    assert parameters["child_susceptibility"] is True
+    assert parameters["regions"] is None
+    assert parameters["infectiousness_path"] == default_parameters["infectiousness_path"]
+
+
+def test__child_susceptibility():
+    immunity_setter = get_immunity_setter(
+        parameters_from_args(argparse.Namespace(child_susceptibility="False"))
+    )
+    assert immunity_setter.susceptibility_dict == {}
+    immunity_setter = get_immunity_setter(
+        parameters_from_args(argparse.Namespace(child_susceptibility="True"))
+    )
+    for susceptibility in immunity_setter.susceptibility_dict.values():
+        assert susceptibility[5] == 0.5
+        assert susceptibility[30] == 1.0
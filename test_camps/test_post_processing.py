@@ -0,0 +1,80 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+
+from june.records.event_records_writer import InfectionRecord
+
+from camps.post_processing import InfectionLocationCounter, count_infection_locations
+
+
+@pytest.fixture(name="record_path")
+def make_record(tmp_path):
+    record_path = tmp_path / "june_record.h5"
+    population = np.rec.fromarrays(
+        [np.array([10, 11, 12, 13]), np.array([3, 25, 70, 15])], names="id,age"
+    )
+    with tables.open_file(str(record_path), mode="w") as f:
+        f.create_table(f.root, "population", population)
+    infections = InfectionRecord(hdf5_filename=record_path)
+    with tables.open_file(str(record_path), mode="a") as f:
+        infections.accumulate("shelter", 1, "CXB-219", [10, 10], [11, 13], [0, 0])
+        infections.accumulate("pump_latrine", 2, "CXB-219", [11], [12], [0])
+        infections.record(f, timestamp=datetime(2020, 5, 1))
+        infections.accumulate("shelter", 1, "CXB-219", [12], [10], [0])
+        infections.accumulate("shelter", 3, "CXB-002", [12], [12], [0])
+        infections.record(f, timestamp=datetime(2020, 5, 2))
+    return record_path
+
+
+def test__counts_by_all_axes(record_path):
+    counter = InfectionLocationCounter(age_bins=(0, 18, 60), chunk_size=2)
+    counter.read(record_path)
+    assert counter.counts.sum() == 5
+    assert counter.labels["age_bin"] == ["0-17", "18-59", "60+"]
+    counts = counter.to_dict()
+    shelter = counter.labels["location_specs"].index("shelter")
+    second_day = counter.labels["timestamp"].index("2020-05-02")
+    camp_2 = counter.labels["region"].index("CXB-002")
+    assert counts["counts"][shelter, second_day, camp_2].tolist() == [0, 0, 1]
+    assert counts["counts"][shelter, :, :, 0].sum() == 2
+
+
+def test__locations_match_groupby(record_path, tmp_path):
+    count_infection_locations(tmp_path, chunk_size=3)
+    with tables.open_file(str(record_path), mode="r") as f:
+        infections = pd.DataFrame.from_records(f.root.infections.read())
+    infections["location_specs"] = infections["location_specs"].str.decode("utf-8")
+    timestamps = infections["timestamp"].str.decode("utf-8")
+    infections["timestamp"] = pd.to_datetime(timestamps)
+    expected = infections.groupby(["location_specs", "timestamp"]).size()
+    expected_path = tmp_path / "expected.csv"
+    expected.to_csv(expected_path)
+    assert (tmp_path / "locations.csv").read_text() == expected_path.read_text()
+
+
+def test__load_counts(record_path, tmp_path):
+    count_infection_locations(tmp_path, age_bins=(0, 18, 60))
+    counts = InfectionLocationCounter.load(tmp_path / "infection_locations.npz")
+    assert counts.sum() == 5
+    assert counts.loc[("shelter", "2020-05-01", "CXB-219", "18-59")] == 1
+    assert counts.loc[("shelter", "2020-05-01", "CXB-219", "0-17")] == 1
+    assert counts.loc[("pump_latrine", "2020-05-01", "CXB-219", "60+")] == 1
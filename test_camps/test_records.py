@@ -0,0 +1,155 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from june.groups import Hospital, Hospitals
+from june.records import Record
+
+from camps.groups import IsolationUnit, IsolationUnits
+from camps.post_processing import InfectionLocationCounter
+from camps.records import CampRecord
+from camps.synthetic import (
+    generate_empty_virtual_world,
+    load_basecamp_distributions,
+    populate_virtual_world,
+)
+
+
+@pytest.fixture(name="world", scope="module")
+def make_world():
+    distributions = load_basecamp_distributions()
+    world, _ = generate_empty_virtual_world(n_regions=4)
+    populate_virtual_world(
+        world,
+        distributions["population_dist_df"],
+        distributions["n_residents_params"],
+        seed=5,
+    )
+    hospital_area = world.regions[1].super_areas[0].areas[0]
+    hospital = Hospital(
+        n_beds=10,
+        n_icu_beds=2,
+        coordinates=hospital_area.coordinates,
+        area=hospital_area,
+    )
+    world.hospitals = Hospitals([hospital])
+    world.isolation_units = IsolationUnits([IsolationUnit(area=hospital_area)])
+    return world
+
+
+def person_in_region(world, region_index, index=0):
+    return world.regions[region_index].super_areas[0].areas[0].people[index]
+
+
+def test__daily_counters(world, tmp_path):
+    record = CampRecord(record_path=tmp_path, flush_every=2)
+    region_0 = world.regions[0].name
+    region_1 = world.regions[1].name
+    hospital = world.hospitals[0]
+    isolated = person_in_region(world, 1)
+    for day, hour in [(1, 0), (1, 12), (2, 0), (3, 0)]:
+        timestamp = datetime(2020, 5, day, hour)
+        infected = person_in_region(world, 0, index=day * 10 + hour)
+        record.accumulate(
+            table_name="infections",
+            location_spec="shelter",
+            location_id=0,
+            region_name=region_0,
+            infector_ids=[infected.id],
+            infected_ids=[infected.id],
+            infection_ids=[0],
+        )
+        if day == 2:
+            record.accumulate(
+                table_name="hospital_admissions",
+                hospital_id=hospital.id,
+                patient_id=infected.id,
+            )
+            record.accumulate(
+                table_name="deaths",
+                location_spec="shelter",
+                location_id=0,
+                dead_person_id=infected.id,
+            )
+            world.isolation_units[0].add(isolated)
+        record.summarise_time_step(timestamp=timestamp, world=world)
+        record.time_step(timestamp=timestamp)
+        # days are written two at a time, once they are over
+        summary = pd.read_csv(tmp_path / "camp_summary.csv")
+        if day < 3:
+            assert len(summary) == 0
+        else:
+            assert set(summary["time_stamp"]) == {"2020-05-01", "2020-05-02"}
+    record.finalise()
+    world.isolation_units[0].release_patient(isolated)
+    assert record.n_infections == 4
+    assert record.n_infected == 0
+
+    summary = pd.read_csv(tmp_path / "camp_summary.csv")
+    counts = summary.set_index(["time_stamp", "region", "counter"])["count"]
+    assert counts["2020-05-01", region_0, "infections_shelter"] == 2
+    assert counts["2020-05-02", region_0, "infections_shelter"] == 1
+    assert counts["2020-05-02", region_1, "hospital_admissions"] == 1
+    assert counts["2020-05-02", region_0, "deaths"] == 1
+    assert counts["2020-05-02", region_1, "isolation_admissions"] == 1
+    assert counts.sum() == 7
+
+    locations = pd.read_csv(tmp_path / "locations.csv")
+    assert locations.columns.tolist() == ["location_specs", "timestamp", "0"]
+    assert locations["0"].tolist() == [2, 1, 1]
+
+    infection_locations = InfectionLocationCounter.load(
+        tmp_path / "infection_locations.npz"
+    )
+    assert infection_locations.sum() == 4
+    assert np.array_equal(
+        record.infection_locations.counts.sum(axis=(0, 2, 3)), [2, 1, 1]
+    )
+    assert len(pd.read_csv(tmp_path / "summary.csv")) > 0
+
+
+def test__summary_as_record_sorted_by_region(world, tmp_path):
+    camp_record = CampRecord(record_path=tmp_path / "camp")
+    record = Record(record_path=tmp_path / "june")
+    timestamp = datetime(2020, 5, 1)
+    for region_index in [3, 0, 2, 1]:
+        infected = person_in_region(world, region_index)
+        for rec in (camp_record, record):
+            rec.accumulate(
+                table_name="infections",
+                location_spec="shelter",
+                location_id=0,
+                region_name=world.regions[region_index].name,
+                infector_ids=[infected.id],
+                infected_ids=[infected.id],
+                infection_ids=[0],
+            )
+    for rec in (camp_record, record):
+        rec.summarise_time_step(timestamp=timestamp, world=world)
+        rec.time_step(timestamp=timestamp)
+    camp_summary = pd.read_csv(tmp_path / "camp" / "summary.csv")
+    summary = pd.read_csv(tmp_path / "june" / "summary.csv")
+    assert len(camp_summary) == 4
+    assert camp_summary["region"].tolist() == sorted(summary["region"])
+    pd.testing.assert_frame_equal(
+        camp_summary, summary.sort_values("region").reset_index(drop=True)
+    )
+    assert camp_record.n_infections == 4
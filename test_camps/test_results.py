@@ -0,0 +1,152 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from camps.results import SweepResultStore, get_daily_summary
+
+
+def write_summary(save_path, infected, region="CXB-219"):
+    save_path.mkdir(parents=True, exist_ok=True)
+    days = pd.date_range("2020-05-01", periods=len(infected)).strftime("%Y-%m-%d")
+    rows = []
+    for day, current in zip(days, infected):
+        # two time steps a day
+        for _ in range(2):
+            rows.append(
+                {
+                    "time_stamp": day,
+                    "region": region,
+                    "current_infected": current,
+                    "daily_infected": 1,
+                    "current_hospitalised": 0,
+                    "daily_hospitalised": 0,
+                    "daily_deaths": 0,
+                }
+            )
+    pd.DataFrame(rows).to_csv(save_path / "summary.csv", index=False)
+
+
+@pytest.fixture(name="store")
+def make_store(tmp_path):
+    store = SweepResultStore(tmp_path / "results.sqlite")
+    yield store
+    store.close()
+
+
+def test__daily_summary(tmp_path):
+    write_summary(tmp_path, [1, 4, 2])
+    daily = get_daily_summary(tmp_path / "summary.csv")
+    assert daily["current_infected"].tolist() == [1, 4, 2]
+    assert daily["daily_infected"].tolist() == [2, 2, 2]
+
+
+def test__run_metrics(store, tmp_path):
+    write_summary(tmp_path / "run_000", [1, 5, 3, 2])
+    metrics = store.ingest(
+        0,
+        {"isolation_compliance": 0.5, "mask_wearing": True},
+        tmp_path / "run_000",
+        population=100,
+    )
+    assert metrics["peak_infections"] == 5
+    assert metrics["days_to_peak"] == 1
+    assert metrics["total_infections"] == 8
+    assert metrics["attack_rate"] == 0.08
+    runs = store.get_runs(isolation_compliance=0.5)
+    assert runs.loc[0, "peak_date"] == "2020-05-02"
+    assert runs.loc[0, "mask_wearing"] == 1
+    assert len(store.get_daily(0)) == 4
+
+
+def test__incremental_cell_aggregates(store, tmp_path):
+    peaks = {0: [3], 1: [5], 2: [10], 3: [7]}
+    grid = [
+        {"isolation_compliance": 0.5, "random_seed": 0},
+        {"isolation_compliance": 0.5, "random_seed": 1},
+        {"isolation_compliance": 1.0, "random_seed": 0},
+        {"isolation_compliance": 1.0, "random_seed": 1},
+    ]
+    for run in range(2):
+        write_summary(tmp_path / f"run_{run:03d}", peaks[run])
+        store.ingest(run, grid[run], tmp_path / f"run_{run:03d}")
+    cells = store.get_cells()
+    assert cells["n_runs"].tolist() == [2]
+    assert cells["mean_peak_infections"].tolist() == [4]
+    assert cells["std_peak_infections"].tolist() == [1]
+    assert cells["mean_attack_rate"].isna().all()
+
+    # the runs of the other cell finish later
+    for run in range(2, 4):
+        write_summary(tmp_path / f"run_{run:03d}", peaks[run])
+    with open(tmp_path / "parameter_grid.pkl", "wb") as f:
+        pickle.dump(grid, f)
+    assert store.ingest_sweep(tmp_path) == [2, 3]
+    assert store.ingest_sweep(tmp_path) == []
+    cell = store.get_cells(isolation_compliance=1.0)
+    assert cell["mean_peak_infections"].tolist() == [8.5]
+    assert cell["max_peak_infections"].tolist() == [10]
+
+    # a run added again replaces its previous version
+    write_summary(tmp_path / "run_002", [1])
+    store.ingest(2, grid[2], tmp_path / "run_002")
+    cell = store.get_cells(isolation_compliance=1.0)
+    assert cell["n_runs"].tolist() == [2]
+    assert cell["mean_peak_infections"].tolist() == [4]
+    assert cell["min_peak_infections"].tolist() == [1]
+    assert cell["max_peak_infections"].tolist() == [7]
+    assert np.isclose(cell["std_peak_infections"].iloc[0], 3)
+
+
+def test__reopen_store(tmp_path):
+    write_summary(tmp_path / "run_000", [2])
+    store = SweepResultStore(tmp_path / "results.sqlite")
+    store.ingest(0, {"infectiousness_path": "nature"}, tmp_path / "run_000")
+    store.close()
+    store = SweepResultStore(tmp_path / "results.sqlite")
+    assert store.parameters == ["infectiousness_path"]
+    assert store.get_cells(infectiousness_path="nature")["n_runs"].tolist() == [1]
+    store.close()
+
+
+def test__days_to_peak_from_initial_date(store, tmp_path):
+    # nobody was infected over the first three days, so they have no rows
+    write_summary(tmp_path / "run_000", [1, 5, 3])
+    with open(tmp_path / "run_000/config.yaml", "w") as f:
+        yaml.safe_dump({"time": {"initial_day": "2020-04-28 9:00"}}, f)
+    metrics = store.ingest(0, {"isolation_compliance": 0.5}, tmp_path / "run_000")
+    assert metrics["days_to_peak"] == 4
+    assert store.get_daily(0)["day"].tolist() == [3, 4, 5]
+
+
+def test__cell_variance_of_large_values(store, tmp_path):
+    peaks = [1e9 + 1, 1e9 + 2, 1e9 + 3]
+    for run, peak in enumerate(peaks):
+        write_summary(tmp_path / f"run_{run:03d}", [peak])
+        store.ingest(run, {"random_seed": run}, tmp_path / f"run_{run:03d}")
+    cells = store.get_cells()
+    assert cells["mean_peak_infections"].tolist() == [1e9 + 2]
+    assert np.isclose(cells["std_peak_infections"].iloc[0], np.sqrt(2 / 3))
+    # removing a run by adding it again keeps the aggregates exact
+    write_summary(tmp_path / "run_002", [1e9 + 1])
+    store.ingest(2, {"random_seed": 2}, tmp_path / "run_002")
+    cells = store.get_cells()
+    assert np.isclose(cells["std_peak_infections"].iloc[0], np.sqrt(2) / 3)
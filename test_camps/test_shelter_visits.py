@@ -20,13 +20,15 @@ import numpy as np
 from collections import defaultdict
 
 from june.geography import SuperAreas, SuperArea
+from june.demography import Person
 
+from camps.geography import CampArea
 from camps.groups import Shelter, Shelters
 from camps.groups import SheltersVisitsDistributor
 
 
-@pytest.fixture(name="visits_world", scope="module")
-def setup_shelter_visits(camps_world):
+@pytest.fixture(name="shelter_visits_distributor", scope="module")
+def make_shelter_visits_distributor(camps_world):
     shelter_visits_distributor = SheltersVisitsDistributor.from_config(
         daytypes={
             "weekday": ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"],
@@ -34,6 +36,11 @@ def setup_shelter_visits(camps_world):
         }
     )
     shelter_visits_distributor.link_shelters_to_shelters(camps_world.super_areas)
+    return shelter_visits_distributor
+
+
+@pytest.fixture(name="visits_world", scope="module")
+def setup_shelter_visits(camps_world, shelter_visits_distributor):
     return camps_world
 
 
@@ -52,3 +59,56 @@ def test__shelter_links(visits_world):
     for i in shelters_to_visit_sizes.values():
         for j in shelters_to_visit_sizes.values():
             assert np.isclose(i, j, rtol=0.15)
+
+
+def test__visit_from_network(visits_world, shelter_visits_distributor):
+    distributor = shelter_visits_distributor
+    n_visits = 0
+    for shelter in list(visits_world.shelters)[:200]:
+        for person in shelter.residents:
+            visited = distributor.get_leisure_group(person)
+            if shelter.shelters_to_visit is None:
+                assert visited is None
+            else:
+                assert visited in shelter.shelters_to_visit
+                assert visited is not shelter
+                n_visits += 1
+    assert n_visits > 0
+
+
+def test__shelter_links_by_distance():
+    daytypes = {
+        "weekday": ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"],
+        "weekend": ["Friday", "Saturday"],
+    }
+    shelter_visits_distributor = SheltersVisitsDistributor.from_config(
+        daytypes=daytypes
+    )
+    shelter_visits_distributor.link_distance_scale = 0.1
+    shelter_visits_distributor.link_degree_probabilities = np.array([0, 0, 0, 1.0])
+    super_areas = []
+    for i, latitude in enumerate([12.0, 12.5]):
+        areas = [
+            CampArea(
+                name=f"{i}_{j}", super_area=None, coordinates=(latitude + j * 1e-3, 15.0)
+            )
+            for j in range(5)
+        ]
+        super_area = SuperArea(name=str(i), areas=areas, coordinates=(latitude, 15.0))
+        for area in areas:
+            area.super_area = super_area
+            area.shelters = [Shelter(area=area) for _ in range(10)]
+            for shelter in area.shelters:
+                shelter.residents = (Person.from_attributes(),)
+        super_areas.append(super_area)
+    shelter_visits_distributor.link_shelters_to_shelters(super_areas)
+    n_links = 0
+    for super_area in super_areas:
+        for area in super_area.areas:
+            for shelter in area.shelters:
+                n_links += len(shelter.shelters_to_visit or ())
+                for shelter_to_visit in shelter.shelters_to_visit or ():
+                    assert shelter_to_visit is not shelter
+                    assert shelter_to_visit.area.super_area == super_area
+    # self links are dropped
+    assert 0.9 * 3 * 100 < n_links <= 3 * 100
@@ -43,6 +43,34 @@ def test__create_shelters():
     )
 
 
+def test__visits_go_to_families():
+    shelter = Shelter()
+    household = Household()
+    residents = [Person.from_attributes() for _ in range(2)]
+    for person in residents:
+        household.add(person)
+    shelter.add(household)
+    for person in residents:
+        person.busy = False
+    visitors = [Person.from_attributes() for _ in range(20)]
+    for visitor in visitors:
+        subgroup = shelter.get_leisure_subgroup(
+            visitor, subgroup_type=None, to_send_abroad=None
+        )
+        assert subgroup == shelter[0]
+    assert shelter.being_visited
+    for person in residents:
+        assert person.leisure == shelter[0]
+    second_household = Household()
+    second_household.add(Person.from_attributes())
+    shelter.add(second_household)
+    subgroups = set(
+        shelter.get_leisure_subgroup(visitor, subgroup_type=None, to_send_abroad=None)
+        for visitor in visitors
+    )
+    assert subgroups == set([shelter[0], shelter[1]])
+
+
 def test__shelter_distributor():
     n_families_area = 100
     shelters = Shelters.from_families_in_area(
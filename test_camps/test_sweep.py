@@ -0,0 +1,70 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import os
+import json
+
+from camps.pipeline import Stage, RunPipeline
+from camps.sweep import SweepExecutor
+
+
+def build(context, parameters):
+    return {
+        "world": {"size": parameters["size"], "infected": []},
+        "builder_pid": os.getpid(),
+    }
+
+
+def simulate(context, parameters):
+    if parameters["household_beta"] < 0:
+        raise ValueError("negative beta")
+    world = context["world"]
+    world["infected"].append(parameters["household_beta"])
+    with open(parameters["save_path"] / "world.json", "w") as f:
+        json.dump({**world, "builder_pid": context["builder_pid"]}, f)
+    return {}
+
+
+def test__runs_share_one_world_per_group(tmp_path):
+    pipeline = RunPipeline(
+        stages=[
+            Stage("build", build, ("size",)),
+            Stage("simulate", simulate, ("household_beta",)),
+        ]
+    )
+    parameter_grid = [
+        {"size": size, "household_beta": beta}
+        for size in [10, 20]
+        for beta in [0.1, 0.2, -1.0]
+    ]
+    executor = SweepExecutor(
+        parameter_grid, tmp_path, pipeline=pipeline, shared_until="build", n_workers=2
+    )
+    assert len(executor.group_by_world()) == 2
+    results = sorted(executor.run(), key=lambda result: result["index"])
+    assert [result["status"] for result in results] == ["done", "done", "failed"] * 2
+    assert "negative beta" in results[2]["error"]
+    for result, parameters in zip(results, parameter_grid):
+        if result["status"] == "failed":
+            continue
+        assert result["pid"] != os.getpid()
+        with open(tmp_path / f"run_{result['index']:03d}" / "world.json") as f:
+            world = json.load(f)
+        # every run starts from the world built once in this process
+        assert world["builder_pid"] == os.getpid()
+        assert world["size"] == parameters["size"]
+        assert world["infected"] == [parameters["household_beta"]]
+    assert (tmp_path / "profile_world_01.json").exists()
@@ -0,0 +1,115 @@
+"""
+(c) 2021 UN Global Pulse
+
+This file is part of UNGP Operational Intervention Simulation Tool.
+
+UNGP Operational Intervention Simulation Tool is free software: 
+you can redistribute it and/or modify it under the terms of the 
+GNU General Public License as published by the Free Software Foundation, 
+either version 3 of the License, or (at your option) any later version.
+
+UNGP Operational Intervention Simulation Tool is distributed in the 
+hope that it will be useful, but WITHOUT ANY WARRANTY; without even 
+the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  
+See the GNU General Public License for more details.
+"""
+
+import numpy as np
+import pytest
+from scipy.stats import rv_discrete
+
+from camps.synthetic import (
+    BufferedSampler,
+    earth_radius,
+    generate_geo_grid,
+    generate_empty_virtual_world,
+    generate_virtual_world,
+    load_basecamp_distributions,
+    populate_virtual_world,
+)
+
+
+@pytest.fixture(name="distributions", scope="module")
+def get_distributions():
+    return load_basecamp_distributions()
+
+
+def test__geo_grid_hierarchy():
+    regions, super_areas, areas, hierarchy = generate_geo_grid(n_regions=4)
+    assert list(regions["region"]) == ["r0", "r1", "r2", "r3"]
+    assert len(super_areas) == 16
+    assert len(areas) == 144
+    assert list(areas["area"][:2]) == ["a0", "a1"]
+    assert (hierarchy.groupby("super_area").size() == 9).all()
+    assert (hierarchy.groupby("region")["super_area"].nunique() == 4).all()
+    assert list(hierarchy["super_area"][8:10]) == ["sa0", "sa1"]
+    assert list(hierarchy["region"][35:37]) == ["r0", "r1"]
+
+
+def test__geo_grid_spacing():
+    _, _, areas, _ = generate_geo_grid(n_regions=1, area_spacing=100)
+    step = (100 / earth_radius) * (180 / np.pi)
+    # areas within a super area are numbered row by row of latitude
+    assert np.isclose(areas["latitude"][1] - areas["latitude"][0], step)
+    assert np.isclose(areas["longitude"][3] - areas["longitude"][0], step)
+    assert np.isclose(areas["latitude"].max(), 5 * step)
+    assert np.isclose(areas["longitude"].max(), 5 * step)
+
+
+def test__geo_grid_needs_square_number():
+    with pytest.raises(ValueError):
+        generate_geo_grid(n_regions=3)
+
+
+def test__populate_virtual_world(distributions):
+    world, _ = generate_empty_virtual_world(n_regions=1)
+    world_ages = populate_virtual_world(
+        world,
+        distributions["population_dist_df"],
+        distributions["n_residents_params"],
+        seed=1,
+        chunk_size=5,
+    )
+    assert len(world.people) == sum(len(area.people) for area in world.areas)
+    for area in world.areas:
+        assert len(area.people) == len(world_ages[area.name])
+        for person, age in zip(area.people, world_ages[area.name]):
+            assert person.area is area
+            assert person.sex == ("m" if age >= 100 else "f")
+            assert person.age == age % 100
+    assert len({person.id for person in world.people}) == len(world.people)
+
+
+def test__streamed_world_matches_populated_world(distributions):
+    world, _ = generate_empty_virtual_world(n_regions=1)
+    populate_virtual_world(
+        world,
+        distributions["population_dist_df"],
+        distributions["n_residents_params"],
+        seed=3,
+    )
+    streamed_world, _ = generate_virtual_world(
+        n_regions=1, distributions=distributions, seed=3, chunk_size=7
+    )
+    for area, streamed_area in zip(world.areas, streamed_world.areas):
+        assert [(p.age, p.sex) for p in area.people] == [
+            (p.age, p.sex) for p in streamed_area.people
+        ]
+    households = streamed_world.households
+    assert sum(len(household.people) for household in households) == len(
+        streamed_world.people
+    )
+    for area in streamed_world.areas:
+        for household in area.households:
+            assert all(person.area is area for person in household.people)
+
+
+def test__buffered_sampler():
+    distribution = rv_discrete(values=([1, 2, 3], [0.2, 0.3, 0.5]), seed=0)
+    sampler = BufferedSampler(distribution, buffer_size=10)
+    values = np.concatenate([sampler.rvs(size=1) for _ in range(25)])
+    values = np.concatenate((values, sampler.rvs(size=30)))
+    assert len(values) == 55
+    assert set(values) <= {1, 2, 3}
+    reference = rv_discrete(values=([1, 2, 3], [0.2, 0.3, 0.5]), seed=0)
+    assert (values[:10] == reference.rvs(size=10)).all()